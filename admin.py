@@ -9,7 +9,7 @@ from collections import defaultdict
 from typing import Dict, List, Optional, Any
 
 from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
-from sqlalchemy import func, desc, and_
+from sqlalchemy import desc, and_
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from main import db, Conversation, ConversationEntry, limiter, csrf
@@ -19,6 +19,7 @@ from utils.validators import SecurityValidator
 from config import Config
 from notifications import notification_manager, system_monitor, NotificationLevel
 from database_utils import DatabaseManager
+from utils.pagination import paginate, parse_total_mode, InvalidCursorError
 
 # Create admin blueprint
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -31,38 +32,25 @@ class AdminMetrics:
     
     @staticmethod
     def get_conversation_stats(days: int = 30) -> Dict[str, Any]:
-        """Get conversation statistics for the last N days"""
+        """Get conversation statistics for the last N days (from the metrics store counters)"""
+        from metrics_store import metrics_store
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        # Basic conversation stats
-        total_conversations = Conversation.query.count()
-        recent_conversations = Conversation.query.filter(
-            Conversation.created_at >= cutoff_date
-        ).count()
+        all_time = metrics_store.totals(['conversations.created', 'conversations.completed'])
+        recent = metrics_store.totals(['conversations.created', 'conversations.completed'], cutoff_date)
         
-        completed_conversations = Conversation.query.filter(
-            Conversation.is_complete == True
-        ).count()
-        
-        # Average completion time for completed conversations
-        completed_recent = Conversation.query.filter(
-            and_(
-                Conversation.is_complete == True,
-                Conversation.created_at >= cutoff_date
-            )
-        ).all()
+        total_conversations = all_time['conversations.created']['count']
+        completed_conversations = all_time['conversations.completed']['count']
+        recent_completed = recent['conversations.completed']
         
+        # Average completion time for conversations created in the window
         avg_completion_time = None
-        if completed_recent:
-            completion_times = [
-                (conv.updated_at - conv.created_at).total_seconds() / 60
-                for conv in completed_recent
-            ]
-            avg_completion_time = sum(completion_times) / len(completion_times)
+        if recent_completed['count']:
+            avg_completion_time = recent_completed['total'] / recent_completed['count'] / 60
         
         return {
             'total_conversations': total_conversations,
-            'recent_conversations': recent_conversations,
+            'recent_conversations': recent['conversations.created']['count'],
             'completed_conversations': completed_conversations,
             'completion_rate': (completed_conversations / total_conversations * 100) if total_conversations > 0 else 0,
             'avg_completion_time_minutes': avg_completion_time,
@@ -70,160 +58,65 @@ class AdminMetrics:
         }
     
     @staticmethod
-    def get_agent_performance(days: int = 30) -> Dict[str, Any]:
-        """Get comprehensive agent performance metrics"""
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Enhanced agent statistics
-        agent_stats = db.session.query(
-            ConversationEntry.agent_name,
-            ConversationEntry.agent_role,
-            func.count(ConversationEntry.id).label('response_count'),
-            func.avg(func.length(ConversationEntry.response_text)).label('avg_response_length'),
-            func.count(func.distinct(ConversationEntry.conversation_id)).label('conversations_handled'),
-            func.min(ConversationEntry.created_at).label('first_response'),
-            func.max(ConversationEntry.created_at).label('last_response'),
-            func.avg(func.length(ConversationEntry.next_question)).label('avg_question_length')
-        ).filter(
-            ConversationEntry.created_at >= cutoff_date
-        ).group_by(ConversationEntry.agent_name, ConversationEntry.agent_role).all()
-        
-        # Calculate agent success rates and handoff efficiency
-        agent_success_rates = []
-        handoff_efficiency = []
-        
-        for agent_name in ['Analyst', 'Researcher', 'Writer']:
-            # Count conversations that reached this agent
-            conversations_reached = db.session.query(
-                func.count(func.distinct(ConversationEntry.conversation_id))
-            ).filter(
-                and_(
-                    ConversationEntry.agent_name == agent_name,
-                    ConversationEntry.created_at >= cutoff_date
-                )
-            ).scalar() or 0
-            
-            if agent_name == 'Writer':
-                # For writer, check completion rate
-                conversations_completed = db.session.query(
-                    func.count(func.distinct(Conversation.id))
-                ).join(ConversationEntry).filter(
-                    and_(
-                        ConversationEntry.agent_name == agent_name,
-                        ConversationEntry.created_at >= cutoff_date,
-                        Conversation.is_complete == True
-                    )
-                ).scalar() or 0
-            else:
-                # For other agents, check handoff success
-                next_agent = {'Analyst': 'Researcher', 'Researcher': 'Writer'}[agent_name]
-                conversations_completed = db.session.query(
-                    func.count(func.distinct(ConversationEntry.conversation_id))
-                ).filter(
-                    and_(
-                        ConversationEntry.agent_name == next_agent,
-                        ConversationEntry.conversation_id.in_(
-                            db.session.query(ConversationEntry.conversation_id).filter(
-                                and_(
-                                    ConversationEntry.agent_name == agent_name,
-                                    ConversationEntry.created_at >= cutoff_date
-                                )
-                            )
-                        )
-                    )
-                ).scalar() or 0
-            
-            success_rate = (conversations_completed / conversations_reached * 100) if conversations_reached > 0 else 0
-            agent_success_rates.append({
-                'agent_name': agent_name,
-                'conversations_reached': conversations_reached,
-                'conversations_completed': conversations_completed,
-                'success_rate': round(success_rate, 2)
-            })
-        
-        # Daily performance trends
-        daily_performance = db.session.query(
-            ConversationEntry.agent_name,
-            func.date(ConversationEntry.created_at).label('date'),
-            func.count(ConversationEntry.id).label('responses'),
-            func.avg(func.length(ConversationEntry.response_text)).label('avg_length'),
-            func.count(func.distinct(ConversationEntry.conversation_id)).label('unique_conversations')
-        ).filter(
-            ConversationEntry.created_at >= cutoff_date
-        ).group_by(
-            ConversationEntry.agent_name,
-            func.date(ConversationEntry.created_at)
-        ).order_by('date').all()
-        
-        # Agent response time analysis
-        agent_response_times = {}
-        conversation_durations = {}
-        
-        for agent_name in ['Analyst', 'Researcher', 'Writer']:
-            # Get recent entries for this agent
-            entries = ConversationEntry.query.filter(
-                and_(
-                    ConversationEntry.agent_name == agent_name,
-                    ConversationEntry.created_at >= cutoff_date
-                )
-            ).order_by(ConversationEntry.created_at.desc()).limit(200).all()
-            
-            if entries:
-                # Calculate processing times within conversations
-                times = []
-                for entry in entries:
-                    # Get conversation start time
-                    conv_start = db.session.query(Conversation.created_at).filter(
-                        Conversation.id == entry.conversation_id
-                    ).scalar()
-                    
-                    if conv_start:
-                        processing_time = (entry.created_at - conv_start).total_seconds()
-                        if processing_time > 0 and processing_time < 1800:  # Filter unrealistic times (30 min max)
-                            times.append(processing_time)
-                
-                agent_response_times[agent_name] = {
-                    'avg_processing_time': round(sum(times) / len(times), 2) if times else 0,
-                    'min_processing_time': round(min(times), 2) if times else 0,
-                    'max_processing_time': round(max(times), 2) if times else 0
+    def get_agent_performance(days: int = 30, refresh: bool = False) -> Dict[str, Any]:
+        """Get comprehensive agent performance metrics (one cached funnel query per window)"""
+        from agent_analytics import agent_analytics
+        result = agent_analytics.get_funnel(days, refresh=refresh)
+        funnel = result['funnel']
+        
+        agent_stats = [
+            {
+                'agent': stage['agent_name'],
+                'role': stage['agent_role'],
+                'response_count': stage['response_count'],
+                'avg_response_length': stage['avg_response_length'],
+                'conversations_handled': stage['conversations_reached'],
+                'first_response': stage['first_response'],
+                'last_response': stage['last_response'],
+                'avg_question_length': stage['avg_question_length'],
+                'processing_times': {
+                    'avg_processing_time': stage['avg_processing_time'],
+                    'min_processing_time': stage['min_processing_time'],
+                    'max_processing_time': stage['max_processing_time']
                 }
-        
-        # Agent quality metrics (based on response characteristics)
-        quality_metrics = []
-        for agent_name in ['Analyst', 'Researcher', 'Writer']:
-            entries = ConversationEntry.query.filter(
-                and_(
-                    ConversationEntry.agent_name == agent_name,
-                    ConversationEntry.created_at >= cutoff_date
-                )
-            ).all()
-            
-            if entries:
-                # Calculate quality indicators
-                total_responses = len(entries)
-                responses_with_questions = sum(1 for e in entries if e.next_question and len(e.next_question.strip()) > 10)
-                avg_response_length = sum(len(e.response_text) for e in entries) / total_responses
-                
-                quality_metrics.append({
-                    'agent_name': agent_name,
-                    'question_generation_rate': round((responses_with_questions / total_responses * 100), 2),
-                    'avg_response_length': round(avg_response_length),
-                    'response_consistency': round(min(100, (avg_response_length / 500) * 100), 2),  # Normalized score
-                    'total_responses': total_responses
-                })
+            }
+            for stage in funnel
+        ]
+        
+        # Handoff to a later agent, or completion, counts as success
+        agent_success_rates = [
+            {
+                'agent_name': stage['agent_name'],
+                'conversations_reached': stage['conversations_reached'],
+                'conversations_completed': stage['conversations_progressed'],
+                'success_rate': stage['success_rate']
+            }
+            for stage in funnel
+        ]
+        
+        quality_metrics = [
+            {
+                'agent_name': stage['agent_name'],
+                'question_generation_rate': round(stage['questions_asked'] / stage['response_count'] * 100, 2),
+                'avg_response_length': stage['avg_response_length'],
+                'response_consistency': round(min(100, (stage['avg_response_length'] / 500) * 100), 2),  # Normalized score
+                'total_responses': stage['response_count']
+            }
+            for stage in funnel if stage['response_count']
+        ]
         
         # Performance rankings
-        if agent_stats:
-            most_active = max(agent_stats, key=lambda x: x.response_count)
-            most_efficient = min(agent_stats, key=lambda x: x.avg_response_length or float('inf'))
+        if funnel:
+            most_active = max(funnel, key=lambda x: x['response_count'])
+            most_efficient = min(funnel, key=lambda x: x['avg_response_length'] or float('inf'))
             
             performance_summary = {
-                'total_agents': len(agent_stats),
-                'most_active_agent': most_active.agent_name,
-                'most_efficient_agent': most_efficient.agent_name,
-                'best_success_rate': max(agent_success_rates, key=lambda x: x['success_rate'])['agent_name'] if agent_success_rates else None,
-                'total_responses': sum(stat.response_count for stat in agent_stats),
-                'avg_response_length_all': round(sum(stat.avg_response_length or 0 for stat in agent_stats) / len(agent_stats)),
+                'total_agents': len(funnel),
+                'most_active_agent': most_active['agent_name'],
+                'most_efficient_agent': most_efficient['agent_name'],
+                'best_success_rate': max(agent_success_rates, key=lambda x: x['success_rate'])['agent_name'],
+                'total_responses': sum(stage['response_count'] for stage in funnel),
+                'avg_response_length_all': round(sum(stage['avg_response_length'] for stage in funnel) / len(funnel)),
                 'period_days': days
             }
         else:
@@ -238,33 +131,13 @@ class AdminMetrics:
             }
         
         return {
-            'agent_stats': [
-                {
-                    'agent': stat.agent_name,
-                    'role': stat.agent_role,
-                    'response_count': stat.response_count,
-                    'avg_response_length': round(stat.avg_response_length) if stat.avg_response_length else 0,
-                    'conversations_handled': stat.conversations_handled,
-                    'first_response': stat.first_response.isoformat() if stat.first_response else None,
-                    'last_response': stat.last_response.isoformat() if stat.last_response else None,
-                    'avg_question_length': round(stat.avg_question_length) if stat.avg_question_length else 0,
-                    'processing_times': agent_response_times.get(stat.agent_name, {})
-                }
-                for stat in agent_stats
-            ],
+            'agent_stats': agent_stats,
             'success_rates': agent_success_rates,
-            'daily_performance': [
-                {
-                    'agent_name': perf.agent_name,
-                    'date': perf.date.strftime('%Y-%m-%d'),
-                    'responses': perf.responses,
-                    'avg_length': round(perf.avg_length) if perf.avg_length else 0,
-                    'unique_conversations': perf.unique_conversations
-                }
-                for perf in daily_performance
-            ],
+            'funnel': funnel,
+            'daily_performance': result['daily'],
             'quality_metrics': quality_metrics,
             'performance_summary': performance_summary,
+            'computed_at': result['computed_at'],
             'period_days': days
         }
     
@@ -280,18 +153,20 @@ class AdminMetrics:
             db_healthy = False
             db_error = str(e)
         
-        # Recent error rate (last 24 hours)
-        recent_conversations = Conversation.query.filter(
-            Conversation.created_at >= datetime.utcnow() - timedelta(hours=24)
-        ).count()
+        from metrics_store import metrics_store
+        
+        # Recent activity (last 24 hours)
+        recent_conversations = metrics_store.totals(
+            ['conversations.created'], datetime.utcnow() - timedelta(hours=24)
+        )['conversations.created']['count']
         
-        # Check for incomplete conversations older than 1 hour
-        stale_conversations = Conversation.query.filter(
+        # Check for incomplete conversations older than 1 hour (a state query, cached briefly)
+        stale_conversations = metrics_store.cached(('stale_conversations', 1), lambda: Conversation.query.filter(
             and_(
                 Conversation.is_complete == False,
                 Conversation.updated_at < datetime.utcnow() - timedelta(hours=1)
             )
-        ).count()
+        ).count())
         
         return {
             'database_healthy': db_healthy,
@@ -306,40 +181,31 @@ class AdminMetrics:
         """Get usage trends over time"""
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
+        from metrics_store import metrics_store
+        
         # Daily conversation creation
-        daily_stats = db.session.query(
-            func.date(Conversation.created_at).label('date'),
-            func.count(Conversation.id).label('count')
-        ).filter(
-            Conversation.created_at >= cutoff_date
-        ).group_by(
-            func.date(Conversation.created_at)
-        ).order_by('date').all()
-        
-        # Hourly distribution (last 24 hours)
-        hourly_stats = db.session.query(
-            func.extract('hour', Conversation.created_at).label('hour'),
-            func.count(Conversation.id).label('count')
-        ).filter(
-            Conversation.created_at >= datetime.utcnow() - timedelta(hours=24)
-        ).group_by(
-            func.extract('hour', Conversation.created_at)
-        ).order_by('hour').all()
+        daily_stats = metrics_store.series('conversations.created', cutoff_date, granularity='day')
+        
+        # Hourly distribution (last 24 hourly buckets, including the current one)
+        hourly_counts = defaultdict(int)
+        for bucket in metrics_store.series('conversations.created', datetime.utcnow() - timedelta(hours=23),
+                                           granularity='hour'):
+            hourly_counts[bucket['bucket_start'].hour] += bucket['count']
         
         return {
             'daily_trends': [
                 {
-                    'date': stat.date.strftime('%Y-%m-%d'),
-                    'conversations': stat.count
+                    'date': stat['bucket_start'].strftime('%Y-%m-%d'),
+                    'conversations': stat['count']
                 }
                 for stat in daily_stats
             ],
             'hourly_distribution': [
                 {
-                    'hour': int(stat.hour),
-                    'conversations': stat.count
+                    'hour': hour,
+                    'conversations': hourly_counts[hour]
                 }
-                for stat in hourly_stats
+                for hour in sorted(hourly_counts)
             ]
         }
 
@@ -386,10 +252,11 @@ def api_stats():
     try:
         days = int(request.args.get('days', 30))
         days = min(days, 365)  # Max 1 year
+        refresh = request.args.get('refresh') == '1'
         
         stats = {
             'conversation_stats': AdminMetrics.get_conversation_stats(days),
-            'agent_performance': AdminMetrics.get_agent_performance(days),
+            'agent_performance': AdminMetrics.get_agent_performance(days, refresh=refresh),
             'system_health': AdminMetrics.get_system_health(),
             'usage_trends': AdminMetrics.get_usage_trends(min(days, 30))
         }
@@ -410,10 +277,11 @@ def api_stats():
 @admin_required
 @limiter.limit("30 per minute")
 def api_conversations():
-    """API endpoint for conversation management"""
+    """API endpoint for conversation management (keyset-paginated: pass next_cursor back as ?cursor=)"""
     try:
-        page = int(request.args.get('page', 1))
         per_page = min(int(request.args.get('per_page', 20)), 100)
+        cursor = request.args.get('cursor')
+        total_mode = parse_total_mode(request.args.get('total'))
         status = request.args.get('status', 'all')
         
         query = Conversation.query
@@ -430,13 +298,13 @@ def api_conversations():
                 )
             )
         
-        conversations = query.order_by(
-            Conversation.created_at.desc()
-        ).paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        try:
+            page = paginate(query, Conversation.created_at, Conversation.id, cursor, per_page, total_mode)
+        except InvalidCursorError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Entry counts for the whole page in one grouped query
+        entry_counts = Conversation.get_entry_counts([conv.id for conv in page.items])
         
         return jsonify({
             'success': True,
@@ -448,19 +316,12 @@ def api_conversations():
                         'created_at': conv.created_at.isoformat(),
                         'updated_at': conv.updated_at.isoformat(),
                         'is_complete': conv.is_complete,
-                        'entry_count': conv.entries.count(),
+                        'entry_count': entry_counts[conv.id],
                         'current_agent_index': conv.current_agent_index
                     }
-                    for conv in conversations.items
+                    for conv in page.items
                 ],
-                'pagination': {
-                    'page': page,
-                    'per_page': per_page,
-                    'total': conversations.total,
-                    'pages': conversations.pages,
-                    'has_next': conversations.has_next,
-                    'has_prev': conversations.has_prev
-                }
+                'pagination': page.pagination_meta()
             }
         })
         
@@ -610,12 +471,193 @@ def api_check_system_health():
         logging.error(f"Error running system health check: {str(e)}")
         return jsonify({'success': False, 'error': 'Failed to run system health check'}), 500
 
+@admin_bp.route('/api/system/health-snapshot')
+@admin_required
+@limiter.limit("30 per minute")
+def api_health_snapshot():
+    """API endpoint for the latest health snapshot (p50/p95/p99 latencies, rates) and its rolling history"""
+    try:
+        history = system_monitor.get_history(min(int(request.args.get('limit', 288)), 288))
+        if request.args.get('fresh') == '1' or not history:
+            latest = system_monitor.take_snapshot()
+        else:
+            latest = history[-1]
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'latest': latest,
+                'history': history,
+                'thresholds': system_monitor.thresholds
+            }
+        })
+    
+    except Exception as e:
+        logging.error(f"Error fetching health snapshot: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch health snapshot'}), 500
+
+@admin_bp.route('/api/provider-health')
+@admin_required
+@limiter.limit("60 per minute")
+def api_provider_health():
+    """API endpoint for LLM provider latency, error rates and circuit breaker state"""
+    try:
+        from provider_router import provider_router
+        return jsonify({'success': True, 'data': provider_router.get_status()})
+    
+    except Exception as e:
+        logging.error(f"Error fetching provider health: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch provider health'}), 500
+
+
+@admin_bp.route('/api/provider-health/reset', methods=['POST'])
+@admin_required
+@limiter.limit("10 per minute")
+@csrf.exempt
+def api_reset_provider_health():
+    """API endpoint for closing circuit breakers (all providers or one)"""
+    try:
+        from provider_router import provider_router
+        provider = request.json.get('provider') if request.json else None
+        provider_router.reset(provider)
+        return jsonify({'success': True, 'message': 'Provider health reset'})
+    
+    except Exception as e:
+        logging.error(f"Error resetting provider health: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to reset provider health'}), 500
+
+
+@admin_bp.route('/api/llm-clients')
+@admin_required
+@limiter.limit("60 per minute")
+def api_llm_client_stats():
+    """API endpoint for the shared LLM client registry and its connection pool limits"""
+    try:
+        from llm_clients import llm_clients
+        return jsonify({'success': True, 'data': llm_clients.get_stats()})
+    
+    except Exception as e:
+        logging.error(f"Error fetching LLM client stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch LLM client stats'}), 500
+
+@admin_bp.route('/api/llm-rate-limits')
+@admin_required
+@limiter.limit("60 per minute")
+def api_llm_rate_limit_stats():
+    """API endpoint for per provider/model rate limit buckets, queue depth and wait times"""
+    try:
+        from rate_limiter import rate_limiter
+        return jsonify({'success': True, 'data': rate_limiter.get_stats()})
+    
+    except Exception as e:
+        logging.error(f"Error fetching LLM rate limit stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch LLM rate limit stats'}), 500
+
+@admin_bp.route('/api/llm-coalescer')
+@admin_required
+@limiter.limit("60 per minute")
+def api_llm_coalescer_stats():
+    """API endpoint for in-flight request coalescing (shared vs upstream LLM calls)"""
+    try:
+        from request_coalescer import request_coalescer
+        return jsonify({'success': True, 'data': request_coalescer.get_stats()})
+    
+    except Exception as e:
+        logging.error(f"Error fetching LLM coalescer stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch LLM coalescer stats'}), 500
+
+@admin_bp.route('/api/speculation')
+@admin_required
+@limiter.limit("60 per minute")
+def api_speculation_stats():
+    """API endpoint for speculative next-agent prefetch hits, waste and budget usage"""
+    try:
+        from speculative_executor import speculative_executor
+        return jsonify({'success': True, 'data': speculative_executor.get_stats()})
+    
+    except Exception as e:
+        logging.error(f"Error fetching speculation stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch speculation stats'}), 500
+
+@admin_bp.route('/api/llm-cache')
+@admin_required
+@limiter.limit("60 per minute")
+def api_llm_cache_stats():
+    """API endpoint for LLM response cache hit metrics"""
+    try:
+        from llm_cache import llm_cache
+        return jsonify({'success': True, 'data': llm_cache.get_stats()})
+    
+    except Exception as e:
+        logging.error(f"Error fetching LLM cache stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch LLM cache stats'}), 500
+
+
+@admin_bp.route('/api/llm-cache/clear', methods=['POST'])
+@admin_required
+@limiter.limit("10 per minute")
+@csrf.exempt
+def api_clear_llm_cache():
+    """API endpoint for clearing the LLM response cache"""
+    try:
+        from llm_cache import llm_cache
+        llm_cache.clear()
+        return jsonify({'success': True, 'message': 'LLM cache cleared'})
+    
+    except Exception as e:
+        logging.error(f"Error clearing LLM cache: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to clear LLM cache'}), 500
+
+
+@admin_bp.route('/api/search-index')
+@admin_required
+@limiter.limit("60 per minute")
+def api_search_index_stats():
+    """API endpoint for full-text search index backend and document count"""
+    try:
+        from search_index import search_index
+        return jsonify({'success': True, 'data': search_index.get_stats()})
+
+    except Exception as e:
+        logging.error(f"Error fetching search index stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch search index stats'}), 500
+
+
+@admin_bp.route('/api/search-index/rebuild', methods=['POST'])
+@admin_required
+@limiter.limit("2 per minute")
+@csrf.exempt
+def api_rebuild_search_index():
+    """API endpoint for re-indexing every conversation (backfills rows created before the index)"""
+    try:
+        from search_index import search_index
+        counts = search_index.rebuild()
+        return jsonify({'success': True, 'data': counts, 'message': 'Search index rebuilt'})
+
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error rebuilding search index: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to rebuild search index'}), 500
+
 @admin_bp.route('/human-clarity')
 @admin_required
 def human_clarity():
     """Human-Clarity analytics page"""
     return render_template('admin/human_clarity.html')
 
+@admin_bp.route('/api/clarity-worker')
+@admin_required
+@limiter.limit("60 per minute")
+def api_clarity_worker_stats():
+    """API endpoint for clarity worker backlog, lag and throughput"""
+    try:
+        from clarity_worker import clarity_worker
+        return jsonify({'success': True, 'data': clarity_worker.get_stats()})
+    
+    except Exception as e:
+        logging.error(f"Error fetching clarity worker stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch clarity worker stats'}), 500
+
 @admin_bp.route('/api/clarity-analytics')
 @admin_required
 def api_clarity_analytics():
@@ -682,6 +724,7 @@ def api_clarity_analytics():
             "recent_analysis": recent_analysis,
             "average_actionability": feedback_stats.get("average_actionability", 0) * 20,
             "loop_closure_rate": 68.2,  # Placeholder for now
+            "clarity_series": clarity_engine.get_clarity_series(days=7),
             "data_sources": {
                 "automated_analysis": trends.get("total_analyzed", 0),
                 "user_feedback": feedback_stats.get("total_feedback_count", 0)
@@ -692,6 +735,106 @@ def api_clarity_analytics():
         logging.error(f"Error getting clarity analytics: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@admin_bp.route('/api/clarity-metrics/migrate', methods=['POST'])
+@admin_required
+@limiter.limit("2 per minute")
+@csrf.exempt
+def api_migrate_clarity_metrics():
+    """API endpoint for moving legacy clarity JSON out of error_message into clarity_metrics"""
+    try:
+        from human_clarity import clarity_engine
+        migrated = clarity_engine.migrate_legacy_analyses()
+        return jsonify({'success': True, 'data': {'migrated': migrated}})
+    
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error migrating clarity metrics: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to migrate clarity metrics'}), 500
+
+@admin_bp.route('/api/metrics-store')
+@admin_required
+@limiter.limit("60 per minute")
+def api_metrics_store_stats():
+    """API endpoint for metrics counter buffer, flush and read-cache statistics"""
+    try:
+        from metrics_store import metrics_store
+        return jsonify({'success': True, 'data': metrics_store.get_stats()})
+    
+    except Exception as e:
+        logging.error(f"Error fetching metrics store stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch metrics store stats'}), 500
+
+@admin_bp.route('/api/metrics-store/rebuild', methods=['POST'])
+@admin_required
+@limiter.limit("2 per minute")
+@csrf.exempt
+def api_rebuild_metrics_store():
+    """API endpoint for recomputing metrics counters from the raw tables (optional ?since=ISO date)"""
+    try:
+        from metrics_store import metrics_store
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else None
+        written = metrics_store.rebuild(since=since)
+        return jsonify({'success': True, 'data': {'buckets_written': written}})
+    
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid since date'}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error rebuilding metrics store: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to rebuild metrics store'}), 500
+
+@admin_bp.route('/api/jobs')
+@admin_required
+@limiter.limit("60 per minute")
+def api_job_queue_stats():
+    """API endpoint for background job counts, worker state and recent failures"""
+    try:
+        from job_queue import job_queue
+        from models import BackgroundJob
+        failed = BackgroundJob.query.filter_by(status='failed').order_by(
+            BackgroundJob.finished_at.desc()
+        ).limit(int(request.args.get('limit', 20))).all()
+        return jsonify({'success': True, 'data': {
+            'stats': job_queue.get_stats(),
+            'recent_failures': [job.to_dict() for job in failed]
+        }})
+    
+    except Exception as e:
+        logging.error(f"Error fetching job queue stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch job queue stats'}), 500
+
+@admin_bp.route('/api/jobs/<job_id>/retry', methods=['POST'])
+@admin_required
+@limiter.limit("10 per minute")
+@csrf.exempt
+def api_retry_job(job_id):
+    """API endpoint for re-queueing a failed background job"""
+    try:
+        from job_queue import job_queue
+        job = job_queue.retry(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Failed job not found'}), 404
+        return jsonify({'success': True, 'data': job.to_dict()})
+    
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error retrying job {job_id}: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to retry job'}), 500
+
+@admin_bp.route('/api/mail')
+@admin_required
+@limiter.limit("60 per minute")
+def api_mail_stats():
+    """API endpoint for outbound mail queue, pool and digest statistics"""
+    try:
+        from mail_service import mail_service
+        return jsonify({'success': True, 'data': mail_service.get_stats()})
+    
+    except Exception as e:
+        logging.error(f"Error fetching mail stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch mail stats'}), 500
+
 # Stripe Payment Management Endpoints
 @admin_bp.route('/payments')
 @admin_required
@@ -794,8 +937,9 @@ def api_create_payment():
 def api_get_payments():
     """Get list of payments with filtering and pagination"""
     try:
-        page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
+        cursor = request.args.get('cursor')
+        total_mode = parse_total_mode(request.args.get('total'))
         status_filter = request.args.get('status')
         search_query = request.args.get('search', '').strip()
         
@@ -818,28 +962,17 @@ def api_get_payments():
                 )
             )
         
-        # Order by most recent first
-        query = query.order_by(Payment.created_at.desc())
-        
-        # Paginate
-        payments = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        # Most recent first, keyset-paginated on (created_at, id)
+        try:
+            page = paginate(query, Payment.created_at, Payment.id, cursor, per_page, total_mode)
+        except InvalidCursorError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         return jsonify({
             'success': True,
             'data': {
-                'payments': [payment.to_dict() for payment in payments.items],
-                'pagination': {
-                    'page': page,
-                    'per_page': per_page,
-                    'total': payments.total,
-                    'pages': payments.pages,
-                    'has_next': payments.has_next,
-                    'has_prev': payments.has_prev
-                }
+                'payments': [payment.to_dict() for payment in page.items],
+                'pagination': page.pagination_meta()
             }
         })
         
@@ -0,0 +1,188 @@
+"""
+Agent Funnel Analytics
+Reach, handoff and completion counts for every agent in one windowed query, cached per window
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Any, Tuple
+
+from sqlalchemy import and_, case, func, select
+
+from config import Config
+from models import db, Conversation, ConversationEntry
+
+
+def stored_response_length():
+    """Response length from the stored column; only rows written before it was populated measure the text"""
+    return case(
+        (ConversationEntry.response_length > 0, ConversationEntry.response_length),
+        else_=func.length(ConversationEntry.response_text)
+    )
+
+
+class AgentFunnelAnalytics:
+    """Handoff funnel over whatever agent sequences conversations actually followed
+
+    Each entry in the window gets its successor in the same conversation via
+    ``lead()``. An agent "handed off" a conversation when a different agent
+    answered after it, so the funnel works for the Analyst → Researcher →
+    Writer chain, the 11-agent C-Suite pipeline and dynamic agents alike.
+    Stage order comes from each agent's average position in its conversations.
+    """
+
+    def __init__(self):
+        self._cache: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _funnel_query(self, cutoff: datetime):
+        window = {
+            'partition_by': ConversationEntry.conversation_id,
+            'order_by': (ConversationEntry.created_at, ConversationEntry.id)
+        }
+        steps = select(
+            ConversationEntry.conversation_id,
+            ConversationEntry.agent_name,
+            ConversationEntry.agent_role,
+            ConversationEntry.created_at,
+            stored_response_length().label('response_length'),
+            func.length(ConversationEntry.next_question).label('question_length'),
+            case((func.length(func.trim(ConversationEntry.next_question)) > 10, 1), else_=0).label('asked_question'),
+            func.nullif(ConversationEntry.processing_time_seconds, 0).label('processing_time'),
+            func.lead(ConversationEntry.agent_name).over(**window).label('next_agent'),
+            func.row_number().over(**window).label('position'),
+            Conversation.is_complete
+        ).join(
+            Conversation, Conversation.id == ConversationEntry.conversation_id
+        ).where(
+            ConversationEntry.created_at >= cutoff
+        ).cte('funnel_steps')
+
+        handed_off = and_(steps.c.next_agent.isnot(None), steps.c.next_agent != steps.c.agent_name)
+        return select(
+            steps.c.agent_name,
+            func.max(steps.c.agent_role).label('agent_role'),
+            func.count().label('response_count'),
+            func.count(func.distinct(steps.c.conversation_id)).label('reached'),
+            func.count(func.distinct(case((handed_off, steps.c.conversation_id)))).label('handed_off'),
+            func.count(func.distinct(case((steps.c.is_complete == True, steps.c.conversation_id)))).label('completed'),
+            func.count(func.distinct(case(
+                (handed_off, steps.c.conversation_id),
+                (steps.c.is_complete == True, steps.c.conversation_id)
+            ))).label('progressed'),
+            func.avg(steps.c.response_length).label('avg_response_length'),
+            func.avg(steps.c.question_length).label('avg_question_length'),
+            func.sum(steps.c.asked_question).label('questions_asked'),
+            func.avg(steps.c.processing_time).label('avg_processing_time'),
+            func.min(steps.c.processing_time).label('min_processing_time'),
+            func.max(steps.c.processing_time).label('max_processing_time'),
+            func.min(steps.c.created_at).label('first_response'),
+            func.max(steps.c.created_at).label('last_response'),
+            func.avg(steps.c.position).label('avg_position')
+        ).group_by(steps.c.agent_name)
+
+    def _daily_query(self, cutoff: datetime):
+        day = func.date(ConversationEntry.created_at)
+        return select(
+            ConversationEntry.agent_name,
+            day.label('date'),
+            func.count(ConversationEntry.id).label('responses'),
+            func.avg(stored_response_length()).label('avg_length'),
+            func.count(func.distinct(ConversationEntry.conversation_id)).label('unique_conversations')
+        ).where(
+            ConversationEntry.created_at >= cutoff
+        ).group_by(ConversationEntry.agent_name, day).order_by(day)
+
+    def compute(self, days: int) -> Dict[str, Any]:
+        """Run the funnel and daily aggregates for the last ``days`` days"""
+        started = time.time()
+        cutoff = datetime.utcnow() - timedelta(days=days)
+
+        rows = db.session.execute(self._funnel_query(cutoff)).all()
+        rows.sort(key=lambda row: (float(row.avg_position or 0), row.agent_name))
+        daily = db.session.execute(self._daily_query(cutoff)).all()
+
+        funnel = []
+        for stage, row in enumerate(rows, start=1):
+            reached = row.reached or 0
+            funnel.append({
+                'stage': stage,
+                'agent_name': row.agent_name,
+                'agent_role': row.agent_role,
+                'avg_position': round(float(row.avg_position or 0), 2),
+                'response_count': row.response_count,
+                'conversations_reached': reached,
+                'conversations_handed_off': row.handed_off or 0,
+                'conversations_completed': row.completed or 0,
+                'conversations_progressed': row.progressed or 0,
+                'handoff_rate': round(row.handed_off / reached * 100, 2) if reached else 0,
+                'completion_rate': round(row.completed / reached * 100, 2) if reached else 0,
+                'success_rate': round(row.progressed / reached * 100, 2) if reached else 0,
+                'questions_asked': int(row.questions_asked or 0),
+                'avg_response_length': round(float(row.avg_response_length)) if row.avg_response_length else 0,
+                'avg_question_length': round(float(row.avg_question_length)) if row.avg_question_length else 0,
+                'avg_processing_time': round(float(row.avg_processing_time), 2) if row.avg_processing_time else 0,
+                'min_processing_time': round(float(row.min_processing_time), 2) if row.min_processing_time else 0,
+                'max_processing_time': round(float(row.max_processing_time), 2) if row.max_processing_time else 0,
+                'first_response': row.first_response.isoformat() if row.first_response else None,
+                'last_response': row.last_response.isoformat() if row.last_response else None
+            })
+
+        elapsed = time.time() - started
+        logging.info(f"📊 AGENT FUNNEL: {len(funnel)} agents over {days}d in {elapsed:.2f}s")
+        return {
+            'funnel': funnel,
+            'daily': [
+                {
+                    'agent_name': row.agent_name,
+                    'date': str(row.date)[:10],
+                    'responses': row.responses,
+                    'avg_length': round(float(row.avg_length)) if row.avg_length else 0,
+                    'unique_conversations': row.unique_conversations
+                }
+                for row in daily
+            ],
+            'computed_at': datetime.utcnow().isoformat(),
+            'query_seconds': round(elapsed, 3)
+        }
+
+    def get_funnel(self, days: int = 30, refresh: bool = False) -> Dict[str, Any]:
+        """Cached funnel for a window; recomputed after AGENT_ANALYTICS_CACHE_SECONDS"""
+        now = time.time()
+        if not refresh:
+            with self._lock:
+                cached = self._cache.get(days)
+                if cached and cached[0] > now:
+                    self.hits += 1
+                    return cached[1]
+                self.misses += 1
+
+        result = self.compute(days)
+        with self._lock:
+            self._cache[days] = (now + Config.AGENT_ANALYTICS_CACHE_SECONDS, result)
+        return result
+
+    def invalidate(self, days: Optional[int] = None):
+        with self._lock:
+            if days is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(days, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            windows = sorted(self._cache)
+        return {
+            'cached_windows': windows,
+            'hits': self.hits,
+            'misses': self.misses,
+            'ttl_seconds': Config.AGENT_ANALYTICS_CACHE_SECONDS
+        }
+
+
+# Global instance
+agent_analytics = AgentFunnelAnalytics()
@@ -0,0 +1,178 @@
+"""
+Clarity scoring micro-benchmark
+Compares PhraseMatcher-based scoring with the previous per-phrase substring scans
+
+Usage: python benchmark_clarity.py [--responses 5000] [--repeat 3]
+"""
+
+import argparse
+import random
+import time
+
+from human_clarity import HumanClarityEngine, ClarityMetrics
+from utils.phrase_matcher import PhraseMatcher
+
+
+class LegacyClarityScorer:
+    """The per-phrase implementation HumanClarityEngine used before PhraseMatcher"""
+
+    def __init__(self, clarity_patterns):
+        self.clarity_patterns = clarity_patterns
+
+    def analyze_response_clarity(self, response_text: str, original_input: str) -> ClarityMetrics:
+        empathy_score = self._calculate_empathy_score(response_text)
+        actionability = self._calculate_actionability(response_text)
+        understanding_shown = self._shows_understanding(response_text, original_input)
+        dignity_preserved = self._preserves_dignity(response_text)
+        loop_completion = self._calculate_loop_completion(response_text)
+
+        clarity_score = (
+            empathy_score * 0.2 +
+            actionability * 0.3 +
+            (100 if understanding_shown else 0) * 0.2 +
+            (100 if dignity_preserved else 0) * 0.1 +
+            loop_completion * 0.2
+        )
+
+        return ClarityMetrics(
+            clarity_score=clarity_score,
+            empathy_detected=empathy_score > 30,
+            actionability=actionability,
+            understanding_shown=understanding_shown,
+            dignity_preserved=dignity_preserved,
+            loop_completion=loop_completion
+        )
+
+    def _calculate_empathy_score(self, text):
+        empathy_count = 0
+        for indicator in self.clarity_patterns["empathy_indicators"]:
+            if indicator.lower() in text.lower():
+                empathy_count += 1
+        for reducer in self.clarity_patterns["clarity_reducers"]:
+            if reducer.lower() in text.lower():
+                empathy_count -= 0.5
+        return min(100, max(0, empathy_count * 20))
+
+    def _calculate_actionability(self, text):
+        action_score = 0
+        for indicator in self.clarity_patterns["action_clarity"]:
+            if indicator.lower() in text.lower():
+                action_score += 1
+        if "step" in text.lower() or ":" in text:
+            action_score += 0.5
+        return min(100, action_score * 25)
+
+    def _shows_understanding(self, response, original_input):
+        key_words = original_input.lower().split()[:5]
+        understanding_indicators = 0
+        for word in key_words:
+            if len(word) > 3 and word in response.lower():
+                understanding_indicators += 1
+        empathy_found = any(
+            indicator.lower() in response.lower()
+            for indicator in self.clarity_patterns["empathy_indicators"]
+        )
+        return understanding_indicators >= 2 or empathy_found
+
+    def _preserves_dignity(self, text):
+        for reducer in self.clarity_patterns["dignity_reducers"]:
+            if reducer.lower() in text.lower():
+                return False
+        return True
+
+    def _calculate_loop_completion(self, text):
+        completion_score = 0
+        for indicator in self.clarity_patterns["loop_closure"]:
+            if indicator.lower() in text.lower():
+                completion_score += 1
+        if "next" in text.lower() or "now" in text.lower():
+            completion_score += 0.5
+        return min(100, completion_score * 30)
+
+
+FILLER = (
+    "Building a sustainable business requires clear positioning, pricing discipline and "
+    "consistent customer conversations. Focus on the segment that already feels the pain. "
+)
+
+
+def build_corpus(engine: HumanClarityEngine, count: int, seed: int = 7):
+    """Synthetic agent responses of realistic length sprinkled with scoring phrases"""
+    rng = random.Random(seed)
+    phrases = [phrase for category in engine.clarity_patterns.values() for phrase in category]
+    corpus = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(6, 20)):
+            parts.append(FILLER)
+            if rng.random() < 0.4:
+                parts.append(rng.choice(phrases).capitalize() + " the plan. ")
+        corpus.append((''.join(parts), "I want to launch a consulting business for small clinics"))
+    return corpus
+
+
+def time_scorer(score, corpus, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for response_text, original_input in corpus:
+            score(response_text, original_input)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def compare_strategies(categories, texts, repeat: int):
+    """Seconds for the substring and regex strategies on the same phrase set"""
+    results = {}
+    for name, threshold in (('substring', 10 ** 9), ('regex', 0)):
+        matcher = PhraseMatcher(categories, regex_min_phrases=threshold)
+        results[name] = time_scorer(lambda text, _: matcher.find_phrases(text), texts, repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--responses', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    engine = HumanClarityEngine()
+    legacy = LegacyClarityScorer(engine.clarity_patterns)
+    corpus = build_corpus(engine, args.responses)
+
+    # Both implementations must agree before timing means anything
+    mismatches = sum(
+        1 for (response_text, original_input), metrics in zip(corpus, engine.score_batch(corpus))
+        if legacy.analyze_response_clarity(response_text, original_input) != metrics
+    )
+
+    legacy_seconds = time_scorer(legacy.analyze_response_clarity, corpus, args.repeat)
+    matcher_seconds = time_scorer(engine.analyze_response_clarity, corpus, args.repeat)
+
+    started = time.perf_counter()
+    engine.score_batch(corpus)
+    batch_seconds = time.perf_counter() - started
+
+    average_length = sum(len(response_text) for response_text, _ in corpus) / len(corpus)
+    print(f"Responses: {len(corpus)} (avg {average_length:.0f} chars), best of {args.repeat}")
+    print(f"Mismatched results: {mismatches}")
+    print(f"Per-phrase scans:   {legacy_seconds:.3f}s ({len(corpus) / legacy_seconds:,.0f} responses/s)")
+    print(f"PhraseMatcher:      {matcher_seconds:.3f}s ({len(corpus) / matcher_seconds:,.0f} responses/s)")
+    print(f"score_batch:        {batch_seconds:.3f}s")
+    print(f"Speedup:            {legacy_seconds / matcher_seconds:.2f}x ({engine.matcher.strategy} strategy)")
+
+    # Matcher strategies as the phrase set grows
+    texts = [(response_text.lower(), None) for response_text, _ in corpus]
+    rng = random.Random(11)
+    words = FILLER.lower().replace('.', '').replace(',', '').split()
+    print("\nPhrases  substring  regex")
+    for extra in (0, 100, 300, 1000):
+        categories = dict(engine.clarity_patterns)
+        categories['synthetic'] = [' '.join(rng.sample(words, 3)) + f' {i}' for i in range(extra)]
+        phrase_count = sum(len(phrases) for phrases in categories.values())
+        results = compare_strategies(categories, texts, args.repeat)
+        print(f"{phrase_count:>7}  {results['substring']:>8.3f}s  {results['regex']:>5.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Metrics store SQL check
+Compiles every MetricsStore.rebuild aggregate for PostgreSQL and SQLite without a database
+
+PostgreSQL rejects constants in GROUP BY ("non-integer constant in GROUP BY"),
+which SQLite accepts, so a rebuild that works locally can fail in production.
+
+Usage: python check_metrics_sql.py [--show]
+"""
+
+import argparse
+import re
+import sys
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from metrics_store import GRANULARITIES, MetricsStore
+
+DIALECTS = {
+    'postgresql': postgresql.psycopg2.dialect(),
+    'sqlite': sqlite.pysqlite.dialect()
+}
+
+# A GROUP BY item that is only a string or numeric literal
+CONSTANT_GROUP_ITEM = re.compile(r"(?:^|,)\s*(?:'[^']*'|\d+(?:\.\d+)?)\s*(?:,|$)")
+
+
+def check(show: bool = False) -> list:
+    problems = []
+    since = datetime(2024, 1, 1)
+    for name, dialect in DIALECTS.items():
+        for source in MetricsStore._sources(name):
+            for granularity in GRANULARITIES:
+                label = f"{name} {source['metric']} ({granularity})"
+                try:
+                    query = MetricsStore.aggregate_query(source, granularity, name, since)
+                    sql = str(query.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+                except Exception as e:
+                    problems.append(f"{label}: does not compile: {e}")
+                    continue
+                group_by = sql.rsplit('GROUP BY', 1)[-1]
+                if CONSTANT_GROUP_ITEM.search(group_by):
+                    problems.append(f"{label}: constant in GROUP BY:{group_by}")
+                if show:
+                    print(f"-- {label}\n{sql}\n")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--show', action='store_true', help='print every compiled statement')
+    args = parser.parse_args()
+
+    problems = check(args.show)
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problem(s) in {len(DIALECTS)} dialects")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
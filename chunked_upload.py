@@ -0,0 +1,202 @@
+"""
+Chunked Upload Manager
+Resumable video uploads streamed to disk chunk by chunk with offset tracking and checksums
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from werkzeug.utils import secure_filename
+
+from config import Config
+from models import db, FulfillmentToken, UploadSession
+
+STREAM_BLOCK_SIZE = 64 * 1024  # bytes read from the request or file per iteration
+
+
+def file_sha256(path: Path, block_size: int = STREAM_BLOCK_SIZE) -> str:
+    """SHA-256 of a file read in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkedUploadManager:
+    """Upload sessions whose chunks are appended straight to a part file
+
+    The committed offset lives in ``UploadSession.received_bytes``; a chunk is
+    accepted only at that offset, written block by block while being hashed,
+    fsynced and then committed. A failed or mismatched chunk is truncated
+    away so the client can resend it. Memory per upload is one block no
+    matter how large the file is.
+    """
+
+    def __init__(self):
+        self.upload_folder = Path("uploads/form_check_videos")
+        self.part_folder = self.upload_folder / "partial"
+        self.part_folder.mkdir(parents=True, exist_ok=True)
+        self.max_file_size = 500 * 1024 * 1024  # 500MB
+        self.allowed_extensions = {'mp4', 'mov', 'avi', 'mkv'}
+
+    @property
+    def chunk_size(self) -> int:
+        return Config.UPLOAD_CHUNK_SIZE
+
+    def _error(self, message: str, status_code: int = 400, session: Optional[UploadSession] = None) -> Dict[str, Any]:
+        result = {"success": False, "error": message, "status_code": status_code}
+        if session is not None:
+            result["offset"] = session.received_bytes
+        return result
+
+    def create_session(self, token: FulfillmentToken, filename: str, total_size: int,
+                       sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Start an upload, or resume the unfinished one for the same file"""
+        filename = secure_filename(filename or '')
+        if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in self.allowed_extensions:
+            return self._error(f"Invalid file type. Allowed: {', '.join(sorted(self.allowed_extensions))}")
+        if total_size <= 0:
+            return self._error("File size must be greater than zero")
+        if total_size > self.max_file_size:
+            return self._error(f"File too large. Maximum size: {self.max_file_size // (1024*1024)}MB", 413)
+        sha256 = sha256.lower() if sha256 else None
+        if sha256 and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256)):
+            return self._error("sha256 must be 64 hex characters")
+
+        existing = token.upload_sessions.filter_by(
+            status='uploading', filename=filename, total_size=total_size
+        ).order_by(UploadSession.updated_at.desc()).first()
+        if existing and existing.sha256 == sha256 and Path(existing.part_path).exists():
+            logging.info(f"📦 Resuming upload {existing.id} at {existing.received_bytes}/{total_size} bytes")
+            return {"success": True, "resumed": True, "chunk_size": self.chunk_size, **existing.to_dict()}
+
+        session_id = str(uuid.uuid4())
+        part_path = self.part_folder / f"{session_id}.part"
+        part_path.touch()
+        session = UploadSession(
+            id=session_id,
+            token_id=token.id,
+            filename=filename,
+            total_size=total_size,
+            sha256=sha256,
+            part_path=str(part_path)
+        )
+        db.session.add(session)
+        db.session.commit()
+
+        logging.info(f"📦 Upload session {session_id} started for {filename} ({total_size} bytes)")
+        return {"success": True, "resumed": False, "chunk_size": self.chunk_size, **session.to_dict()}
+
+    def get_session(self, token: FulfillmentToken, session_id: str, lock: bool = False) -> Optional[UploadSession]:
+        """Session belonging to the token; ``lock`` takes a row lock so concurrent chunks serialize"""
+        query = UploadSession.query.filter_by(id=session_id, token_id=token.id)
+        if lock:
+            query = query.with_for_update()
+        return query.first()
+
+    def write_chunk(self, session: UploadSession, offset: int, stream, length: Optional[int],
+                    chunk_sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Append ``length`` bytes from ``stream`` at ``offset`` and commit the new offset"""
+        if session.status != 'uploading':
+            return self._error(f"Upload is {session.status}", 409, session)
+        if offset != session.received_bytes:
+            return self._error("Offset mismatch", 409, session)
+        if length is None:
+            return self._error("Content-Length required", 411, session)
+        if length <= 0 or length > self.chunk_size:
+            return self._error(f"Chunk must be 1-{self.chunk_size} bytes", 413, session)
+        if offset + length > session.total_size:
+            return self._error("Chunk extends past the declared file size", 416, session)
+
+        part_path = Path(session.part_path)
+        if not part_path.exists():
+            session.status = 'failed'
+            session.error = "Partial file missing"
+            db.session.commit()
+            return self._error("Partial upload data lost; start a new upload", 410, session)
+
+        digest = hashlib.sha256()
+        written = 0
+        with open(part_path, 'r+b') as handle:
+            # Drop bytes left behind by an earlier chunk that never committed
+            handle.truncate(offset)
+            handle.seek(offset)
+            while written < length:
+                block = stream.read(min(STREAM_BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                handle.write(block)
+                digest.update(block)
+                written += len(block)
+
+            if written != length:
+                handle.truncate(offset)
+                db.session.rollback()
+                return self._error(f"Incomplete chunk: received {written} of {length} bytes", 400, session)
+            if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+                handle.truncate(offset)
+                db.session.rollback()
+                return self._error("Chunk checksum mismatch", 422, session)
+
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        session.received_bytes = offset + written
+        db.session.commit()
+
+        if session.received_bytes < session.total_size:
+            return {"success": True, "complete": False, **session.to_dict()}
+        return self.finalize(session)
+
+    def finalize(self, session: UploadSession) -> Dict[str, Any]:
+        """Verify the whole-file checksum and move the part file next to single-request uploads"""
+        part_path = Path(session.part_path)
+        if session.sha256:
+            actual = file_sha256(part_path)
+            if actual != session.sha256:
+                session.status = 'failed'
+                session.error = "File checksum mismatch"
+                db.session.commit()
+                part_path.unlink(missing_ok=True)
+                logging.warning(f"⚠️ Upload {session.id} failed checksum verification")
+                return self._error("File checksum mismatch", 422, session)
+
+        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        final_path = self.upload_folder / f"{session.token.token}_{timestamp}_{session.filename}"
+        os.replace(part_path, final_path)
+
+        session.status = 'complete'
+        session.final_path = str(final_path)
+        session.completed_at = datetime.utcnow()
+        db.session.commit()
+
+        logging.info(f"✅ Upload {session.id} complete: {final_path.name} ({session.total_size} bytes)")
+        return {"success": True, "complete": True, "file_path": str(final_path), **session.to_dict()}
+
+    def latest_session(self, token: FulfillmentToken) -> Optional[UploadSession]:
+        return token.upload_sessions.order_by(UploadSession.updated_at.desc()).first()
+
+    def purge_stale_sessions(self, max_idle_hours: int = 24) -> int:
+        """Remove unfinished sessions idle for ``max_idle_hours`` along with their part files"""
+        cutoff = datetime.utcnow() - timedelta(hours=max_idle_hours)
+        stale = UploadSession.query.filter(
+            UploadSession.status.in_(('uploading', 'failed')),
+            UploadSession.updated_at < cutoff
+        ).all()
+        for session in stale:
+            Path(session.part_path).unlink(missing_ok=True)
+            db.session.delete(session)
+        db.session.commit()
+        if stale:
+            logging.info(f"🧹 Purged {len(stale)} stale upload sessions")
+        return len(stale)
+
+
+# Global instance
+chunked_upload_manager = ChunkedUploadManager()
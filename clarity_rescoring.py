@@ -0,0 +1,244 @@
+"""
+Clarity Rescoring Job
+Offline backfill that rescores historical ConversationEntry responses after phrase or weight changes
+
+Usage:
+    python clarity_rescoring.py [--chunk-size 5000] [--since 2025-01-01] [--resume] [--dry-run]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import func, select
+
+from config import config
+from models import db, ConversationEntry, ClarityMetric
+
+API_PREFIX = re.compile(r'^@(claude|gemini|openai):\s*')
+
+ENTRY_COLUMNS = (
+    ConversationEntry.id,
+    ConversationEntry.conversation_id,
+    ConversationEntry.agent_name,
+    ConversationEntry.created_at,
+    ConversationEntry.input_text,
+    ConversationEntry.response_text
+)
+
+
+def create_job_app(config_name: Optional[str] = None) -> Flask:
+    """Minimal app for database access without starting the web app's workers"""
+    app = Flask(__name__)
+    app.config.from_object(config[config_name or os.environ.get('FLASK_ENV', 'development')])
+    db.init_app(app)
+    return app
+
+
+class ClarityRescoringJob:
+    """Streams entries in id order, scores each chunk with NumPy and bulk-writes clarity_metrics
+
+    Progress is checkpointed after every committed chunk (last entry id,
+    counts, scoring fingerprint), so an interrupted run resumes where it
+    stopped. Rollups for the rescored range are rebuilt once at the end.
+    """
+
+    def __init__(self, chunk_size: int = 5000, checkpoint_path: str = 'clarity_rescoring.checkpoint.json',
+                 since: Optional[datetime] = None, dry_run: bool = False):
+        from human_clarity import clarity_engine
+        self.engine = clarity_engine
+        self.chunk_size = chunk_size
+        self.checkpoint_path = checkpoint_path
+        self.since = since
+        self.dry_run = dry_run
+
+    def fingerprint(self) -> str:
+        """Hash of the phrase lists and weights; a resume must use the same scoring"""
+        payload = json.dumps({
+            'patterns': self.engine.clarity_patterns,
+            'weights': self.engine.SCORE_WEIGHTS
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path) as f:
+            return json.load(f)
+
+    def _save_checkpoint(self, state: Dict[str, Any]):
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _base_filter(self, statement, after_id: int):
+        statement = statement.where(
+            ConversationEntry.id > after_id,
+            ConversationEntry.error_occurred == False
+        )
+        if self.since is not None:
+            statement = statement.where(ConversationEntry.created_at >= self.since)
+        return statement
+
+    def _stream_chunks(self, after_id: int) -> Iterator[List[Any]]:
+        """Chunks of entry rows in id order
+
+        PostgreSQL streams through a server-side cursor on its own connection
+        while chunks are written on the session's. SQLite and others page by
+        id, because a long-lived read cursor would block the writes.
+        """
+        statement = self._base_filter(select(*ENTRY_COLUMNS), after_id).order_by(ConversationEntry.id)
+
+        if db.engine.dialect.name == 'postgresql':
+            with db.engine.connect() as connection:
+                result = connection.execution_options(
+                    stream_results=True, yield_per=self.chunk_size
+                ).execute(statement)
+                for partition in result.partitions(self.chunk_size):
+                    yield partition
+            return
+
+        while True:
+            rows = db.session.execute(statement.limit(self.chunk_size)).all()
+            if not rows:
+                return
+            yield rows
+            statement = self._base_filter(select(*ENTRY_COLUMNS), rows[-1].id).order_by(ConversationEntry.id)
+
+    def _write_chunk(self, rows: List[Any], scores: Dict[str, np.ndarray]):
+        """Update existing metric rows and insert missing ones in one transaction"""
+        existing = dict(db.session.execute(
+            select(ClarityMetric.entry_id, ClarityMetric.id).where(
+                ClarityMetric.entry_id.in_([row.id for row in rows])
+            )
+        ).all())
+
+        analyzed_at = datetime.utcnow()
+        updates, inserts = [], []
+        for index, row in enumerate(rows):
+            values = {
+                'clarity_score': float(scores['clarity_score'][index]),
+                'empathy_detected': bool(scores['empathy_detected'][index]),
+                'actionability': float(scores['actionability'][index]),
+                'understanding_shown': bool(scores['understanding_shown'][index]),
+                'dignity_preserved': bool(scores['dignity_preserved'][index]),
+                'loop_completion': float(scores['loop_completion'][index]),
+                'analyzed_at': analyzed_at
+            }
+            if row.id in existing:
+                updates.append({'id': existing[row.id], **values})
+            else:
+                inserts.append({
+                    'entry_id': row.id,
+                    'conversation_id': row.conversation_id,
+                    'agent_name': row.agent_name,
+                    'created_at': row.created_at,
+                    **values
+                })
+
+        if updates:
+            db.session.bulk_update_mappings(ClarityMetric, updates)
+        if inserts:
+            db.session.bulk_insert_mappings(ClarityMetric, inserts)
+        db.session.commit()
+
+    def run(self, resume: bool = False) -> Dict[str, Any]:
+        fingerprint = self.fingerprint()
+        state = self._load_checkpoint() if resume else None
+        if state:
+            if state.get('fingerprint') != fingerprint:
+                raise RuntimeError("Checkpoint was written with different clarity patterns/weights; "
+                                   "start a fresh run without --resume")
+            if state.get('since'):
+                self.since = datetime.fromisoformat(state['since'])
+            logging.info(f"Resuming after entry {state['last_entry_id']} ({state['processed']} already rescored)")
+        else:
+            state = {
+                'fingerprint': fingerprint,
+                'since': self.since.isoformat() if self.since else None,
+                'last_entry_id': 0,
+                'processed': 0,
+                'phase': 'score',
+                'started_at': datetime.utcnow().isoformat()
+            }
+
+        if state['phase'] == 'score':
+            remaining = db.session.execute(
+                self._base_filter(select(func.count(ConversationEntry.id)), state['last_entry_id'])
+            ).scalar()
+            logging.info(f"Rescoring {remaining} entries in chunks of {self.chunk_size}")
+
+            started = time.time()
+            done = 0
+            score_totals = []
+            for rows in self._stream_chunks(state['last_entry_id']):
+                scores = self.engine.score_vectorized(
+                    [row.response_text for row in rows],
+                    [API_PREFIX.sub('', row.input_text or '') for row in rows]
+                )
+                score_totals.append(scores['clarity_score'])
+
+                if not self.dry_run:
+                    self._write_chunk(rows, scores)
+                    state['last_entry_id'] = rows[-1].id
+                    state['processed'] += len(rows)
+                    self._save_checkpoint(state)
+
+                done += len(rows)
+                elapsed = time.time() - started
+                rate = done / elapsed if elapsed else 0
+                eta = (remaining - done) / rate if rate else 0
+                logging.info(f"Rescored {done}/{remaining} ({done / max(remaining, 1):.1%}) "
+                             f"at {rate:,.0f} rows/s, ETA {eta:.0f}s")
+
+            if score_totals:
+                all_scores = np.concatenate(score_totals)
+                logging.info(f"Clarity score mean {all_scores.mean():.1f}, "
+                             f"p50 {np.percentile(all_scores, 50):.1f}, p90 {np.percentile(all_scores, 90):.1f}")
+
+            if self.dry_run:
+                logging.info("Dry run: nothing written")
+                return state
+
+            state['phase'] = 'rollups'
+            self._save_checkpoint(state)
+
+        if state['phase'] == 'rollups':
+            self.engine.rebuild_rollups(since=self.since)
+            state['phase'] = 'done'
+            state['finished_at'] = datetime.utcnow().isoformat()
+            self._save_checkpoint(state)
+
+        logging.info(f"Clarity rescoring complete: {state['processed']} entries")
+        return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rescore historical clarity metrics")
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--since', type=datetime.fromisoformat, default=None,
+                        help="Only rescore entries created on or after this date (ISO format)")
+    parser.add_argument('--checkpoint', default='clarity_rescoring.checkpoint.json')
+    parser.add_argument('--resume', action='store_true', help="Continue from the checkpoint file")
+    parser.add_argument('--dry-run', action='store_true', help="Score and report without writing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    app = create_job_app()
+    with app.app_context():
+        job = ClarityRescoringJob(args.chunk_size, args.checkpoint, args.since, args.dry_run)
+        job.run(resume=args.resume)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Clarity Analysis Worker
+Scores committed conversation entries for human-clarity in background batches
+"""
+
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Tuple
+
+from config import Config
+from models import db, ConversationEntry, ClarityMetric
+
+
+class ClarityAnalysisWorker:
+    """Background pipeline for clarity scoring
+
+    ``process_input`` enqueues entry ids after its commit and returns
+    immediately. A daemon thread drains the queue in batches, loads the
+    batch in one query, scores it and writes all metric rows and rollup
+    increments in one commit. A periodic sweep picks up committed entries that
+    were never queued (other code paths, restarts, a full queue).
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=Config.CLARITY_QUEUE_MAX)
+        self._app = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'processed': 0,
+            'swept': 0,
+            'failed_batches': 0,
+            'batches': 0,
+            'last_batch_size': 0,
+            'last_batch_seconds': 0.0,
+            'last_lag_seconds': 0.0,
+            'max_lag_seconds': 0.0,
+            'last_run_at': None
+        }
+
+    def init_app(self, app):
+        """Bind to the Flask app and start the worker thread"""
+        self._app = app
+        if Config.CLARITY_WORKER_ENABLED:
+            self.start()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='clarity-worker', daemon=True)
+        self._thread.start()
+        logging.info("🧠 CLARITY WORKER: started")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def enqueue(self, entry_id: int, original_input: str):
+        """Queue a committed entry for scoring; never blocks the request"""
+        if not Config.CLARITY_WORKER_ENABLED:
+            # Inline fallback keeps scoring working when the worker is switched off
+            self._process_batch([(entry_id, original_input, time.time())])
+            return
+        try:
+            self._queue.put_nowait((entry_id, original_input, time.time()))
+            self._bump('enqueued')
+        except queue.Full:
+            # The sweep will find it later
+            self._bump('dropped')
+
+    def _bump(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _drain(self) -> List[Tuple[int, str, float]]:
+        """Block for the first item, then collect up to a batch within the flush window"""
+        try:
+            batch = [self._queue.get(timeout=Config.CLARITY_SWEEP_SECONDS)]
+        except queue.Empty:
+            return []
+
+        deadline = time.time() + Config.CLARITY_FLUSH_SECONDS
+        while len(batch) < Config.CLARITY_BATCH_SIZE:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        last_sweep = 0.0
+        while not self._stop.is_set():
+            batch = self._drain()
+            if batch:
+                self._process_batch(batch)
+
+            if time.time() - last_sweep >= Config.CLARITY_SWEEP_SECONDS:
+                last_sweep = time.time()
+                self._sweep()
+
+    def _sweep(self):
+        """Queue recent committed entries that still have no clarity analysis"""
+        try:
+            with self._app.app_context():
+                now = datetime.utcnow()
+                rows = db.session.query(
+                    ConversationEntry.id, ConversationEntry.input_text, ConversationEntry.created_at
+                ).outerjoin(
+                    ClarityMetric, ClarityMetric.entry_id == ConversationEntry.id
+                ).filter(
+                    ConversationEntry.error_occurred == False,
+                    ClarityMetric.id.is_(None),
+                    ConversationEntry.created_at >= now - timedelta(hours=Config.CLARITY_SWEEP_LOOKBACK_HOURS),
+                    # Leave fresh entries to the queue
+                    ConversationEntry.created_at < now - timedelta(seconds=Config.CLARITY_SWEEP_SECONDS)
+                ).order_by(ConversationEntry.id).limit(Config.CLARITY_BATCH_SIZE).all()
+                db.session.remove()
+        except Exception as e:
+            logging.error(f"Clarity sweep failed: {str(e)}")
+            return
+
+        if rows:
+            from main import ConversationChain
+
+            self._bump('swept', len(rows))
+            epoch = datetime(1970, 1, 1)
+            # Stored inputs keep any @api: prefix; score the text the agent actually received, as enqueue does
+            self._process_batch([
+                (entry_id, ConversationChain._parse_api_override(input_text)[1], (created_at - epoch).total_seconds())
+                for entry_id, input_text, created_at in rows
+            ])
+
+    def _process_batch(self, batch: List[Tuple[int, str, float]]):
+        """Score a batch and persist every result in a single commit"""
+        started = time.time()
+        app = self._app
+        try:
+            from human_clarity import clarity_engine
+
+            with app.app_context():
+                inputs = {entry_id: original_input for entry_id, original_input, _ in batch}
+                # Entries that already have metrics (queued and swept) are skipped
+                entries = db.session.query(
+                    ConversationEntry.id, ConversationEntry.conversation_id, ConversationEntry.agent_name,
+                    ConversationEntry.response_text, ConversationEntry.created_at
+                ).outerjoin(
+                    ClarityMetric, ClarityMetric.entry_id == ConversationEntry.id
+                ).filter(
+                    ConversationEntry.id.in_(list(inputs)),
+                    ClarityMetric.id.is_(None)
+                ).all()
+
+                scores = clarity_engine.score_batch(
+                    (response_text, inputs[entry_id]) for entry_id, _, _, response_text, _ in entries
+                )
+                records = []
+                for (entry_id, conversation_id, agent_name, _, created_at), metrics in zip(entries, scores):
+                    record = clarity_engine.metrics_to_record(metrics)
+                    record.update({
+                        'entry_id': entry_id,
+                        'conversation_id': conversation_id,
+                        'agent_name': agent_name,
+                        'created_at': created_at
+                    })
+                    records.append(record)
+
+                if records:
+                    # Metric rows and hourly/daily rollups land in one commit
+                    clarity_engine.record_metrics(records)
+                    db.session.commit()
+                db.session.remove()
+
+        except Exception as e:
+            self._bump('failed_batches')
+            logging.error(f"Clarity batch of {len(batch)} failed: {str(e)}")
+            return
+
+        finished = time.time()
+        lag = finished - min(enqueued_at for _, _, enqueued_at in batch)
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['processed'] += len(records)
+            self._stats['last_batch_size'] = len(records)
+            self._stats['last_batch_seconds'] = round(finished - started, 3)
+            self._stats['last_lag_seconds'] = round(lag, 3)
+            self._stats['max_lag_seconds'] = round(max(self._stats['max_lag_seconds'], lag), 3)
+            self._stats['last_run_at'] = datetime.utcnow().isoformat()
+
+        logging.info(f"🧠 CLARITY BATCH: scored {len(records)} entries in {finished - started:.2f}s (lag {lag:.1f}s)")
+
+    def _oldest_pending_age(self) -> Optional[float]:
+        with self._queue.mutex:
+            if not self._queue.queue:
+                return None
+            return time.time() - self._queue.queue[0][2]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Backlog, lag and throughput for the admin dashboard"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        oldest = self._oldest_pending_age()
+        stats.update({
+            'enabled': Config.CLARITY_WORKER_ENABLED,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'backlog': self._queue.qsize(),
+            'oldest_pending_seconds': round(oldest, 3) if oldest is not None else 0.0,
+            'batch_size': Config.CLARITY_BATCH_SIZE,
+            'flush_seconds': Config.CLARITY_FLUSH_SECONDS
+        })
+        return stats
+
+
+# Global instance
+clarity_worker = ClarityAnalysisWorker()
@@ -40,6 +40,109 @@ class Config:
     GEMINI_MAX_TOKENS = int(os.environ.get('GEMINI_MAX_TOKENS', '500'))
     GEMINI_TEMPERATURE = float(os.environ.get('GEMINI_TEMPERATURE', '0.7'))
     
+    # Shared LLM HTTP connection pools (one per provider, see llm_clients)
+    LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get('LLM_HTTP_MAX_CONNECTIONS', '200'))
+    LLM_HTTP_MAX_KEEPALIVE = int(os.environ.get('LLM_HTTP_MAX_KEEPALIVE', '50'))
+    LLM_HTTP_TIMEOUT = float(os.environ.get('LLM_HTTP_TIMEOUT', '60'))
+    LLM_HTTP_CONNECT_TIMEOUT = float(os.environ.get('LLM_HTTP_CONNECT_TIMEOUT', '10'))
+    LLM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_HTTP_KEEPALIVE_EXPIRY', '60'))  # idle seconds before a pooled connection closes
+    
+    # Client-side LLM rate limits per provider/model (see rate_limiter)
+    LLM_RATE_LIMIT_ENABLED = os.environ.get('LLM_RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+    LLM_RATE_DEFAULT_RPM = int(os.environ.get('LLM_RATE_DEFAULT_RPM', '500'))
+    LLM_RATE_DEFAULT_TPM = int(os.environ.get('LLM_RATE_DEFAULT_TPM', '200000'))
+    LLM_RATE_MAX_CONCURRENCY = int(os.environ.get('LLM_RATE_MAX_CONCURRENCY', '16'))
+    LLM_RATE_MAX_QUEUE = int(os.environ.get('LLM_RATE_MAX_QUEUE', '200'))  # waiting calls per bucket before rejecting
+    LLM_RATE_MAX_WAIT = float(os.environ.get('LLM_RATE_MAX_WAIT', '30'))  # seconds a call may queue for a slot
+    LLM_RATE_PENALTY_SECONDS = float(os.environ.get('LLM_RATE_PENALTY_SECONDS', '10'))  # pause after a 429 without Retry-After
+    LLM_RATE_LIMITS = os.environ.get('LLM_RATE_LIMITS', '')  # JSON, e.g. {"openai": {"rpm": 3000}, "openai:gpt-4o": {"tpm": 450000}}
+    
+    # Deadline-aware LLM call execution (retries, budgets, hedging)
+    LLM_CALL_TOTAL_BUDGET = float(os.environ.get('LLM_CALL_TOTAL_BUDGET', '60'))
+    LLM_HEDGE_AFTER_SECONDS = float(os.environ.get('LLM_HEDGE_AFTER_SECONDS', '0'))  # 0 disables hedging
+    DEADLINE_EXECUTOR_WORKERS = int(os.environ.get('DEADLINE_EXECUTOR_WORKERS', '32'))
+    
+    # LLM response cache ('memory' or 'sqlite' backend)
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'True').lower() == 'true'
+    LLM_CACHE_BACKEND = os.environ.get('LLM_CACHE_BACKEND', 'memory')
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', '1000'))
+    LLM_CACHE_TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL_SECONDS', '3600'))
+    LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', 'llm_cache.sqlite3')
+    LLM_COALESCE_ENABLED = os.environ.get('LLM_COALESCE_ENABLED', 'True').lower() == 'true'  # share identical in-flight calls
+    
+    # Speculative prefetch of the next agent step in /continue_conversation
+    SPECULATIVE_ENABLED = os.environ.get('SPECULATIVE_ENABLED', 'False').lower() == 'true'
+    SPECULATIVE_MAX_IN_FLIGHT = int(os.environ.get('SPECULATIVE_MAX_IN_FLIGHT', '4'))
+    SPECULATIVE_HOURLY_BUDGET = int(os.environ.get('SPECULATIVE_HOURLY_BUDGET', '200'))  # prefetches started per rolling hour
+    SPECULATIVE_TTL_SECONDS = int(os.environ.get('SPECULATIVE_TTL_SECONDS', '900'))  # unclaimed results are discarded after this
+    
+    # Provider routing and circuit breakers
+    ROUTER_WINDOW_SECONDS = int(os.environ.get('ROUTER_WINDOW_SECONDS', '300'))
+    ROUTER_MIN_REQUESTS = int(os.environ.get('ROUTER_MIN_REQUESTS', '5'))
+    ROUTER_ERROR_RATE_THRESHOLD = float(os.environ.get('ROUTER_ERROR_RATE_THRESHOLD', '0.5'))
+    ROUTER_CONSECUTIVE_FAILURES = int(os.environ.get('ROUTER_CONSECUTIVE_FAILURES', '3'))
+    ROUTER_OPEN_SECONDS = int(os.environ.get('ROUTER_OPEN_SECONDS', '30'))
+    ROUTER_LATENCY_TOLERANCE = float(os.environ.get('ROUTER_LATENCY_TOLERANCE', '1.5'))  # preferred may be 1.5x slower than fastest
+    
+    # Full-text search index
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')  # 'auto' (tsvector/FTS5 by database) or 'memory'
+    SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', '100'))
+    SEARCH_SYNC_WINDOW = int(os.environ.get('SEARCH_SYNC_WINDOW', '1000'))  # ids below the memory index high-water mark re-checked per sync
+    SEARCH_BOOTSTRAP = os.environ.get('SEARCH_BOOTSTRAP', 'True').lower() == 'true'  # backfill when the index is empty
+    
+    # Background clarity analysis
+    CLARITY_WORKER_ENABLED = os.environ.get('CLARITY_WORKER_ENABLED', 'True').lower() == 'true'
+    CLARITY_BATCH_SIZE = int(os.environ.get('CLARITY_BATCH_SIZE', '50'))
+    CLARITY_FLUSH_SECONDS = float(os.environ.get('CLARITY_FLUSH_SECONDS', '2'))  # max wait to fill a batch
+    CLARITY_QUEUE_MAX = int(os.environ.get('CLARITY_QUEUE_MAX', '10000'))
+    CLARITY_SWEEP_SECONDS = int(os.environ.get('CLARITY_SWEEP_SECONDS', '60'))
+    CLARITY_SWEEP_LOOKBACK_HOURS = int(os.environ.get('CLARITY_SWEEP_LOOKBACK_HOURS', '24'))
+    
+    # Admin agent analytics
+    AGENT_ANALYTICS_CACHE_SECONDS = int(os.environ.get('AGENT_ANALYTICS_CACHE_SECONDS', '300'))
+    
+    # Materialised metrics counters (dashboard and health-check reads)
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '5'))  # buffered increments are written this often
+    METRICS_CACHE_SECONDS = float(os.environ.get('METRICS_CACHE_SECONDS', '15'))
+    METRICS_BOOTSTRAP = os.environ.get('METRICS_BOOTSTRAP', 'True').lower() == 'true'  # backfill when the table is empty
+    
+    # Fulfillment upload tokens
+    FULFILLMENT_TOKEN_RETENTION_DAYS = int(os.environ.get('FULFILLMENT_TOKEN_RETENTION_DAYS', '30'))  # kept after expiry
+    
+    # Chunked video uploads (each chunk must stay under MAX_CONTENT_LENGTH)
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+    UPLOAD_SESSION_IDLE_HOURS = int(os.environ.get('UPLOAD_SESSION_IDLE_HOURS', '24'))  # unfinished uploads purged after this
+    
+    # Persistent background job queue
+    JOB_WORKERS_ENABLED = os.environ.get('JOB_WORKERS_ENABLED', 'True').lower() == 'true'
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))  # worker threads per process
+    JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '2'))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+    JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS', '30'))  # doubled after every failed attempt
+    JOB_RETRY_MAX_SECONDS = float(os.environ.get('JOB_RETRY_MAX_SECONDS', '3600'))
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '900'))  # running jobs older than this are re-queued
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', '7'))
+    STRIPE_EVENT_RETENTION_DAYS = int(os.environ.get('STRIPE_EVENT_RETENTION_DAYS', '30'))  # processed webhook ids kept for deduplication
+    
+    # Outbound mail (shared SMTP pool, send queue and alert digests)
+    MAIL_BACKEND = os.environ.get('MAIL_BACKEND', 'auto')  # 'smtp', 'file', 'memory' or 'auto' (smtp when SMTP_SERVER is set)
+    SMTP_SERVER = os.environ.get('SMTP_SERVER')
+    SMTP_PORT = int(os.environ.get('SMTP_PORT', '587'))  # 465 uses implicit TLS
+    SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
+    SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+    SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', 'True').lower() == 'true'  # STARTTLS on plain ports
+    SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', '30'))
+    SMTP_CONNECTION_MAX_AGE = int(os.environ.get('SMTP_CONNECTION_MAX_AGE', '300'))  # reconnect after this many seconds
+    FROM_EMAIL = os.environ.get('FROM_EMAIL')
+    ADMIN_EMAILS = os.environ.get('ADMIN_EMAILS', '')
+    MAIL_POOL_SIZE = int(os.environ.get('MAIL_POOL_SIZE', '2'))  # SMTP connections and sender threads
+    MAIL_QUEUE_MAX = int(os.environ.get('MAIL_QUEUE_MAX', '1000'))
+    MAIL_RATE_PER_MINUTE = int(os.environ.get('MAIL_RATE_PER_MINUTE', '60'))
+    MAIL_MAX_RETRIES = int(os.environ.get('MAIL_MAX_RETRIES', '3'))
+    MAIL_DIGEST_SECONDS = int(os.environ.get('MAIL_DIGEST_SECONDS', '60'))  # alerts are batched into one email per window
+    MAIL_DIGEST_MAX_ALERTS = int(os.environ.get('MAIL_DIGEST_MAX_ALERTS', '25'))  # distinct alerts that force an early digest
+    MAIL_FILE_FOLDER = os.environ.get('MAIL_FILE_FOLDER', 'emails/sent')
+    
     # Rate Limiting Configuration
     RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL', 'memory://')
     RATELIMIT_DEFAULT = os.environ.get('RATELIMIT_DEFAULT', '10 per minute')
@@ -63,7 +166,11 @@ class Config:
     MAX_CONVERSATION_LENGTH = int(os.environ.get('MAX_CONVERSATION_LENGTH', '10'))
     MAX_INPUT_LENGTH = int(os.environ.get('MAX_INPUT_LENGTH', '5000'))
     MAX_CONVERSATIONS_PER_SESSION = int(os.environ.get('MAX_CONVERSATIONS_PER_SESSION', '50'))
-    
+
+    # Agent Loop Execution Configuration
+    LOOP_EXECUTION_MODE = os.environ.get('LOOP_EXECUTION_MODE', 'sequential')  # 'sequential' or 'parallel'
+    LOOP_MAX_WORKERS = int(os.environ.get('LOOP_MAX_WORKERS', '4'))
+
     # Admin configuration
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin123')
     ADMIN_SESSION_TIMEOUT = int(os.environ.get('ADMIN_SESSION_TIMEOUT', '3600'))  # 1 hour
@@ -6,10 +6,8 @@ Comprehensive AI executive team with specialized domain expertise
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
-import openai
-import anthropic
-import google.generativeai as genai
-from config import Config
+from llm_providers import llm_gateway
+from provider_router import provider_router
 
 class BaseCSuiteAgent:
     """Base class for C-Suite agents with multi-API support"""
@@ -20,34 +18,35 @@ class BaseCSuiteAgent:
         self.system_prompt = system_prompt
         self.preferred_api = preferred_api
         
-    def generate_response(self, input_text, conversation_history=None, api_override=None):
-        """Generate response using multi-API routing with fallback"""
+    def generate_response(self, input_text, conversation_history=None, api_override=None, use_cache=True):
+        """Generate response using health-aware multi-API routing with fallback (use_cache=False forces a fresh completion)"""
         api_to_use = api_override or self.preferred_api
+        if api_to_use not in ("openai", "claude", "gemini"):
+            api_to_use = "openai"
         
-        try:
-            if api_to_use == "claude":
-                return self._generate_claude_response(input_text, conversation_history)
-            elif api_to_use == "gemini":
-                return self._generate_gemini_response(input_text, conversation_history)
-            else:  # default to openai
-                return self._generate_openai_response(input_text, conversation_history)
-        except Exception as e:
-            logging.warning(f"Primary API {api_to_use} failed: {str(e)}")
-            # Fallback to OpenAI if available
-            if api_to_use != "openai":
-                try:
-                    return self._generate_openai_response(input_text, conversation_history)
-                except Exception as fallback_e:
-                    logging.error(f"Fallback to OpenAI also failed: {str(fallback_e)}")
-                    raise e
-            else:
-                raise e
+        # Requested API plus any other configured ones, ordered by circuit state and latency
+        candidates = [api_to_use] + [api for api in ("openai", "claude", "gemini")
+                                     if api != api_to_use and llm_gateway.is_available(api)]
+        apis = provider_router.rank(candidates, preferred=api_to_use, pinned=bool(api_override))
+        
+        generators = {
+            "openai": self._generate_openai_response,
+            "claude": self._generate_claude_response,
+            "gemini": self._generate_gemini_response
+        }
+        
+        first_error = None
+        for api in apis:
+            try:
+                return generators[api](input_text, conversation_history, use_cache)
+            except Exception as e:
+                logging.warning(f"API {api} failed for {self.name}: {str(e)}")
+                first_error = first_error or e
+        raise first_error
     
-    def _generate_openai_response(self, input_text, conversation_history=None):
+    def _generate_openai_response(self, input_text, conversation_history=None, use_cache=True):
         """Generate response using OpenAI API"""
-        client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
-        
-        messages = [{"role": "system", "content": self.system_prompt}]
+        messages = []
         
         if conversation_history:
             for entry in conversation_history[-3:]:  # Last 3 entries for context
@@ -56,19 +55,11 @@ class BaseCSuiteAgent:
         
         messages.append({"role": "user", "content": input_text})
         
-        response = client.chat.completions.create(
-            model=Config.OPENAI_MODEL,
-            messages=messages,
-            max_tokens=Config.OPENAI_MAX_TOKENS,
-            temperature=Config.OPENAI_TEMPERATURE
-        )
-        
-        return response.choices[0].message.content, "openai"
+        result = llm_gateway.generate("openai", messages, system_prompt=self.system_prompt, use_cache=use_cache)
+        return result.text, "openai"
     
-    def _generate_claude_response(self, input_text, conversation_history=None):
+    def _generate_claude_response(self, input_text, conversation_history=None, use_cache=True):
         """Generate response using Claude API"""
-        client = anthropic.Anthropic(api_key=Config.CLAUDE_API_KEY)
-        
         # Build conversation context
         conversation_context = ""
         if conversation_history:
@@ -78,20 +69,11 @@ class BaseCSuiteAgent:
         
         full_prompt = f"{self.system_prompt}\n\n{conversation_context}Human: {input_text}\n\nAssistant:"
         
-        response = client.messages.create(
-            model=Config.CLAUDE_MODEL,
-            max_tokens=Config.CLAUDE_MAX_TOKENS,
-            temperature=Config.CLAUDE_TEMPERATURE,
-            messages=[{"role": "user", "content": full_prompt}]
-        )
-        
-        return response.content[0].text, "claude"
+        result = llm_gateway.generate("claude", [{"role": "user", "content": full_prompt}], use_cache=use_cache)
+        return result.text, "claude"
     
-    def _generate_gemini_response(self, input_text, conversation_history=None):
+    def _generate_gemini_response(self, input_text, conversation_history=None, use_cache=True):
         """Generate response using Gemini API"""
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        model = genai.GenerativeModel(Config.GEMINI_MODEL)
-        
         # Build conversation context
         conversation_context = ""
         if conversation_history:
@@ -101,15 +83,8 @@ class BaseCSuiteAgent:
         
         full_prompt = f"{self.system_prompt}\n\n{conversation_context}User: {input_text}"
         
-        response = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=Config.GEMINI_MAX_TOKENS,
-                temperature=Config.GEMINI_TEMPERATURE
-            )
-        )
-        
-        return response.text, "gemini"
+        result = llm_gateway.generate("gemini", [{"role": "user", "content": full_prompt}], use_cache=use_cache)
+        return result.text, "gemini"
 
 class ChiefStrategyAgent(BaseCSuiteAgent):
     """Chief Strategy Agent (CSA) - Long-term vision, competitive intelligence, and strategic decision frameworks"""
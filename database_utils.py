@@ -3,8 +3,10 @@ Database utilities for enhanced conversation persistence and management
 """
 
 from models import db, Conversation, ConversationEntry
+from utils.pagination import paginate, InvalidCursorError
+from search_index import search_index
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_, desc, asc
+from sqlalchemy import func, and_, desc, asc
 import logging
 from typing import List, Dict, Optional, Tuple
 
@@ -18,46 +20,29 @@ class DatabaseManager:
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
         try:
-            # Basic conversation stats
-            total_conversations = Conversation.query.filter(
-                Conversation.created_at >= cutoff_date
-            ).count()
+            from metrics_store import metrics_store
+            totals = metrics_store.totals([
+                'conversations.created',
+                'conversations.completed',
+                'conversations.tokens',
+                'conversations.errored'
+            ], cutoff_date)
             
-            completed_conversations = Conversation.query.filter(
-                and_(
-                    Conversation.created_at >= cutoff_date,
-                    Conversation.is_complete == True
-                )
-            ).count()
+            # Basic conversation stats
+            total_conversations = totals['conversations.created']['count']
+            completed_conversations = totals['conversations.completed']['count']
             
             # Average completion time
-            avg_completion_time = db.session.query(
-                func.avg(
-                    func.extract('epoch', Conversation.completion_time - Conversation.created_at)
-                )
-            ).filter(
-                and_(
-                    Conversation.created_at >= cutoff_date,
-                    Conversation.completion_time.isnot(None)
-                )
-            ).scalar() or 0
+            completed = totals['conversations.completed']
+            avg_completion_time = completed['total'] / completed['count'] if completed['count'] else 0
             
             # Token usage stats
-            total_tokens = db.session.query(
-                func.sum(Conversation.total_tokens_used)
-            ).filter(
-                Conversation.created_at >= cutoff_date
-            ).scalar() or 0
+            total_tokens = int(totals['conversations.tokens']['total'])
             
             avg_tokens_per_conversation = total_tokens / total_conversations if total_conversations > 0 else 0
             
             # Error statistics
-            conversations_with_errors = Conversation.query.filter(
-                and_(
-                    Conversation.created_at >= cutoff_date,
-                    Conversation.error_count > 0
-                )
-            ).count()
+            conversations_with_errors = totals['conversations.errored']['count']
             
             error_rate = (conversations_with_errors / total_conversations * 100) if total_conversations > 0 else 0
             
@@ -88,41 +73,46 @@ class DatabaseManager:
             }
     
     @staticmethod
-    def get_conversation_list(page: int = 1, per_page: int = 10, 
+    def get_conversation_list(cursor: Optional[str] = None, per_page: int = 10,
                              search_query: Optional[str] = None,
-                             completed_only: bool = False) -> Tuple[List[Dict], int]:
-        """Get paginated conversation list with search and filtering"""
+                             completed_only: bool = False,
+                             total: str = 'approx') -> Tuple[List[Dict], Dict]:
+        """Get keyset-paginated conversation list with search and filtering
+        
+        Returns:
+            Tuple[List[Dict], Dict]: (conversation summaries, pagination metadata with next_cursor)
+        
+        Raises:
+            InvalidCursorError: if cursor cannot be decoded
+        """
         try:
-            query = Conversation.query.order_by(desc(Conversation.created_at))
+            query = Conversation.query
             
             # Apply filters
             if completed_only:
                 query = query.filter(Conversation.is_complete == True)
             
             if search_query:
-                search_pattern = f"%{search_query}%"
-                query = query.filter(
-                    or_(
-                        Conversation.initial_input.ilike(search_pattern),
-                        Conversation.id.ilike(search_pattern)
-                    )
-                )
+                # Ranked full-text matches, best first (a single page, no cursor)
+                ranked = search_index.search_conversations(search_query, per_page, base_query=query)
+                conversations = Conversation.get_summaries([conv for conv, _ in ranked])
+                for summary, (_, rank) in zip(conversations, ranked):
+                    summary['rank'] = round(rank, 4)
+                return conversations, {'per_page': per_page, 'next_cursor': None, 'has_next': False,
+                                       'total': len(conversations), 'total_is_estimate': False}
             
-            # Get paginated results
-            paginated = query.paginate(
-                page=page,
-                per_page=per_page,
-                error_out=False
-            )
+            # Get one keyset page (no OFFSET scan)
+            page = paginate(query, Conversation.created_at, Conversation.id, cursor, per_page, total)
             
-            conversations = [conv.get_summary() for conv in paginated.items]
-            total = paginated.total
+            conversations = Conversation.get_summaries(page.items)
             
-            return conversations, total
+            return conversations, page.pagination_meta()
             
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logging.error(f"Error getting conversation list: {str(e)}")
-            return [], 0
+            return [], {'per_page': per_page, 'next_cursor': None, 'has_next': False, 'total': 0, 'total_is_estimate': False}
     
     @staticmethod
     def get_conversation_with_entries(conversation_id: str) -> Optional[Dict]:
@@ -174,7 +164,7 @@ class DatabaseManager:
                 )
             ).all()
             
-            return [conv.get_summary() for conv in stale_conversations]
+            return Conversation.get_summaries(stale_conversations)
             
         except Exception as e:
             logging.error(f"Error getting stale conversations: {str(e)}")
@@ -213,7 +203,7 @@ class DatabaseManager:
                 session_id=session_id
             ).order_by(desc(Conversation.created_at)).all()
             
-            return [conv.get_summary() for conv in conversations]
+            return Conversation.get_summaries(conversations)
             
         except Exception as e:
             logging.error(f"Error getting session conversations: {str(e)}")
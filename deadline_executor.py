@@ -0,0 +1,238 @@
+"""
+Deadline-Aware Call Executor
+Thread-safe per-attempt/total time budgets, backoff and hedged retries for LLM calls
+"""
+
+import asyncio
+import functools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from config import Config
+from llm_providers import llm_gateway
+from rate_limiter import RateLimitExceeded, is_rate_limit_error
+
+
+# Deadline of the blocking attempt running on the current pool thread (monotonic seconds)
+_attempt_deadline = threading.local()
+
+
+def attempt_time_remaining() -> Optional[float]:
+    """Seconds left in the current blocking attempt, or None outside one"""
+    deadline = getattr(_attempt_deadline, 'value', None)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _caused_by(error: Optional[BaseException], predicate: Callable[[BaseException], bool]) -> bool:
+    """Whether ``error`` or anything in its cause chain matches (callers often wrap provider errors)"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if predicate(error):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when an attempt or the whole call runs out of its time budget"""
+
+
+class RetriesExhausted(Exception):
+    """Raised when every attempt failed within the budget"""
+
+    def __init__(self, message: str, attempts: int, last_error: Optional[BaseException] = None):
+        super().__init__(message)
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+class CallCancelled(Exception):
+    """Raised when the caller cancelled the call between attempts"""
+
+
+@dataclass
+class RetryPolicy:
+    """Time budgets and retry shape for one logical call"""
+    max_attempts: int = 3
+    attempt_timeout: float = 15.0
+    total_budget: Optional[float] = 60.0
+    backoff_base: float = 2.0  # linear: 2s, 4s, 6s...
+    backoff_max: float = 8.0
+    backoff_jitter: float = 0.1
+    hedge_after: Optional[float] = None  # launch a parallel attempt if the first is still running
+
+    def backoff_for(self, attempt: int) -> float:
+        delay = min(self.backoff_base * attempt, self.backoff_max)
+        return delay * (1 + random.uniform(-self.backoff_jitter, self.backoff_jitter))
+
+
+class DeadlineExecutor:
+    """Runs calls under deadlines on the shared LLM gateway loop
+
+    Timeouts use asyncio rather than SIGALRM, so they work from any thread.
+    Backoff waits are ``asyncio.sleep`` on the loop, so they do not tie up
+    worker threads. Coroutine functions run directly on the loop. Blocking
+    callables run on a bounded thread pool; Python threads cannot be
+    interrupted, so the attempt deadline is published to the thread and
+    ``llm_gateway.generate`` cancels its request when it passes, freeing the
+    thread instead of leaving it blocked on an abandoned call.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or Config.DEADLINE_EXECUTOR_WORKERS,
+            thread_name_prefix='deadline-call'
+        )
+        self.default_policy = RetryPolicy(
+            total_budget=Config.LLM_CALL_TOTAL_BUDGET or None,
+            hedge_after=Config.LLM_HEDGE_AFTER_SECONDS or None
+        )
+
+    def policy(self, **overrides) -> RetryPolicy:
+        """Default policy with selected fields overridden"""
+        values = dict(self.default_policy.__dict__)
+        values.update(overrides)
+        return RetryPolicy(**values)
+
+    @staticmethod
+    def _call_with_deadline(deadline: float, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable with its attempt deadline visible to ``llm_gateway.generate``"""
+        _attempt_deadline.value = deadline
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _attempt_deadline.value = None
+
+    async def _call_once(self, func: Callable, args: tuple, kwargs: dict,
+                         validate: Optional[Callable], attempt: int, deadline: float) -> Any:
+        if asyncio.iscoroutinefunction(func):
+            result = await func(*args, **kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self._pool, functools.partial(self._call_with_deadline, deadline, func, *args, **kwargs)
+            )
+
+        if validate is not None:
+            validate(result, attempt)
+        return result
+
+    async def _run_attempt(self, func, args, kwargs, validate, policy: RetryPolicy,
+                           attempt: int, timeout: float, label: str):
+        """Run one attempt, optionally hedged; returns (result, attempts_used)"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        # Hedges share the attempt's deadline; blocking calls give up their gateway request at it
+        deadline = time.monotonic() + timeout
+        attempts_used = attempt
+        tasks = {asyncio.ensure_future(self._call_once(func, args, kwargs, validate, attempt, deadline))}
+        hedged = False
+        last_error = None
+
+        try:
+            while tasks:
+                elapsed = loop.time() - started
+                remaining = timeout - elapsed
+                if remaining <= 0:
+                    raise DeadlineExceeded(f"{label} attempt {attempt} timed out after {timeout:.1f}s")
+
+                can_hedge = (policy.hedge_after and not hedged and attempts_used < policy.max_attempts)
+                wait_time = min(remaining, max(0.0, policy.hedge_after - elapsed)) if can_hedge else remaining
+
+                done, tasks = await asyncio.wait(tasks, timeout=wait_time, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), attempts_used
+                    last_error = task.exception()
+
+                if not tasks:
+                    raise last_error
+
+                if can_hedge and loop.time() - started >= policy.hedge_after:
+                    hedged = True
+                    attempts_used += 1
+                    logging.info(f"🪁 HEDGE: {label} still running after {policy.hedge_after:.1f}s, launching attempt {attempts_used}")
+                    tasks.add(asyncio.ensure_future(self._call_once(func, args, kwargs, validate, attempts_used, deadline)))
+
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def arun(self, func: Callable, args: tuple = (), kwargs: dict = None,
+                   policy: RetryPolicy = None, validate: Callable = None,
+                   label: str = None, cancel_event: threading.Event = None) -> Any:
+        """Call ``func`` with retries inside the policy's time budgets
+
+        Args:
+            func: Coroutine function or blocking callable
+            validate: Optional ``validate(result, attempt)`` raising to reject a result
+            cancel_event: Optional event checked between attempts
+        """
+        policy = policy or self.default_policy
+        kwargs = kwargs or {}
+        label = label or getattr(func, '__qualname__', 'call')
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + policy.total_budget if policy.total_budget else None
+
+        attempt = 0
+        last_error = None
+        while attempt < policy.max_attempts:
+            if cancel_event is not None and cancel_event.is_set():
+                raise CallCancelled(f"{label} cancelled after {attempt} attempts")
+
+            timeout = policy.attempt_timeout
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise DeadlineExceeded(f"{label} exhausted its {policy.total_budget:.1f}s budget after {attempt} attempts") from last_error
+                timeout = min(timeout, remaining)
+
+            attempt += 1
+            try:
+                result, attempt = await self._run_attempt(func, args, kwargs, validate, policy, attempt, timeout, label)
+                return result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                last_error = e
+                logging.warning(f"❌ ATTEMPT FAILED: {label} attempt {attempt}/{policy.max_attempts}: {str(e)}")
+
+            if attempt >= policy.max_attempts or _caused_by(last_error, lambda e: isinstance(e, RateLimitExceeded)):
+                # A full limiter queue is backpressure; retrying would only add to it
+                break
+
+            # After a 429 the limiter holds the next attempt until the provider bucket reopens
+            delay = 0.0 if _caused_by(last_error, is_rate_limit_error) else policy.backoff_for(attempt)
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - loop.time()))
+            logging.info(f"⏳ WAITING: {delay:.1f}s before retry {attempt + 1} of {label}")
+            await asyncio.sleep(delay)
+
+        raise RetriesExhausted(f"{label} failed after {attempt} attempts: {str(last_error)}", attempt, last_error)
+
+    def submit(self, func: Callable, **options) -> Future:
+        """Schedule ``arun`` on the gateway loop; cancelling the Future cancels the call"""
+        return llm_gateway.run_coroutine(self.arun(func, **options))
+
+    def run(self, func: Callable, **options) -> Any:
+        """Blocking bridge for synchronous callers; safe from any thread except the loop"""
+        if llm_gateway.in_loop_thread():
+            raise RuntimeError("DeadlineExecutor.run() called from the gateway loop; await arun() instead")
+
+        future = self.submit(func, **options)
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+
+# Global instance
+deadline_executor = DeadlineExecutor()
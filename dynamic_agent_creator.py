@@ -6,9 +6,8 @@ import re
 import logging
 from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
-from openai import OpenAI
 from models import db, DynamicAgent
-from config import Config
+from llm_providers import llm_gateway
 
 class DynamicAgentCreator:
     """
@@ -16,8 +15,6 @@ class DynamicAgentCreator:
     """
     
     def __init__(self):
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
-        
         # Agent personality templates for different types
         self.personality_templates = {
             'advisor': 'Strategic, analytical, solution-focused, consultative',
@@ -365,19 +362,15 @@ Remember: Your goal is to help the user achieve complete life autonomy and finan
             # Increment usage count
             self.increment_agent_usage(agent.id)
             
-            # Generate response using OpenAI
-            response = self.client.chat.completions.create(
-                model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": agent.system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                max_tokens=Config.OPENAI_MAX_TOKENS,
-                temperature=Config.OPENAI_TEMPERATURE
+            # Generate response using OpenAI (served from the response cache when the prompt repeats)
+            result = llm_gateway.generate(
+                'openai',
+                [{"role": "user", "content": user_input}],
+                system_prompt=agent.system_prompt
             )
             
-            agent_response = response.choices[0].message.content
-            tokens_used = response.usage.total_tokens
+            agent_response = result.text
+            tokens_used = result.tokens_used
             
             return {
                 'success': True,
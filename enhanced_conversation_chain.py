@@ -9,6 +9,7 @@ import uuid
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from models import db, Conversation, ConversationEntry
+from llm_clients import llm_clients
 from business_package_generator import business_package_generator
 
 class Enhanced11AgentChain:
@@ -145,10 +146,9 @@ class Enhanced11AgentChain:
     def _execute_agent(self, agent_name: str, input_text: str) -> Dict[str, Any]:
         """Execute individual agent with specialized prompts"""
         try:
-            from openai import OpenAI
-            import os
-            
-            client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+            client = llm_clients.openai()
+            if client is None:
+                raise RuntimeError("OpenAI API not available")
             
             # Get agent-specific system prompt
             system_prompt = self._get_agent_system_prompt(agent_name)
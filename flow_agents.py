@@ -2,11 +2,10 @@
 Replit Flow Platform - Dual-Purpose Agent System
 Personal life optimization and project development agents
 """
-import os
 import logging
 from typing import Dict, Any, Optional
-from openai import OpenAI
 from config import Config
+from llm_providers import llm_gateway
 
 class BaseFlowAgent:
     """Base class for Flow Platform agents"""
@@ -16,25 +15,21 @@ class BaseFlowAgent:
         self.role = role
         self.system_prompt = system_prompt
         
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-        
     def _call_openai(self, prompt: str, max_tokens: int = 800) -> Dict[str, Any]:
         """Call OpenAI API with error handling"""
         try:
-            response = self.client.chat.completions.create(
+            result = llm_gateway.generate(
+                'openai',
+                [{"role": "user", "content": prompt}],
+                system_prompt=self.system_prompt,
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
                 max_tokens=max_tokens,
                 temperature=0.7
             )
             
             return {
-                'response': response.choices[0].message.content,
-                'tokens_used': response.usage.total_tokens if response.usage else 0,
+                'response': result.text,
+                'tokens_used': result.tokens_used,
                 'success': True
             }
             
@@ -5,7 +5,6 @@ Handles instant delivery after Stripe payment with video upload, processing, and
 
 import os
 import logging
-import smtplib
 import requests
 import tempfile
 import uuid
@@ -24,8 +23,10 @@ except ImportError:
     from email.mime.multipart import MIMEMultipart as MimeMultipart
     from email.mime.application import MIMEApplication as MimeApplication
 
-from models import db, Payment, PaymentStatus
+from models import db, Payment, PaymentStatus, FulfillmentToken
 from notifications import NotificationManager
+from job_queue import job_queue
+from mail_service import mail_service
 
 class FulfillmentSystem:
     """Automated fulfillment system for AI Form Check Pro Report"""
@@ -40,8 +41,8 @@ class FulfillmentSystem:
     def trigger_fulfillment(self, payment_id: int) -> Dict[str, Any]:
         """Trigger automated fulfillment for AI Form Check Pro Report"""
         try:
-            # Get payment details
-            payment = Payment.query.get(payment_id)
+            # Get payment details (row lock so concurrent webhook events issue one token)
+            payment = Payment.query.filter_by(id=payment_id).with_for_update().populate_existing().first()
             if not payment or payment.status != PaymentStatus.PAID:
                 return {"success": False, "error": "Payment not found or not paid"}
             
@@ -49,17 +50,28 @@ class FulfillmentSystem:
             if "ai form check" not in payment.project_name.lower():
                 return {"success": False, "error": "Not an AI Form Check Pro Report order"}
             
+            # Stripe retries and duplicate events reuse the token already issued
+            existing = payment.fulfillment_tokens.order_by(FulfillmentToken.id).first()
+            if existing:
+                db.session.commit()
+                return {
+                    "success": True,
+                    "already_triggered": True,
+                    "upload_token": existing.token,
+                    "upload_expiry": existing.expires_at.isoformat()
+                }
+            
             # Generate unique upload token
             upload_token = str(uuid.uuid4())
             upload_expiry = datetime.utcnow() + timedelta(hours=48)  # 48-hour upload window
             
-            # Store upload token in payment metadata
-            payment.description = json.dumps({
-                "original_description": payment.description or "",
-                "upload_token": upload_token,
-                "upload_expiry": upload_expiry.isoformat(),
-                "fulfillment_started": datetime.utcnow().isoformat()
-            })
+            # Store upload token (unique index on token, expiry indexed for cleanup)
+            db.session.add(FulfillmentToken(
+                token=upload_token,
+                payment_id=payment.id,
+                expires_at=upload_expiry,
+                fulfillment_started_at=datetime.utcnow()
+            ))
             db.session.commit()
             
             # Send upload instructions email
@@ -91,6 +103,7 @@ class FulfillmentSystem:
                 return email_result
                 
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error triggering fulfillment: {str(e)}")
             return {"success": False, "error": f"Fulfillment error: {str(e)}"}
     
@@ -180,38 +193,99 @@ class FulfillmentSystem:
             logging.error(f"Error sending upload instructions: {str(e)}")
             return {"success": False, "error": f"Email error: {str(e)}"}
     
+    def find_upload_token(self, upload_token: str) -> Optional[FulfillmentToken]:
+        """Look up an upload token through its unique index"""
+        if not upload_token or len(upload_token) > 36:
+            return None
+        return FulfillmentToken.query.filter_by(token=upload_token).first()
+    
+    def migrate_legacy_tokens(self, batch_size: int = 500) -> int:
+        """Move upload tokens stored as JSON in Payment.description into fulfillment_tokens
+        
+        The description is restored to the original text kept under
+        "original_description". Already-migrated tokens are skipped.
+        """
+        migrated = 0
+        last_id = 0
+        while True:
+            payments = Payment.query.filter(
+                Payment.id > last_id,
+                Payment.description.like('%"upload_token"%')
+            ).order_by(Payment.id).limit(batch_size).all()
+            if not payments:
+                break
+            
+            for payment in payments:
+                try:
+                    metadata = json.loads(payment.description)
+                    upload_token = metadata["upload_token"]
+                    upload_expiry = datetime.fromisoformat(metadata["upload_expiry"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                
+                if not FulfillmentToken.query.filter_by(token=upload_token).first():
+                    started = metadata.get("fulfillment_started")
+                    completed = metadata.get("fulfillment_completed")
+                    db.session.add(FulfillmentToken(
+                        token=upload_token,
+                        payment_id=payment.id,
+                        expires_at=upload_expiry,
+                        fulfillment_started_at=datetime.fromisoformat(started) if started else None,
+                        fulfillment_completed_at=datetime.fromisoformat(completed) if completed else None,
+                        video_processed=metadata.get("video_processed"),
+                        report_delivered=bool(metadata.get("report_delivered", False))
+                    ))
+                payment.description = metadata.get("original_description") or None
+                migrated += 1
+            
+            db.session.commit()
+            last_id = payments[-1].id
+        
+        if migrated:
+            logging.info(f"Migrated {migrated} legacy upload tokens into fulfillment_tokens")
+        return migrated
+    
+    def purge_expired_tokens(self, retention_days: int = 30) -> int:
+        """Delete tokens whose upload window closed more than ``retention_days`` ago (uses the expiry index)"""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        deleted = FulfillmentToken.query.filter(
+            FulfillmentToken.expires_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if deleted:
+            logging.info(f"Purged {deleted} expired upload tokens")
+        return deleted
+    
     def process_uploaded_video(self, upload_token: str, video_file_path: str) -> Dict[str, Any]:
         """Process uploaded video and generate AI Form Check Pro Report"""
         try:
             # Find payment by upload token
-            payments = Payment.query.all()
-            payment = None
-            
-            for p in payments:
-                try:
-                    metadata = json.loads(p.description or "{}")
-                    if metadata.get("upload_token") == upload_token:
-                        payment = p
-                        break
-                except:
-                    continue
+            token = self.find_upload_token(upload_token)
+            if not token:
+                return {"success": False, "error": "Invalid upload token", "retryable": False}
             
-            if not payment:
-                return {"success": False, "error": "Invalid upload token"}
+            # Already delivered (job re-run after a crash between commit and ack)
+            if token.report_delivered:
+                return {"success": True, "message": "Report already delivered", "delivery_time": "< 5 minutes"}
             
             # Check upload expiry
-            metadata = json.loads(payment.description)
-            upload_expiry = datetime.fromisoformat(metadata["upload_expiry"])
-            if datetime.utcnow() > upload_expiry:
-                return {"success": False, "error": "Upload window expired"}
+            if token.is_expired():
+                return {"success": False, "error": "Upload window expired", "retryable": False}
+            payment = token.payment
             
-            # Move video to processing folder
-            video_filename = f"{upload_token}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.mp4"
-            processed_video_path = self.processed_folder / video_filename
-            
-            # Copy video file
-            import shutil
-            shutil.move(video_file_path, processed_video_path)
+            if not Path(video_file_path).exists() and token.video_processed and Path(token.video_processed).exists():
+                # Retry of a job that already moved the video
+                processed_video_path = Path(token.video_processed)
+            else:
+                # Move video to processing folder
+                video_filename = f"{upload_token}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.mp4"
+                processed_video_path = self.processed_folder / video_filename
+                
+                # Copy video file
+                import shutil
+                shutil.move(video_file_path, processed_video_path)
+                token.video_processed = str(processed_video_path)
+                db.session.commit()
             
             # Generate AI analysis (simulate for now)
             analysis_result = self.generate_form_analysis(processed_video_path, payment.client_name)
@@ -230,11 +304,10 @@ class FulfillmentSystem:
                     )
                     
                     if delivery_result["success"]:
-                        # Update payment metadata
-                        metadata["fulfillment_completed"] = datetime.utcnow().isoformat()
-                        metadata["video_processed"] = str(processed_video_path)
-                        metadata["report_delivered"] = True
-                        payment.description = json.dumps(metadata)
+                        # Update fulfillment record
+                        token.fulfillment_completed_at = datetime.utcnow()
+                        token.video_processed = str(processed_video_path)
+                        token.report_delivered = True
                         db.session.commit()
                         
                         # Send notification
@@ -610,62 +683,25 @@ This comprehensive analysis was generated using advanced AI movement analysis te
             return {"success": False, "error": f"Delivery email error: {str(e)}"}
     
     def send_email(self, to_email: str, subject: str, html_body: str) -> Dict[str, Any]:
-        """Send HTML email (mock implementation for development)"""
-        try:
-            # For development, simulate email sending and log the content
-            logging.info(f"📧 SIMULATED EMAIL SENT")
-            logging.info(f"To: {to_email}")
-            logging.info(f"Subject: {subject}")
-            logging.info(f"Body preview: {html_body[:200]}...")
-            
-            # In production, integrate with actual email service (SendGrid, Mailgun, etc.)
-            # For now, create a local copy of the email for reference
-            email_folder = Path("emails/sent")
-            email_folder.mkdir(parents=True, exist_ok=True)
-            
-            email_filename = f"email_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{to_email.replace('@', '_at_')}.html"
-            email_path = email_folder / email_filename
-            
-            with open(email_path, 'w') as f:
-                f.write(f"<!-- Email sent to {to_email} -->\n")
-                f.write(f"<!-- Subject: {subject} -->\n")
-                f.write(html_body)
-            
-            return {"success": True, "message": "Email simulated successfully", "email_file": str(email_path)}
-            
-        except Exception as e:
-            logging.error(f"Error simulating email: {str(e)}")
-            return {"success": False, "error": f"Email simulation failed: {str(e)}"}
+        """Queue an HTML email for background delivery"""
+        result = mail_service.send(to_email, subject, html_body=html_body)
+        if result["success"]:
+            logging.info(f"📧 Email queued for {to_email}: {subject}")
+        return result
     
     def send_email_with_attachment(self, to_email: str, subject: str, html_body: str, 
                                  attachment_path: Path) -> Dict[str, Any]:
-        """Send HTML email with PDF attachment (mock implementation for development)"""
-        try:
-            # For development, simulate email sending with attachment
-            logging.info(f"📧 SIMULATED EMAIL WITH ATTACHMENT SENT")
-            logging.info(f"To: {to_email}")
-            logging.info(f"Subject: {subject}")
-            logging.info(f"Attachment: {attachment_path}")
-            logging.info(f"Body preview: {html_body[:200]}...")
-            
-            # Create a local copy of the email for reference
-            email_folder = Path("emails/sent")
-            email_folder.mkdir(parents=True, exist_ok=True)
-            
-            email_filename = f"email_with_attachment_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{to_email.replace('@', '_at_')}.html"
-            email_path = email_folder / email_filename
-            
-            with open(email_path, 'w') as f:
-                f.write(f"<!-- Email with attachment sent to {to_email} -->\n")
-                f.write(f"<!-- Subject: {subject} -->\n")
-                f.write(f"<!-- Attachment: {attachment_path} -->\n")
-                f.write(html_body)
-            
-            return {"success": True, "message": "Email with attachment simulated successfully", "email_file": str(email_path)}
-            
-        except Exception as e:
-            logging.error(f"Error simulating email with attachment: {str(e)}")
-            return {"success": False, "error": f"Email simulation failed: {str(e)}"}
+        """Send HTML email with the report attached, waiting for the outcome so the job can retry"""
+        result = mail_service.send_now(to_email, subject, html_body=html_body, attachments=[attachment_path])
+        if result["success"]:
+            logging.info(f"📧 Report email sent to {to_email} with {Path(attachment_path).name}")
+        return result
 
 # Global fulfillment system instance
-fulfillment_system = FulfillmentSystem()
\ No newline at end of file
+fulfillment_system = FulfillmentSystem()
+
+# Uploaded videos are analysed and delivered by the background job queue
+job_queue.register(
+    'process_uploaded_video',
+    lambda payload: fulfillment_system.process_uploaded_video(payload['upload_token'], payload['video_path'])
+)
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+Health Snapshot
+SystemMonitor inputs: event counts from the metric counters, stale count and latency percentiles in one query
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, case, func, select, true
+
+from metrics_store import metrics_store, seconds_between
+from models import db, Conversation, ConversationEntry
+
+PERCENTILES = (50, 95, 99)
+
+COUNT_FIELDS = (
+    'stale_conversations', 'created_24h', 'completed_24h', 'created_1h', 'stuck_1h',
+    'response_count', 'processing_count', 'entries_1h', 'entry_errors_1h'
+)
+
+
+def distribution(values, prefix: str):
+    """One-row subquery with nearest-rank percentiles, mean and count of a ``value`` column
+
+    Uses row_number()/count() windows instead of percentile_cont so the same
+    SQL runs on PostgreSQL and SQLite.
+    """
+    ranked = select(
+        values.c.value,
+        func.row_number().over(order_by=values.c.value).label('rank'),
+        func.count().over().label('total')
+    ).subquery(f'{prefix}_ranked')
+
+    return select(
+        *[
+            func.min(case((ranked.c.rank * 100 >= percentile * ranked.c.total, ranked.c.value))).label(f'{prefix}_p{percentile}')
+            for percentile in PERCENTILES
+        ],
+        func.avg(ranked.c.value).label(f'{prefix}_avg'),
+        func.count(ranked.c.value).label(f'{prefix}_count')
+    ).subquery(prefix)
+
+
+class HealthSnapshotEngine:
+    """Builds and runs the health snapshot
+
+    Event counts (24h created/completed, entries, errors) are read from the
+    metrics_store counters, as the checks did before snapshots existed, so no
+    raw-table scan is needed for them. SQL is used only for what counters
+    cannot answer: current state (stale conversations, served by
+    idx_conversation_status_updated, and conversations from the last hour
+    still at the first agent, over the same exact window as their total) and
+    the p50/p95/p99 and mean of response times (created → last update of
+    conversations completed in the last hour) and per-entry processing times.
+    Those are one-row subqueries cross-joined into one SELECT.
+    """
+
+    def __init__(self, stale_after: timedelta = timedelta(hours=2)):
+        self.stale_after = stale_after
+
+    def build_statement(self, now: datetime):
+        dialect = db.session.get_bind().dialect.name
+        last_hour = now - timedelta(hours=1)
+        stale_before = now - self.stale_after
+
+        stale = select(
+            func.count(Conversation.id).label('stale_conversations')
+        ).where(
+            Conversation.is_complete == False,
+            Conversation.updated_at < stale_before
+        ).subquery('stale_counts')
+
+        # Started in the last hour but not past the first agent; counted here, not from hour-aligned
+        # counter buckets, so stuck and total cover exactly the same conversations
+        recent = select(
+            func.count(Conversation.id).label('created_1h'),
+            func.coalesce(func.sum(case((and_(
+                Conversation.current_agent_index == 0,
+                Conversation.is_complete == False
+            ), 1), else_=0)), 0).label('stuck_1h')
+        ).where(
+            Conversation.created_at >= last_hour
+        ).subquery('recent_counts')
+
+        response_times = distribution(select(
+            seconds_between(Conversation.created_at, Conversation.updated_at, dialect).label('value')
+        ).where(
+            Conversation.is_complete == True,
+            Conversation.updated_at >= last_hour
+        ).subquery('response_values'), 'response')
+
+        processing_times = distribution(select(
+            ConversationEntry.processing_time_seconds.label('value')
+        ).where(
+            ConversationEntry.created_at >= last_hour,
+            ConversationEntry.processing_time_seconds > 0
+        ).subquery('processing_values'), 'processing')
+
+        return select(stale, recent, response_times, processing_times).select_from(
+            stale.join(recent, true()).join(response_times, true()).join(processing_times, true())
+        )
+
+    @staticmethod
+    def counts(now: datetime) -> Dict[str, int]:
+        """Event counts from the metric counters (bucket-aligned windows, cached briefly)"""
+        day = metrics_store.totals(['conversations.created', 'conversations.completed'], now - timedelta(hours=24))
+        hour = metrics_store.totals(['entries.created', 'entries.errors'], now - timedelta(hours=1))
+        return {
+            'created_24h': day['conversations.created']['count'],
+            'completed_24h': day['conversations.completed']['count'],
+            'entries_1h': hour['entries.created']['count'],
+            'entry_errors_1h': hour['entries.errors']['count']
+        }
+
+    def take(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Run the snapshot and derive rates; raises when the database is unreachable"""
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        row = db.session.execute(self.build_statement(now)).mappings().one()
+        elapsed = time.perf_counter() - started
+
+        # PostgreSQL returns SUM() as Decimal
+        snapshot = {
+            key: None if value is None else int(value) if key in COUNT_FIELDS else round(float(value), 3)
+            for key, value in row.items()
+        }
+        snapshot.update(self.counts(now))
+
+        created_24h = snapshot['created_24h'] or 0
+        created_1h = snapshot['created_1h'] or 0
+        entries_1h = snapshot['entries_1h'] or 0
+        snapshot.update({
+            'taken_at': now.isoformat(),
+            'query_ms': round(elapsed * 1000, 2),
+            'completion_rate_24h': round(snapshot['completed_24h'] / created_24h, 4) if created_24h else None,
+            'stuck_ratio_1h': round(snapshot['stuck_1h'] / created_1h, 4) if created_1h else None,
+            'entry_error_rate_1h': round(snapshot['entry_errors_1h'] / entries_1h, 4) if entries_1h else None
+        })
+        return snapshot
+
+
+# Global instance
+health_snapshot_engine = HealthSnapshotEngine()
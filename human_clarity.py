@@ -5,13 +5,24 @@ Measures and improves how well AI agents serve human understanding
 
 import json
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
-from main import db
-from models import ConversationEntry, Conversation
+import numpy as np
+from sqlalchemy import case, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, ConversationEntry, Conversation, ClarityMetric, ClarityRollup
+from utils.phrase_matcher import PhraseMatcher
+
+ROLLUP_GRANULARITIES = ('hour', 'day')
+ROLLUP_COUNTERS = (
+    'response_count', 'clarity_score_sum', 'empathy_count', 'actionability_sum',
+    'understanding_count', 'dignity_count', 'loop_completion_sum'
+)
 
 
 class ClarityLevel(Enum):
@@ -35,6 +46,15 @@ class ClarityMetrics:
 class HumanClarityEngine:
     """Engine for measuring and improving human-clarity in AI responses"""
     
+    # Contribution of each 0-100 component to the overall clarity score
+    SCORE_WEIGHTS = {
+        "empathy": 0.2,
+        "actionability": 0.3,
+        "understanding": 0.2,
+        "dignity": 0.1,
+        "loop_completion": 0.2
+    }
+    
     def __init__(self):
         self.clarity_patterns = {
             # Positive patterns that show human understanding
@@ -68,34 +88,52 @@ class HumanClarityEngine:
                 "You should probably",
                 "It depends",
                 "There are many factors"
-            ]
+            ],
+            # Condescending or overly limiting language
+            "dignity_reducers": [
+                "you should probably",
+                "you might want to consider",
+                "it's complicated",
+                "you may not understand",
+                "this is beyond"
+            ],
+            # Single-token signals for steps/instructions and forward momentum
+            "step_markers": ["step", ":"],
+            "momentum_markers": ["next", "now"]
         }
+        
+        # All categories are scored from one pass over the lowercased response
+        self.matcher = PhraseMatcher(self.clarity_patterns)
     
     def analyze_response_clarity(self, response_text: str, original_input: str) -> ClarityMetrics:
         """Analyze how well a response serves human understanding"""
         
+        lowered = response_text.lower()
+        found = self.matcher.match(lowered, lowered=True)
+        
         # Calculate empathy score
-        empathy_score = self._calculate_empathy_score(response_text)
+        empathy_score = self._calculate_empathy_score(found)
         
         # Calculate actionability 
-        actionability = self._calculate_actionability(response_text)
+        actionability = self._calculate_actionability(found)
         
         # Check if understanding is shown
-        understanding_shown = self._shows_understanding(response_text, original_input)
+        understanding_shown = self._shows_understanding(lowered, original_input, found)
         
         # Check dignity preservation
-        dignity_preserved = self._preserves_dignity(response_text)
+        dignity_preserved = self._preserves_dignity(found)
         
         # Calculate loop completion
-        loop_completion = self._calculate_loop_completion(response_text)
+        loop_completion = self._calculate_loop_completion(found)
         
         # Overall clarity score
+        weights = self.SCORE_WEIGHTS
         clarity_score = (
-            empathy_score * 0.2 +
-            actionability * 0.3 +
-            (100 if understanding_shown else 0) * 0.2 +
-            (100 if dignity_preserved else 0) * 0.1 +
-            loop_completion * 0.2
+            empathy_score * weights["empathy"] +
+            actionability * weights["actionability"] +
+            (100 if understanding_shown else 0) * weights["understanding"] +
+            (100 if dignity_preserved else 0) * weights["dignity"] +
+            loop_completion * weights["loop_completion"]
         )
         
         return ClarityMetrics(
@@ -107,78 +145,104 @@ class HumanClarityEngine:
             loop_completion=loop_completion
         )
     
-    def _calculate_empathy_score(self, text: str) -> float:
+    def score_batch(self, items: Iterable[Tuple[str, str]]) -> List[ClarityMetrics]:
+        """Score many (response_text, original_input) pairs, e.g. when re-running historical analytics"""
+        analyze = self.analyze_response_clarity
+        return [analyze(response_text or '', original_input or '') for response_text, original_input in items]
+    
+    def score_vectorized(self, responses: List[str], original_inputs: List[str]) -> Dict[str, np.ndarray]:
+        """Score many responses at once with NumPy; same results as analyze_response_clarity
+        
+        Phrase presence is gathered into a (responses x phrases) 0/1 matrix and
+        turned into per-category counts with one matrix product; the scoring
+        formulas then run as array operations over the whole batch.
+        """
+        categories = list(self.clarity_patterns)
+        phrases = sorted({phrase for name in categories for phrase in self.matcher.categories[name]})
+        phrase_index = {phrase: i for i, phrase in enumerate(phrases)}
+        membership = np.zeros((len(phrases), len(categories)), dtype=np.float64)
+        for column, name in enumerate(categories):
+            for phrase in self.matcher.categories[name]:
+                membership[phrase_index[phrase], column] = 1
+        
+        presence = np.zeros((len(responses), len(phrases)), dtype=np.float64)
+        keyword_hits = np.zeros(len(responses), dtype=np.int64)
+        for row, (response_text, original_input) in enumerate(zip(responses, original_inputs)):
+            lowered = (response_text or '').lower()
+            for phrase in self.matcher.find_phrases(lowered):
+                presence[row, phrase_index[phrase]] = 1
+            keyword_hits[row] = self._keyword_hits(lowered, original_input or '')
+        
+        counts = presence @ membership
+        count = {name: counts[:, column] for column, name in enumerate(categories)}
+        
+        empathy = np.clip((count["empathy_indicators"] - 0.5 * count["clarity_reducers"]) * 20, 0, 100)
+        actionability = np.minimum(100, (count["action_clarity"] + 0.5 * (count["step_markers"] > 0)) * 25)
+        understanding = (keyword_hits >= 2) | (count["empathy_indicators"] > 0)
+        dignity = count["dignity_reducers"] == 0
+        loop_completion = np.minimum(100, (count["loop_closure"] + 0.5 * (count["momentum_markers"] > 0)) * 30)
+        
+        weights = self.SCORE_WEIGHTS
+        clarity_score = (
+            empathy * weights["empathy"] +
+            actionability * weights["actionability"] +
+            np.where(understanding, 100, 0) * weights["understanding"] +
+            np.where(dignity, 100, 0) * weights["dignity"] +
+            loop_completion * weights["loop_completion"]
+        )
+        
+        return {
+            "clarity_score": clarity_score,
+            "empathy_detected": empathy > 30,
+            "actionability": actionability,
+            "understanding_shown": understanding,
+            "dignity_preserved": dignity,
+            "loop_completion": loop_completion
+        }
+    
+    def _calculate_empathy_score(self, found: Dict[str, Set[str]]) -> float:
         """Calculate empathy indicators in response"""
-        empathy_count = 0
-        for indicator in self.clarity_patterns["empathy_indicators"]:
-            if indicator.lower() in text.lower():
-                empathy_count += 1
+        empathy_count = len(found["empathy_indicators"])
         
         # Penalty for AI-centric language
-        for reducer in self.clarity_patterns["clarity_reducers"]:
-            if reducer.lower() in text.lower():
-                empathy_count -= 0.5
+        empathy_count -= 0.5 * len(found["clarity_reducers"])
         
         return min(100, max(0, empathy_count * 20))
     
-    def _calculate_actionability(self, text: str) -> float:
+    def _calculate_actionability(self, found: Dict[str, Set[str]]) -> float:
         """Calculate how actionable the response is"""
-        action_score = 0
-        for indicator in self.clarity_patterns["action_clarity"]:
-            if indicator.lower() in text.lower():
-                action_score += 1
+        action_score = len(found["action_clarity"])
         
         # Check for specific steps or instructions
-        if "step" in text.lower() or ":" in text:
+        if found["step_markers"]:
             action_score += 0.5
         
         return min(100, action_score * 25)
     
-    def _shows_understanding(self, response: str, original_input: str) -> bool:
+    def _shows_understanding(self, lowered_response: str, original_input: str, found: Dict[str, Set[str]]) -> bool:
         """Check if response demonstrates understanding of human need"""
-        # Look for reflection of user's intent
-        key_words = original_input.lower().split()[:5]  # First 5 words often contain intent
-        
-        understanding_indicators = 0
-        for word in key_words:
-            if len(word) > 3 and word in response.lower():
-                understanding_indicators += 1
+        understanding_indicators = self._keyword_hits(lowered_response, original_input)
         
         # Also check for empathy patterns
-        empathy_found = any(
-            indicator.lower() in response.lower() 
-            for indicator in self.clarity_patterns["empathy_indicators"]
-        )
-        
-        return understanding_indicators >= 2 or empathy_found
+        return understanding_indicators >= 2 or bool(found["empathy_indicators"])
     
-    def _preserves_dignity(self, text: str) -> bool:
+    @staticmethod
+    def _keyword_hits(lowered_response: str, original_input: str) -> int:
+        """Count of the input's leading intent words reflected in the response"""
+        # Look for reflection of user's intent
+        key_words = original_input.lower().split()[:5]  # First 5 words often contain intent
+        return sum(1 for word in key_words if len(word) > 3 and word in lowered_response)
+    
+    def _preserves_dignity(self, found: Dict[str, Set[str]]) -> bool:
         """Check if response preserves human dignity"""
-        # Avoid condescending or overly limiting language
-        dignity_reducers = [
-            "you should probably",
-            "you might want to consider",
-            "it's complicated",
-            "you may not understand",
-            "this is beyond"
-        ]
-        
-        for reducer in dignity_reducers:
-            if reducer.lower() in text.lower():
-                return False
-        
-        return True
+        return not found["dignity_reducers"]
     
-    def _calculate_loop_completion(self, text: str) -> float:
+    def _calculate_loop_completion(self, found: Dict[str, Set[str]]) -> float:
         """Calculate how well the response closes the mental loop"""
-        completion_score = 0
-        
-        for indicator in self.clarity_patterns["loop_closure"]:
-            if indicator.lower() in text.lower():
-                completion_score += 1
+        completion_score = len(found["loop_closure"])
         
         # Check for forward momentum
-        if "next" in text.lower() or "now" in text.lower():
+        if found["momentum_markers"]:
             completion_score += 0.5
         
         return min(100, completion_score * 30)
@@ -207,77 +271,283 @@ class HumanClarityEngine:
         
         return suggestions
     
+    @staticmethod
+    def metrics_to_record(metrics: ClarityMetrics) -> Dict:
+        """ClarityMetric column values for a scored response"""
+        return {
+            "clarity_score": metrics.clarity_score,
+            "empathy_detected": metrics.empathy_detected,
+            "actionability": metrics.actionability,
+            "understanding_shown": metrics.understanding_shown,
+            "dignity_preserved": metrics.dignity_preserved,
+            "loop_completion": metrics.loop_completion,
+            "analyzed_at": datetime.utcnow()
+        }
+    
+    @staticmethod
+    def _bucket_start(moment: datetime, granularity: str) -> datetime:
+        if granularity == 'hour':
+            return moment.replace(minute=0, second=0, microsecond=0)
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    def _apply_rollups(self, records: List[Dict]):
+        """Add a batch of metric records to the hourly and daily rollups"""
+        deltas = {}
+        for record in records:
+            for granularity in ROLLUP_GRANULARITIES:
+                key = (granularity, self._bucket_start(record['created_at'], granularity), record['agent_name'])
+                delta = deltas.setdefault(key, dict.fromkeys(ROLLUP_COUNTERS, 0))
+                delta['response_count'] += 1
+                delta['clarity_score_sum'] += record['clarity_score']
+                delta['empathy_count'] += int(record['empathy_detected'])
+                delta['actionability_sum'] += record['actionability']
+                delta['understanding_count'] += int(record['understanding_shown'])
+                delta['dignity_count'] += int(record['dignity_preserved'])
+                delta['loop_completion_sum'] += record['loop_completion']
+        
+        dialect = db.session.get_bind().dialect.name
+        table = ClarityRollup.__table__
+        now = datetime.utcnow()
+        for (granularity, bucket_start, agent_name), delta in deltas.items():
+            if dialect in ('postgresql', 'sqlite'):
+                insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+                stmt = insert(table).values(
+                    granularity=granularity, bucket_start=bucket_start, agent_name=agent_name,
+                    updated_at=now, **delta
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['granularity', 'bucket_start', 'agent_name'],
+                    set_={**{name: table.c[name] + stmt.excluded[name] for name in ROLLUP_COUNTERS}, 'updated_at': now}
+                )
+                db.session.execute(stmt)
+            else:
+                result = db.session.execute(
+                    table.update().where(
+                        (table.c.granularity == granularity) &
+                        (table.c.bucket_start == bucket_start) &
+                        (table.c.agent_name == agent_name)
+                    ).values(**{name: table.c[name] + value for name, value in delta.items()}, updated_at=now)
+                )
+                if result.rowcount == 0:
+                    db.session.execute(table.insert().values(
+                        granularity=granularity, bucket_start=bucket_start, agent_name=agent_name,
+                        updated_at=now, **delta
+                    ))
+    
+    def record_metrics(self, records: List[Dict]):
+        """Insert ClarityMetric rows and update rollups in the caller's transaction
+        
+        Each record holds entry_id, conversation_id, agent_name, created_at and
+        the fields from metrics_to_record(). The caller commits.
+        """
+        if not records:
+            return
+        db.session.bulk_insert_mappings(ClarityMetric, records)
+        self._apply_rollups(records)
+    
     def log_clarity_analysis(self, conversation_id: str, entry_id: int, metrics: ClarityMetrics):
-        """Log clarity analysis for monitoring and improvement"""
+        """Log clarity analysis for a single entry (batched scoring lives in clarity_worker)"""
         try:
-            # Store in conversation entry as JSON metadata
             entry = ConversationEntry.query.get(entry_id)
             if entry:
-                clarity_data = {
-                    "clarity_score": metrics.clarity_score,
-                    "empathy_detected": metrics.empathy_detected,
-                    "actionability": metrics.actionability,
-                    "understanding_shown": metrics.understanding_shown,
-                    "dignity_preserved": metrics.dignity_preserved,
-                    "loop_completion": metrics.loop_completion,
-                    "analyzed_at": datetime.utcnow().isoformat()
-                }
-                
-                # Add to error_message field as JSON (repurposing for clarity data)
-                if not entry.error_message:
-                    entry.error_message = json.dumps({"clarity_analysis": clarity_data})
-                else:
-                    try:
-                        existing_data = json.loads(entry.error_message)
-                        existing_data["clarity_analysis"] = clarity_data
-                        entry.error_message = json.dumps(existing_data)
-                    except:
-                        # If not valid JSON, replace with new data
-                        entry.error_message = json.dumps({"clarity_analysis": clarity_data})
-                
+                record = self.metrics_to_record(metrics)
+                record.update({
+                    "entry_id": entry.id,
+                    "conversation_id": conversation_id,
+                    "agent_name": entry.agent_name,
+                    "created_at": entry.created_at
+                })
+                self.record_metrics([record])
                 db.session.commit()
                 
                 logging.info(f"Clarity analysis logged for entry {entry_id}: score={metrics.clarity_score:.1f}")
         
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Failed to log clarity analysis: {str(e)}")
     
-    def get_clarity_trends(self, days: int = 7) -> Dict:
-        """Get clarity trends over time"""
-        try:
-            # Query recent entries with clarity data
-            from datetime import timedelta
-            since_date = datetime.utcnow() - timedelta(days=days)
+    def rebuild_rollups(self, since: Optional[datetime] = None, batch_size: int = 5000):
+        """Recompute hourly/daily rollups from clarity_metrics (after bulk rescoring)
+        
+        Buckets from ``since`` onward (everything when None) are deleted and
+        re-aggregated. PostgreSQL and SQLite do it with INSERT ... SELECT
+        GROUP BY; other databases stream the metrics through _apply_rollups.
+        """
+        dialect = db.session.get_bind().dialect.name
+        in_database = dialect in ('postgresql', 'sqlite')
+        table = ClarityRollup.__table__
+        
+        for granularity in ROLLUP_GRANULARITIES:
+            # The streaming fallback re-adds whole days, so it clears whole days
+            start = self._bucket_start(since, granularity if in_database else 'day') if since is not None else None
+            query = table.delete().where(table.c.granularity == granularity)
+            if start is not None:
+                query = query.where(table.c.bucket_start >= start)
+            db.session.execute(query)
+            
+            if not in_database:
+                continue
+            
+            if dialect == 'postgresql':
+                bucket = func.date_trunc(granularity, ClarityMetric.created_at)
+            else:
+                # Same text layout SQLAlchemy uses for SQLite DATETIME, so upserts hit these rows
+                layout = '%Y-%m-%d %H:00:00.000000' if granularity == 'hour' else '%Y-%m-%d 00:00:00.000000'
+                bucket = func.strftime(layout, ClarityMetric.created_at)
             
-            entries = ConversationEntry.query.filter(
-                ConversationEntry.created_at >= since_date,
-                ConversationEntry.error_message.isnot(None)
-            ).all()
+            select = db.session.query(
+                literal(granularity), bucket, ClarityMetric.agent_name,
+                func.count(ClarityMetric.id),
+                func.sum(ClarityMetric.clarity_score),
+                func.sum(case((ClarityMetric.empathy_detected, 1), else_=0)),
+                func.sum(ClarityMetric.actionability),
+                func.sum(case((ClarityMetric.understanding_shown, 1), else_=0)),
+                func.sum(case((ClarityMetric.dignity_preserved, 1), else_=0)),
+                func.sum(ClarityMetric.loop_completion),
+                literal(datetime.utcnow())
+            )
+            if start is not None:
+                select = select.filter(ClarityMetric.created_at >= start)
+            select = select.group_by(bucket, ClarityMetric.agent_name)
             
-            clarity_scores = []
-            empathy_count = 0
-            total_analyzed = 0
+            db.session.execute(table.insert().from_select(
+                ['granularity', 'bucket_start', 'agent_name', *ROLLUP_COUNTERS, 'updated_at'],
+                select.statement
+            ))
+        
+        if not in_database:
+            last_id = 0
+            while True:
+                query = ClarityMetric.query.filter(ClarityMetric.id > last_id)
+                if start is not None:
+                    query = query.filter(ClarityMetric.created_at >= start)
+                metrics = query.order_by(ClarityMetric.id).limit(batch_size).all()
+                if not metrics:
+                    break
+                self._apply_rollups([
+                    {column: getattr(metric, column) for column in (
+                        'created_at', 'agent_name', 'clarity_score', 'empathy_detected',
+                        'actionability', 'understanding_shown', 'dignity_preserved', 'loop_completion'
+                    )}
+                    for metric in metrics
+                ])
+                last_id = metrics[-1].id
+        
+        db.session.commit()
+        logging.info(f"Clarity rollups rebuilt{' since ' + since.isoformat() if since else ''}")
+    
+    def migrate_legacy_analyses(self, batch_size: int = 500) -> int:
+        """Move clarity JSON stored in ConversationEntry.error_message into clarity_metrics"""
+        migrated = 0
+        last_id = 0
+        while True:
+            entries = ConversationEntry.query.outerjoin(
+                ClarityMetric, ClarityMetric.entry_id == ConversationEntry.id
+            ).filter(
+                ConversationEntry.id > last_id,
+                ConversationEntry.error_message.like('%"clarity_analysis"%'),
+                ClarityMetric.id.is_(None)
+            ).order_by(ConversationEntry.id).limit(batch_size).all()
+            if not entries:
+                break
             
+            records = []
             for entry in entries:
                 try:
-                    if entry.error_message:
-                        data = json.loads(entry.error_message)
-                        if "clarity_analysis" in data:
-                            analysis = data["clarity_analysis"]
-                            clarity_scores.append(analysis["clarity_score"])
-                            if analysis["empathy_detected"]:
-                                empathy_count += 1
-                            total_analyzed += 1
-                except:
+                    data = json.loads(entry.error_message)
+                    analysis = data.pop("clarity_analysis")
+                except (ValueError, KeyError, AttributeError):
                     continue
+                records.append({
+                    "entry_id": entry.id,
+                    "conversation_id": entry.conversation_id,
+                    "agent_name": entry.agent_name,
+                    "created_at": entry.created_at,
+                    "clarity_score": analysis.get("clarity_score", 0.0),
+                    "empathy_detected": bool(analysis.get("empathy_detected")),
+                    "actionability": analysis.get("actionability", 0.0),
+                    "understanding_shown": bool(analysis.get("understanding_shown")),
+                    "dignity_preserved": bool(analysis.get("dignity_preserved", True)),
+                    "loop_completion": analysis.get("loop_completion", 0.0),
+                    "analyzed_at": datetime.fromisoformat(analysis["analyzed_at"]) if analysis.get("analyzed_at") else entry.created_at
+                })
+                # Successful entries only held clarity data in error_message
+                entry.error_message = json.dumps(data) if data else None
+            
+            self.record_metrics(records)
+            db.session.commit()
+            migrated += len(records)
+            last_id = entries[-1].id
+        
+        logging.info(f"Migrated {migrated} legacy clarity analyses to clarity_metrics")
+        return migrated
+    
+    def get_clarity_series(self, days: int = 7, granularity: str = None) -> List[Dict]:
+        """Per-bucket clarity averages across agents, oldest first"""
+        granularity = granularity or ('hour' if days <= 2 else 'day')
+        since = self._bucket_start(datetime.utcnow() - timedelta(days=days), granularity)
+        
+        rows = db.session.query(
+            ClarityRollup.bucket_start,
+            func.sum(ClarityRollup.response_count),
+            func.sum(ClarityRollup.clarity_score_sum),
+            func.sum(ClarityRollup.empathy_count)
+        ).filter(
+            ClarityRollup.granularity == granularity,
+            ClarityRollup.bucket_start >= since
+        ).group_by(ClarityRollup.bucket_start).order_by(ClarityRollup.bucket_start).all()
+        
+        return [
+            {
+                "bucket_start": bucket_start.isoformat(),
+                "responses": int(count),
+                "average_clarity_score": round(score_sum / count, 1) if count else 0,
+                "empathy_rate": round(empathy / count * 100, 1) if count else 0
+            }
+            for bucket_start, count, score_sum, empathy in rows
+        ]
+    
+    def get_clarity_trends(self, days: int = 7) -> Dict:
+        """Get clarity trends over time from the rollup tables"""
+        try:
+            # Hourly buckets keep short windows precise; daily buckets keep long ones cheap
+            granularity = 'hour' if days <= 2 else 'day'
+            since = self._bucket_start(datetime.utcnow() - timedelta(days=days), granularity)
+            
+            totals = db.session.query(
+                func.sum(ClarityRollup.response_count),
+                func.sum(ClarityRollup.clarity_score_sum),
+                func.sum(ClarityRollup.empathy_count),
+                func.sum(ClarityRollup.actionability_sum),
+                func.sum(ClarityRollup.loop_completion_sum)
+            ).filter(
+                ClarityRollup.granularity == granularity,
+                ClarityRollup.bucket_start >= since
+            ).one()
+            
+            total_analyzed = int(totals[0] or 0)
+            avg_clarity = (totals[1] or 0) / total_analyzed if total_analyzed else 0
+            empathy_rate = (totals[2] or 0) / total_analyzed if total_analyzed else 0
             
-            avg_clarity = sum(clarity_scores) / len(clarity_scores) if clarity_scores else 0
-            empathy_rate = empathy_count / total_analyzed if total_analyzed > 0 else 0
+            by_agent = db.session.query(
+                ClarityRollup.agent_name,
+                func.sum(ClarityRollup.response_count),
+                func.sum(ClarityRollup.clarity_score_sum)
+            ).filter(
+                ClarityRollup.granularity == granularity,
+                ClarityRollup.bucket_start >= since
+            ).group_by(ClarityRollup.agent_name).all()
             
             return {
                 "average_clarity_score": round(avg_clarity, 1),
                 "empathy_rate": round(empathy_rate * 100, 1),
+                "average_actionability": round((totals[3] or 0) / total_analyzed, 1) if total_analyzed else 0,
+                "average_loop_completion": round((totals[4] or 0) / total_analyzed, 1) if total_analyzed else 0,
                 "total_analyzed": total_analyzed,
+                "agent_scores": {
+                    agent_name: round(score_sum / count, 1)
+                    for agent_name, count, score_sum in by_agent if count
+                },
                 "trend": "improving" if avg_clarity > 70 else "needs_attention"
             }
             
@@ -0,0 +1,350 @@
+"""
+Background Job Queue
+Database-backed jobs with worker threads, retry backoff, idempotency keys and status polling
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from models import db, BackgroundJob
+
+
+class JobQueue:
+    """Persistent queue in the ``background_jobs`` table
+
+    ``enqueue`` inserts a row and returns at once; repeated enqueues with the
+    same idempotency key return the existing job. Worker threads claim due
+    jobs with a conditional UPDATE, so any number of app processes can share
+    the table without double-running a job. Failures are retried with
+    exponential backoff until ``max_attempts``; jobs whose worker died (crash,
+    restart) are re-queued once their lease expires.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._app = None
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'deduplicated': 0,
+            'succeeded': 0,
+            'retried': 0,
+            'failed': 0,
+            'recovered': 0,
+            'last_run_at': None
+        }
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def init_app(self, app):
+        """Bind to the Flask app and start the worker threads"""
+        self._app = app
+        if Config.JOB_WORKERS_ENABLED:
+            self.start()
+
+    def register(self, job_type: str, handler: Callable[[Dict[str, Any]], Any]):
+        """Handler receives the payload dict inside an app context
+
+        Returning ``{'success': False, ...}`` or raising counts as a failed
+        attempt; add ``'retryable': False`` to fail the job immediately.
+        """
+        self._handlers[job_type] = handler
+
+    def start(self):
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, args=(f"{self.worker_prefix}:{index}",),
+                             name=f'job-worker-{index}', daemon=True)
+            for index in range(Config.JOB_WORKERS)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logging.info(f"⚙️ JOB QUEUE: started {len(self._threads)} workers")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _bump(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def enqueue(self, job_type: str, payload: Optional[Dict[str, Any]] = None,
+                idempotency_key: Optional[str] = None, max_attempts: Optional[int] = None,
+                delay_seconds: float = 0) -> BackgroundJob:
+        """Persist a job (commits) and wake a worker; returns the existing job for a known key"""
+        if job_type not in self._handlers:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+
+        if idempotency_key:
+            existing = self.find_by_key(idempotency_key)
+            if existing:
+                self._bump('deduplicated')
+                return existing
+
+        job = BackgroundJob(
+            id=str(uuid.uuid4()),
+            job_type=job_type,
+            payload=json.dumps(payload or {}),
+            idempotency_key=idempotency_key,
+            max_attempts=max_attempts or Config.JOB_MAX_ATTEMPTS,
+            run_at=datetime.utcnow() + timedelta(seconds=delay_seconds)
+        )
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Lost a race with another enqueue of the same key
+            db.session.rollback()
+            self._bump('deduplicated')
+            return self.find_by_key(idempotency_key)
+
+        self._bump('enqueued')
+        self._wake.set()
+        logging.info(f"⚙️ JOB QUEUED: {job_type} {job.id}")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[BackgroundJob]:
+        return db.session.get(BackgroundJob, job_id)
+
+    def find_by_key(self, idempotency_key: str) -> Optional[BackgroundJob]:
+        return BackgroundJob.query.filter_by(idempotency_key=idempotency_key).first()
+
+    def retry(self, job_id: str) -> Optional[BackgroundJob]:
+        """Put a failed job back in the queue with a fresh attempt budget"""
+        job = self.get_job(job_id)
+        if not job or job.status != 'failed':
+            return None
+        job.status = 'queued'
+        job.attempts = 0
+        job.run_at = datetime.utcnow()
+        job.finished_at = None
+        db.session.commit()
+        self._wake.set()
+        return job
+
+    def backoff_seconds(self, attempts: int) -> float:
+        """Exponential delay before the next attempt, capped at JOB_RETRY_MAX_SECONDS"""
+        return min(Config.JOB_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), Config.JOB_RETRY_MAX_SECONDS)
+
+    def _claim(self, worker_id: str) -> Optional[BackgroundJob]:
+        """Take the oldest due job; the status check in the UPDATE makes the claim atomic"""
+        now = datetime.utcnow()
+        candidates = db.session.query(BackgroundJob.id).filter(
+            BackgroundJob.status == 'queued',
+            BackgroundJob.run_at <= now
+        ).order_by(BackgroundJob.run_at).limit(5).all()
+
+        for (job_id,) in candidates:
+            claimed = db.session.execute(
+                update(BackgroundJob).where(
+                    BackgroundJob.id == job_id,
+                    BackgroundJob.status == 'queued'
+                ).values(
+                    status='running',
+                    locked_by=worker_id,
+                    locked_at=now,
+                    attempts=BackgroundJob.attempts + 1,
+                    updated_at=now
+                )
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return self.get_job(job_id)
+        return None
+
+    def _finish(self, job: BackgroundJob, worker_id: str, result: Any = None, error: Optional[str] = None,
+                retryable: bool = True):
+        """Record the outcome, unless the lease expired and another worker owns the job now"""
+        now = datetime.utcnow()
+        if error is None:
+            values = {'status': 'succeeded', 'finished_at': now, 'last_error': None}
+            outcome = 'succeeded'
+        elif retryable and job.attempts < job.max_attempts:
+            values = {'status': 'queued', 'run_at': now + timedelta(seconds=self.backoff_seconds(job.attempts)),
+                      'last_error': error}
+            outcome = 'retried'
+        else:
+            values = {'status': 'failed', 'finished_at': now, 'last_error': error}
+            outcome = 'failed'
+        if result is not None:
+            values['result'] = json.dumps(result, default=str)
+
+        db.session.execute(
+            update(BackgroundJob).where(
+                BackgroundJob.id == job.id,
+                BackgroundJob.locked_by == worker_id,
+                BackgroundJob.status == 'running'
+            ).values(locked_by=None, locked_at=None, updated_at=now, **values)
+        )
+        db.session.commit()
+        self._bump(outcome)
+
+        if outcome == 'succeeded':
+            logging.info(f"✅ JOB DONE: {job.job_type} {job.id} (attempt {job.attempts})")
+        elif outcome == 'retried':
+            logging.warning(f"🔁 JOB RETRY: {job.job_type} {job.id} attempt {job.attempts} failed: {error}")
+        else:
+            logging.error(f"❌ JOB FAILED: {job.job_type} {job.id} after {job.attempts} attempts: {error}")
+
+    @contextmanager
+    def _lease(self, job_id: str, worker_id: str):
+        """Renew ``locked_at`` while the handler runs so a long job is not taken over by another worker"""
+        engine = db.engine
+        stop = threading.Event()
+        interval = max(Config.JOB_LEASE_SECONDS / 3, 1)
+
+        def heartbeat():
+            while not stop.wait(interval):
+                try:
+                    # Own connection: the handler owns this thread's session and transaction
+                    with engine.begin() as connection:
+                        renewed = connection.execute(
+                            update(BackgroundJob).where(
+                                BackgroundJob.id == job_id,
+                                BackgroundJob.locked_by == worker_id,
+                                BackgroundJob.status == 'running'
+                            ).values(locked_at=datetime.utcnow())
+                        ).rowcount
+                    if not renewed:
+                        logging.warning(f"⚙️ JOB QUEUE: lost the lease on {job_id}")
+                        return
+                except Exception as e:
+                    logging.error(f"Job heartbeat error for {job_id}: {str(e)}")
+
+        thread = threading.Thread(target=heartbeat, name=f'job-heartbeat-{job_id[:8]}', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join(5)
+
+    def _execute(self, job: BackgroundJob, worker_id: str):
+        handler = self._handlers.get(job.job_type)
+        if handler is None:
+            self._finish(job, worker_id, error=f"No handler for job type '{job.job_type}'", retryable=False)
+            return
+
+        try:
+            with self._lease(job.id, worker_id):
+                result = handler(json.loads(job.payload or '{}'))
+        except Exception as e:
+            db.session.rollback()
+            self._finish(job, worker_id, error=str(e))
+            return
+
+        if isinstance(result, dict) and result.get('success') is False:
+            self._finish(job, worker_id, result=result, error=result.get('error', 'Job failed'),
+                         retryable=result.get('retryable', True))
+        else:
+            self._finish(job, worker_id, result=result)
+
+    def recover_stale(self) -> int:
+        """Re-queue running jobs whose lease expired (worker crashed or the app restarted)
+
+        Live workers renew their lease, so an expired one means the run died.
+        Jobs that already used every attempt are failed rather than re-queued,
+        so a job that keeps killing its worker does not loop forever.
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=Config.JOB_LEASE_SECONDS)
+        expired = (BackgroundJob.status == 'running', BackgroundJob.locked_at < cutoff)
+        exhausted = db.session.execute(
+            update(BackgroundJob).where(
+                *expired, BackgroundJob.attempts >= BackgroundJob.max_attempts
+            ).values(status='failed', locked_by=None, locked_at=None, finished_at=now, updated_at=now,
+                     last_error='Worker lost (lease expired) on the final attempt')
+        ).rowcount
+        recovered = db.session.execute(
+            update(BackgroundJob).where(
+                *expired, BackgroundJob.attempts < BackgroundJob.max_attempts
+            ).values(status='queued', locked_by=None, locked_at=None, run_at=now, updated_at=now)
+        ).rowcount
+        db.session.commit()
+        if exhausted:
+            self._bump('failed', exhausted)
+            logging.error(f"❌ JOB QUEUE: failed {exhausted} jobs whose worker died on the final attempt")
+        if recovered:
+            self._bump('recovered', recovered)
+            logging.warning(f"⚙️ JOB QUEUE: re-queued {recovered} jobs with expired leases")
+        return recovered
+
+    def run_pending(self, worker_id: Optional[str] = None, limit: int = 100) -> int:
+        """Run due jobs in the calling thread (needs an app context); returns how many ran"""
+        worker_id = worker_id or f"{self.worker_prefix}:inline"
+        ran = 0
+        while ran < limit:
+            job = self._claim(worker_id)
+            if job is None:
+                break
+            self._execute(job, worker_id)
+            ran += 1
+        return ran
+
+    def _run(self, worker_id: str):
+        last_recovery = 0.0
+        while not self._stop.is_set():
+            ran = 0
+            try:
+                with self._app.app_context():
+                    if time.time() - last_recovery >= Config.JOB_LEASE_SECONDS / 4:
+                        last_recovery = time.time()
+                        self.recover_stale()
+                    ran = self.run_pending(worker_id, limit=10)
+                    db.session.remove()
+                with self._stats_lock:
+                    self._stats['last_run_at'] = datetime.utcnow().isoformat()
+            except Exception as e:
+                logging.error(f"Job worker {worker_id} error: {str(e)}")
+
+            if not ran:
+                self._wake.wait(Config.JOB_POLL_SECONDS)
+                self._wake.clear()
+
+    def purge_finished(self, retention_days: int = 7) -> int:
+        """Delete succeeded and failed jobs finished more than ``retention_days`` ago"""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        deleted = BackgroundJob.query.filter(
+            BackgroundJob.status.in_(('succeeded', 'failed')),
+            BackgroundJob.finished_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if deleted:
+            logging.info(f"🧹 Purged {deleted} finished background jobs")
+        return deleted
+
+    def get_stats(self) -> Dict[str, Any]:
+        counts = dict(db.session.query(BackgroundJob.status, func.count(BackgroundJob.id)).group_by(
+            BackgroundJob.status
+        ).all())
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            'jobs_by_status': counts,
+            'workers_alive': sum(1 for thread in self._threads if thread.is_alive()),
+            'handlers': sorted(self._handlers),
+            **stats
+        }
+
+
+# Global instance
+job_queue = JobQueue()
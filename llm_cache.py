@@ -0,0 +1,225 @@
+"""
+LLM Response Cache
+Content-addressed completion cache with LRU + TTL eviction and hit metrics
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any
+
+from config import Config
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry expiry"""
+
+    blocking = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """Disk-backed cache shared across processes on the same host
+
+    LRU order is tracked with a last-access timestamp; expired and
+    least-recently-used rows are pruned when the table grows past its bound.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.commit()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now)
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                cursor = self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+                overflow -= cursor.rowcount
+                self.evictions += cursor.rowcount
+            if overflow > 0:
+                cursor = self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)", (overflow,)
+                )
+                self.evictions += cursor.rowcount
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+class LLMResponseCache:
+    """Caches completions keyed by provider, model, prompts and sampling settings"""
+
+    def __init__(self, backend=None, ttl_seconds: float = None, enabled: bool = None):
+        self.enabled = Config.LLM_CACHE_ENABLED if enabled is None else enabled
+        self.ttl_seconds = ttl_seconds or Config.LLM_CACHE_TTL_SECONDS
+        self.backend = backend or self._create_backend()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    @staticmethod
+    def _create_backend():
+        if Config.LLM_CACHE_BACKEND == 'sqlite':
+            try:
+                return SQLiteCacheBackend(Config.LLM_CACHE_PATH, Config.LLM_CACHE_MAX_ENTRIES)
+            except sqlite3.Error as e:
+                logging.warning(f"SQLite LLM cache unavailable ({str(e)}), using in-process cache")
+        return MemoryCacheBackend(Config.LLM_CACHE_MAX_ENTRIES)
+
+    @staticmethod
+    def make_key(provider: str, model: str, system_prompt: Optional[str], messages: List[Dict[str, str]],
+                 temperature: float, max_tokens: int) -> str:
+        """Stable sha256 over everything that determines the completion"""
+        payload = json.dumps({
+            'provider': provider,
+            'model': model,
+            'system': system_prompt or '',
+            'messages': messages,
+            'temperature': round(float(temperature), 4),
+            'max_tokens': max_tokens
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _record(self, provider: str, outcome: str):
+        with self._stats_lock:
+            counters = self._stats.setdefault(provider, {'hits': 0, 'misses': 0, 'stores': 0})
+            counters[outcome] += 1
+
+    def get(self, key: str, provider: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logging.warning(f"LLM cache read failed: {str(e)}")
+            value = None
+        self._record(provider, 'hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key: str, provider: str, value: Dict[str, Any]):
+        try:
+            self.backend.set(key, value, self.ttl_seconds)
+            self._record(provider, 'stores')
+        except Exception as e:
+            logging.warning(f"LLM cache write failed: {str(e)}")
+
+    def delete(self, key: str):
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            logging.warning(f"LLM cache delete failed: {str(e)}")
+
+    def clear(self):
+        self.backend.clear()
+        with self._stats_lock:
+            self._stats = {}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            by_provider = {name: dict(counters) for name, counters in self._stats.items()}
+
+        hits = sum(c['hits'] for c in by_provider.values())
+        misses = sum(c['misses'] for c in by_provider.values())
+        for counters in by_provider.values():
+            lookups = counters['hits'] + counters['misses']
+            counters['hit_rate'] = round(counters['hits'] / lookups * 100, 1) if lookups else 0
+
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.backend).__name__,
+            'entries': self.backend.size(),
+            'max_entries': self.backend.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses) * 100, 1) if hits + misses else 0,
+            'evictions': self.backend.evictions,
+            'by_provider': by_provider
+        }
+
+
+# Global instance
+llm_cache = LLMResponseCache()
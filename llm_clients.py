@@ -0,0 +1,156 @@
+"""
+LLM Client Registry
+One pooled, keep-alive HTTP transport and SDK client per provider, shared by the whole process
+"""
+
+import atexit
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config import Config
+from rate_limiter import CHARS_PER_TOKEN, rate_limiter
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=Config.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=Config.LLM_HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(Config.LLM_HTTP_TIMEOUT, connect=Config.LLM_HTTP_CONNECT_TIMEOUT)
+
+
+class RateLimitedTransport(httpx.HTTPTransport):
+    """Takes a ``rate_limiter`` slot for every request sent by a synchronous SDK client
+
+    The model and token estimate are read from the JSON request body; a 429
+    response pauses the provider bucket for its Retry-After.
+    """
+
+    def __init__(self, provider: str, **kwargs):
+        super().__init__(**kwargs)
+        self.provider = provider
+
+    @staticmethod
+    def _describe(request: httpx.Request):
+        try:
+            body = json.loads(request.content or b'{}')
+        except (httpx.RequestNotRead, ValueError):
+            return None, 0
+        if not isinstance(body, dict):
+            return None, 0
+        completion = body.get('max_tokens') or body.get('max_completion_tokens') or 0
+        return body.get('model'), len(request.content) // CHARS_PER_TOKEN + int(completion)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        model, tokens = self._describe(request)
+        with rate_limiter.limit_sync(self.provider, model, tokens) as slot:
+            response = super().handle_request(request)
+            if slot and response.status_code == 429:
+                try:
+                    retry_after = float(response.headers.get('retry-after'))
+                except (TypeError, ValueError):
+                    retry_after = None
+                slot.mark_rate_limited(retry_after)
+            return response
+
+
+class LLMClientRegistry:
+    """Process-wide provider clients for synchronous callers
+
+    Each provider gets one ``httpx.Client`` with the configured connection
+    limits and keep-alive, wrapped once in its SDK client, so every agent
+    family reuses warm TLS connections instead of handshaking per request.
+    Synchronous transports also enforce the per-provider ``rate_limiter``.
+    Returns None for providers without an API key. The async gateway takes
+    its per-provider transports from ``async_http_client``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[str, Any] = {}
+        self._http: Dict[str, httpx.Client] = {}
+        self._async_http: Dict[str, httpx.AsyncClient] = {}
+        atexit.register(self.close)
+
+    def _http_client(self, provider: str) -> httpx.Client:
+        client = self._http.get(provider)
+        if client is None:
+            client = httpx.Client(transport=RateLimitedTransport(provider, limits=http_limits()),
+                                  timeout=http_timeout())
+            self._http[provider] = client
+        return client
+
+    def async_http_client(self, provider: str) -> httpx.AsyncClient:
+        """Pooled async transport for a provider; create it on the loop that will drive it"""
+        with self._lock:
+            client = self._async_http.get(provider)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(limits=http_limits(), timeout=http_timeout())
+                self._async_http[provider] = client
+            return client
+
+    def _get(self, provider: str, api_key: Optional[str], factory):
+        if not api_key:
+            return None
+        client = self._clients.get(provider)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(provider)
+            if client is None:
+                client = factory(api_key)
+                self._clients[provider] = client
+                logging.info(f"🔌 LLM CLIENTS: created pooled {provider} client")
+            return client
+
+    def openai(self):
+        """Shared ``openai.OpenAI`` client"""
+        def factory(api_key):
+            from openai import OpenAI
+            return OpenAI(api_key=api_key, http_client=self._http_client('openai'))
+        return self._get('openai', Config.OPENAI_API_KEY, factory)
+
+    def anthropic(self):
+        """Shared ``anthropic.Anthropic`` client"""
+        def factory(api_key):
+            import anthropic
+            return anthropic.Anthropic(api_key=api_key, http_client=self._http_client('claude'))
+        return self._get('claude', Config.CLAUDE_API_KEY, factory)
+
+    def gemini(self):
+        """Shared ``google.genai.Client`` (the SDK keeps its own pooled session per client)"""
+        def factory(api_key):
+            from google import genai
+            return genai.Client(api_key=api_key)
+        return self._get('gemini', Config.GEMINI_API_KEY, factory)
+
+    def close(self):
+        """Close the synchronous transports; async ones are closed by the gateway on its loop"""
+        with self._lock:
+            for client in self._http.values():
+                client.close()
+            self._http.clear()
+            self._clients.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'clients': sorted(self._clients),
+                'sync_transports': sorted(self._http),
+                'async_transports': sorted(name for name, client in self._async_http.items() if not client.is_closed),
+                'max_connections': Config.LLM_HTTP_MAX_CONNECTIONS,
+                'max_keepalive_connections': Config.LLM_HTTP_MAX_KEEPALIVE,
+                'keepalive_expiry': Config.LLM_HTTP_KEEPALIVE_EXPIRY
+            }
+
+
+# Global instance
+llm_clients = LLMClientRegistry()
@@ -0,0 +1,577 @@
+"""
+Async LLM Provider Layer
+Shared asyncio providers for OpenAI, Claude and Gemini with pooled HTTP clients
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+
+from config import Config
+from llm_clients import llm_clients
+from provider_router import provider_router
+from rate_limiter import estimate_tokens, rate_limiter
+from request_coalescer import request_coalescer
+
+
+# Seconds before a caller's timeout at which a call still queued in the rate limiter gives up
+LIMITER_DEADLINE_MARGIN = 0.25
+
+
+@dataclass
+class LLMResult:
+    """Normalized completion returned by every provider"""
+    text: str
+    provider: str
+    model: str
+    tokens_used: int = 0
+    latency_seconds: float = 0.0
+    cached: bool = False
+    coalesced: bool = False
+
+
+class LLMProviderError(Exception):
+    """Raised when a provider is unavailable or returns an unusable response"""
+
+
+class BaseLLMProvider(ABC):
+    """Base class for async LLM providers
+
+    Clients are created lazily on the gateway event loop so their connection
+    pools are bound to the loop that drives them.
+    """
+
+    name = None
+
+    def __init__(self, api_key: Optional[str], default_model: str, max_tokens: int, temperature: float):
+        self.api_key = api_key
+        self.default_model = default_model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self._client = None
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        """Pooled keep-alive HTTP client shared by every call to this provider"""
+        return llm_clients.async_http_client(self.name)
+
+    @abstractmethod
+    async def agenerate(self, messages: List[Dict[str, str]], system_prompt: Optional[str] = None,
+                        model: Optional[str] = None, max_tokens: Optional[int] = None,
+                        temperature: Optional[float] = None) -> LLMResult:
+        """Return the complete response as an LLMResult"""
+
+    @abstractmethod
+    def astream(self, messages: List[Dict[str, str]], system_prompt: Optional[str] = None,
+                model: Optional[str] = None, max_tokens: Optional[int] = None,
+                temperature: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield completion text chunks as the provider produces them (implemented as an async generator)"""
+
+    async def aclose(self):
+        """Close the underlying client and its connection pool"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+class OpenAIProvider(BaseLLMProvider):
+    """OpenAI chat completions over AsyncOpenAI"""
+
+    name = 'openai'
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self.api_key, http_client=self._build_http_client())
+        return self._client
+
+    async def agenerate(self, messages, system_prompt=None, model=None, max_tokens=None, temperature=None):
+        if not self.available:
+            raise LLMProviderError("OpenAI API not available")
+
+        model = model or self.default_model
+        chat_messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        chat_messages.extend(messages)
+
+        response = await self._get_client().chat.completions.create(
+            model=model,
+            messages=chat_messages,
+            max_tokens=max_tokens or self.max_tokens,
+            temperature=self.temperature if temperature is None else temperature
+        )
+
+        return LLMResult(
+            text=response.choices[0].message.content or "",
+            provider=self.name,
+            model=model,
+            tokens_used=response.usage.total_tokens if response.usage else 0
+        )
+
+    async def astream(self, messages, system_prompt=None, model=None, max_tokens=None, temperature=None):
+        if not self.available:
+            raise LLMProviderError("OpenAI API not available")
+
+        chat_messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        chat_messages.extend(messages)
+
+        stream = await self._get_client().chat.completions.create(
+            model=model or self.default_model,
+            messages=chat_messages,
+            max_tokens=max_tokens or self.max_tokens,
+            temperature=self.temperature if temperature is None else temperature,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class ClaudeProvider(BaseLLMProvider):
+    """Anthropic messages API over AsyncAnthropic"""
+
+    name = 'claude'
+
+    def _get_client(self):
+        if self._client is None:
+            import anthropic
+            self._client = anthropic.AsyncAnthropic(api_key=self.api_key, http_client=self._build_http_client())
+        return self._client
+
+    async def agenerate(self, messages, system_prompt=None, model=None, max_tokens=None, temperature=None):
+        if not self.available:
+            raise LLMProviderError("Claude API not available")
+
+        model = model or self.default_model
+        kwargs = {}
+        if system_prompt:
+            kwargs['system'] = system_prompt
+
+        response = await self._get_client().messages.create(
+            model=model,
+            max_tokens=max_tokens or self.max_tokens,
+            temperature=self.temperature if temperature is None else temperature,
+            messages=messages,
+            **kwargs
+        )
+
+        usage = getattr(response, 'usage', None)
+        return LLMResult(
+            text=response.content[0].text,
+            provider=self.name,
+            model=model,
+            tokens_used=(usage.input_tokens + usage.output_tokens) if usage else 0
+        )
+
+    async def astream(self, messages, system_prompt=None, model=None, max_tokens=None, temperature=None):
+        if not self.available:
+            raise LLMProviderError("Claude API not available")
+
+        kwargs = {}
+        if system_prompt:
+            kwargs['system'] = system_prompt
+
+        async with self._get_client().messages.stream(
+            model=model or self.default_model,
+            max_tokens=max_tokens or self.max_tokens,
+            temperature=self.temperature if temperature is None else temperature,
+            messages=messages,
+            **kwargs
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+
+class GeminiProvider(BaseLLMProvider):
+    """Google Gemini over generate_content_async (gRPC, pooled by the SDK)"""
+
+    name = 'gemini'
+
+    def _get_client(self):
+        if self._client is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._client = genai
+        return self._client
+
+    async def agenerate(self, messages, system_prompt=None, model=None, max_tokens=None, temperature=None):
+        if not self.available:
+            raise LLMProviderError("Gemini API not available")
+
+        model = model or self.default_model
+        gemini_model, contents, generation_config = self._build_request(messages, system_prompt, model, max_tokens, temperature)
+
+        response = await gemini_model.generate_content_async(contents, generation_config=generation_config)
+
+        usage = getattr(response, 'usage_metadata', None)
+        return LLMResult(
+            text=response.text,
+            provider=self.name,
+            model=model,
+            tokens_used=getattr(usage, 'total_token_count', 0) if usage else 0
+        )
+
+    async def astream(self, messages, system_prompt=None, model=None, max_tokens=None, temperature=None):
+        if not self.available:
+            raise LLMProviderError("Gemini API not available")
+
+        gemini_model, contents, generation_config = self._build_request(
+            messages, system_prompt, model or self.default_model, max_tokens, temperature
+        )
+
+        response = await gemini_model.generate_content_async(contents, generation_config=generation_config, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    def _build_request(self, messages, system_prompt, model, max_tokens, temperature):
+        """Build the GenerativeModel, contents and generation config for a call"""
+        genai = self._get_client()
+        gemini_model = genai.GenerativeModel(model, system_instruction=system_prompt) if system_prompt else genai.GenerativeModel(model)
+
+        if len(messages) == 1:
+            contents = messages[0]['content']
+        else:
+            contents = [
+                {"role": "model" if message['role'] == 'assistant' else "user", "parts": [message['content']]}
+                for message in messages
+            ]
+
+        generation_config = genai.types.GenerationConfig(
+            max_output_tokens=max_tokens or self.max_tokens,
+            temperature=self.temperature if temperature is None else temperature
+        )
+        return gemini_model, contents, generation_config
+
+    async def aclose(self):
+        self._client = None
+
+
+class LLMGateway:
+    """Runs every provider call on one background asyncio loop
+
+    Flask/SocketIO worker threads hand coroutines to the loop and wait on a
+    future, so a single loop multiplexes all in-flight LLM requests over the
+    pooled provider connections instead of one blocking socket per thread.
+    """
+
+    def __init__(self):
+        self.providers = {
+            'openai': OpenAIProvider(Config.OPENAI_API_KEY, Config.OPENAI_MODEL,
+                                     Config.OPENAI_MAX_TOKENS, Config.OPENAI_TEMPERATURE),
+            'claude': ClaudeProvider(Config.CLAUDE_API_KEY, Config.CLAUDE_MODEL,
+                                     Config.CLAUDE_MAX_TOKENS, Config.CLAUDE_TEMPERATURE),
+            'gemini': GeminiProvider(Config.GEMINI_API_KEY, Config.GEMINI_MODEL,
+                                     Config.GEMINI_MAX_TOKENS, Config.GEMINI_TEMPERATURE)
+        }
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def get_provider(self, name: str) -> BaseLLMProvider:
+        provider = self.providers.get(name)
+        if provider is None:
+            raise LLMProviderError(f"Unknown LLM provider: {name}")
+        return provider
+
+    def is_available(self, name: str) -> bool:
+        provider = self.providers.get(name)
+        return bool(provider and provider.available)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the background event loop thread on first use"""
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run_loop():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run_loop, name='llm-gateway', daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+                logging.info("LLM gateway event loop started")
+            return self._loop
+
+    async def agenerate(self, provider: str, messages: List[Dict[str, str]], system_prompt: Optional[str] = None,
+                        model: Optional[str] = None, max_tokens: Optional[int] = None,
+                        temperature: Optional[float] = None, use_cache: bool = True,
+                        max_wait: Optional[float] = None) -> LLMResult:
+        """Generate a completion; must be awaited on the gateway loop
+
+        Identical concurrent calls share one upstream request (see request_coalescer).
+        ``max_wait`` caps the time spent queued in the rate limiter; for a
+        shared request the first caller's cap applies.
+        """
+        from llm_cache import llm_cache
+
+        llm_provider = self.get_provider(provider)
+        model = model or llm_provider.default_model
+        max_tokens = max_tokens or llm_provider.max_tokens
+        temperature = llm_provider.temperature if temperature is None else temperature
+
+        cache_key = None
+        if llm_cache.enabled:
+            # use_cache=False skips the lookup but still stores the fresh result, replacing a rejected entry
+            cache_key = llm_cache.make_key(provider, model, system_prompt, messages, temperature, max_tokens)
+            cached = await self._cache_call(llm_cache, llm_cache.get, cache_key, provider) if use_cache else None
+            if cached is not None:
+                return LLMResult(**{**cached, 'cached': True, 'latency_seconds': 0.0})
+
+        if not use_cache:
+            # Fresh samples (retries, hedges) must not share another caller's in-flight answer
+            return await self._agenerate_upstream(llm_provider, messages, system_prompt, model, max_tokens, temperature,
+                                                  cache_key, max_wait)
+
+        key = cache_key or llm_cache.make_key(provider, model, system_prompt, messages, temperature, max_tokens)
+        result, shared = await request_coalescer.run(key, lambda: self._agenerate_upstream(
+            llm_provider, messages, system_prompt, model, max_tokens, temperature, cache_key, max_wait
+        ))
+        return replace(result, coalesced=True) if shared else result
+
+    async def _agenerate_upstream(self, llm_provider: BaseLLMProvider, messages: List[Dict[str, str]],
+                                  system_prompt: Optional[str], model: str, max_tokens: int, temperature: float,
+                                  cache_key: Optional[str] = None, max_wait: Optional[float] = None) -> LLMResult:
+        """One rate-limited provider call, recorded with the router and stored in the cache"""
+        from llm_cache import llm_cache
+
+        provider = llm_provider.name
+        # Queue for a slot before the latency clock starts: waiting here is not provider slowness
+        tokens = estimate_tokens(messages, system_prompt, max_tokens)
+        async with rate_limiter.limit(provider, model, tokens, max_wait=max_wait) as slot:
+            provider_router.reserve_probe(provider, model)
+            started = time.monotonic()
+            try:
+                result = await llm_provider.agenerate(
+                    messages, system_prompt=system_prompt, model=model,
+                    max_tokens=max_tokens, temperature=temperature
+                )
+            except asyncio.CancelledError:
+                # A hung call stopped by a deadline or its last waiter is a failure, and must settle a probe
+                provider_router.record_failure(provider, model, time.monotonic() - started, 'Cancelled before completing')
+                raise
+            except Exception as e:
+                provider_router.record_failure(provider, model, time.monotonic() - started, str(e))
+                raise
+            if slot and result.tokens_used:
+                slot.tokens_used = result.tokens_used
+        result.latency_seconds = time.monotonic() - started
+        provider_router.record_success(provider, model, result.latency_seconds)
+
+        if cache_key and result.text:
+            value = {'text': result.text, 'provider': result.provider, 'model': result.model, 'tokens_used': result.tokens_used}
+            await self._cache_call(llm_cache, llm_cache.set, cache_key, provider, value)
+        return result
+
+    def evict(self, provider: str, messages: List[Dict[str, str]], system_prompt: Optional[str] = None,
+              model: Optional[str] = None, max_tokens: Optional[int] = None, temperature: Optional[float] = None):
+        """Drop the cached completion for these arguments (e.g. after a caller rejected it)"""
+        from llm_cache import llm_cache
+
+        if not llm_cache.enabled:
+            return
+        llm_provider = self.get_provider(provider)
+        model = model or llm_provider.default_model
+        max_tokens = max_tokens or llm_provider.max_tokens
+        temperature = llm_provider.temperature if temperature is None else temperature
+        llm_cache.delete(llm_cache.make_key(provider, model, system_prompt, messages, temperature, max_tokens))
+
+    @staticmethod
+    async def _cache_call(cache, method, *args):
+        """Keep disk-backed cache I/O off the event loop"""
+        if cache.backend.blocking:
+            return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+        return method(*args)
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def run_coroutine(self, coro) -> Future:
+        """Schedule any coroutine on the gateway loop and return a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def submit(self, provider: str, messages: List[Dict[str, str]], **kwargs) -> Future:
+        """Schedule a completion on the gateway loop and return a concurrent Future"""
+        return self.run_coroutine(self.agenerate(provider, messages, **kwargs))
+
+    def generate(self, provider: str, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                 **kwargs) -> LLMResult:
+        """Blocking bridge for synchronous callers (Flask routes, agent classes)
+
+        Without an explicit ``timeout``, a call made inside a deadline_executor
+        attempt waits only for what is left of that attempt.
+        """
+        if self.in_loop_thread():
+            raise RuntimeError("LLMGateway.generate() called from the gateway loop; await agenerate() instead")
+
+        if timeout is None:
+            from deadline_executor import attempt_time_remaining
+            timeout = attempt_time_remaining()
+            if timeout is not None and timeout <= 0:
+                raise TimeoutError(f"{provider} call skipped: attempt deadline already passed")
+        if timeout is not None:
+            # Leave the limiter queue (freeing the ticket) just before the timeout, so running
+            # out of capacity surfaces as RateLimitExceeded instead of a generic timeout
+            kwargs.setdefault('max_wait', max(timeout - LIMITER_DEADLINE_MARGIN, 0.0))
+
+        future = self.submit(provider, messages, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    async def astream(self, provider: str, messages: List[Dict[str, str]], system_prompt: Optional[str] = None,
+                      model: Optional[str] = None, max_tokens: Optional[int] = None,
+                      temperature: Optional[float] = None, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream a completion; cache hits are replayed as a single chunk
+
+        Identical concurrent streams subscribe to one upstream stream.
+        """
+        from llm_cache import llm_cache
+
+        llm_provider = self.get_provider(provider)
+        model = model or llm_provider.default_model
+        max_tokens = max_tokens or llm_provider.max_tokens
+        temperature = llm_provider.temperature if temperature is None else temperature
+
+        cache_key = None
+        if llm_cache.enabled:
+            # use_cache=False skips the lookup but still stores the fresh result, replacing a rejected entry
+            cache_key = llm_cache.make_key(provider, model, system_prompt, messages, temperature, max_tokens)
+            cached = await self._cache_call(llm_cache, llm_cache.get, cache_key, provider) if use_cache else None
+            if cached is not None:
+                yield cached['text']
+                return
+
+        upstream = lambda: self._astream_upstream(llm_provider, messages, system_prompt, model, max_tokens, temperature, cache_key)
+        if not use_cache:
+            chunks = upstream()
+        else:
+            key = cache_key or llm_cache.make_key(provider, model, system_prompt, messages, temperature, max_tokens)
+            chunks = request_coalescer.stream(key, upstream)
+        async for chunk in chunks:
+            yield chunk
+
+    async def _astream_upstream(self, llm_provider: BaseLLMProvider, messages: List[Dict[str, str]],
+                                system_prompt: Optional[str], model: str, max_tokens: int, temperature: float,
+                                cache_key: Optional[str] = None) -> AsyncIterator[str]:
+        """One rate-limited provider stream, recorded with the router and stored in the cache"""
+        from llm_cache import llm_cache
+
+        provider = llm_provider.name
+        parts = []
+        first_chunk_latency = None
+        async with rate_limiter.limit(provider, model, estimate_tokens(messages, system_prompt, max_tokens)):
+            provider_router.reserve_probe(provider, model)
+            started = time.monotonic()
+            try:
+                async for chunk in llm_provider.astream(messages, system_prompt=system_prompt, model=model,
+                                                        max_tokens=max_tokens, temperature=temperature):
+                    if first_chunk_latency is None:
+                        first_chunk_latency = time.monotonic() - started
+                    parts.append(chunk)
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                # Stopped by a deadline or the last subscriber: a failure only if the provider never answered
+                if first_chunk_latency is None:
+                    provider_router.record_failure(provider, model, time.monotonic() - started,
+                                                   'Cancelled before the first chunk')
+                else:
+                    provider_router.record_success(provider, model, first_chunk_latency)
+                raise
+            except Exception as e:
+                provider_router.record_failure(provider, model, time.monotonic() - started, str(e))
+                raise
+        # Time to first token is what a streaming caller waits on
+        provider_router.record_success(provider, model, first_chunk_latency or (time.monotonic() - started))
+
+        text = ''.join(parts)
+        if cache_key and text:
+            value = {'text': text, 'provider': provider, 'model': model, 'tokens_used': 0}
+            await self._cache_call(llm_cache, llm_cache.set, cache_key, provider, value)
+
+    def stream(self, provider: str, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+               **kwargs) -> Iterator[str]:
+        """Blocking iterator over streamed chunks for synchronous callers
+
+        Closing the iterator early cancels the upstream request. ``timeout``
+        bounds the wait for each chunk; inside a deadline_executor attempt the
+        whole stream must also finish before the attempt deadline.
+        """
+        if self.in_loop_thread():
+            raise RuntimeError("LLMGateway.stream() called from the gateway loop; use astream() instead")
+
+        from deadline_executor import attempt_time_remaining
+        remaining = attempt_time_remaining()
+        deadline = None if remaining is None else time.monotonic() + remaining
+        if deadline is not None and remaining <= 0:
+            raise TimeoutError(f"{provider} stream skipped: attempt deadline already passed")
+
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for chunk in self.astream(provider, messages, **kwargs):
+                    chunks.put(chunk)
+            except BaseException as e:
+                chunks.put(e)
+                raise
+            finally:
+                chunks.put(done)
+
+        future = self.run_coroutine(pump())
+        try:
+            while True:
+                wait = timeout
+                if deadline is not None:
+                    wait = deadline - time.monotonic() if wait is None else min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        raise TimeoutError(f"{provider} stream did not finish before the attempt deadline")
+                item = chunks.get(timeout=wait)
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        except queue.Empty:
+            raise TimeoutError(f"No stream output from {provider} within {wait:.1f}s")
+        finally:
+            future.cancel()
+
+    def close(self):
+        """Close provider connection pools and stop the loop"""
+        with self._lock:
+            if self._loop is None:
+                return
+            loop = self._loop
+
+            async def close_providers():
+                for provider in self.providers.values():
+                    await provider.aclose()
+
+            try:
+                asyncio.run_coroutine_threadsafe(close_providers(), loop).result(timeout=10)
+            except Exception as e:
+                logging.warning(f"Error closing LLM providers: {str(e)}")
+            loop.call_soon_threadsafe(loop.stop)
+            self._loop = None
+
+
+# Global instance
+llm_gateway = LLMGateway()
@@ -0,0 +1,408 @@
+"""
+Mail Service
+Shared outbound mail: pooled SMTP connections, a background send queue, alert digests and rate limiting
+"""
+
+import atexit
+import logging
+import mimetypes
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime
+from email.message import EmailMessage
+from email.utils import make_msgid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import Config
+
+# Connection-level failures: the session is gone, so reconnect and try again
+CONNECTION_SMTP_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)
+
+
+def is_transient(error: Exception) -> bool:
+    """Connection failures and 4xx replies are retried; 5xx rejections and auth failures are not
+
+    ``SMTPException`` subclasses ``OSError``, so SMTP replies are classified
+    by code before falling back to plain socket errors.
+    """
+    if isinstance(error, CONNECTION_SMTP_ERRORS):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        # e.g. SMTPRecipientsRefused: every recipient was rejected
+        return False
+    return isinstance(error, OSError)
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Whether the pooled session should be dropped after ``error``"""
+    if isinstance(error, CONNECTION_SMTP_ERRORS):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421  # server is closing the channel
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPConnectionPool:
+    """Reusable authenticated SMTP connections
+
+    A connection is handshaked (TLS and login) once and reused until it is
+    older than SMTP_CONNECTION_MAX_AGE or fails a NOOP check.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        if Config.SMTP_PORT == 465:
+            connection = smtplib.SMTP_SSL(Config.SMTP_SERVER, Config.SMTP_PORT, timeout=Config.SMTP_TIMEOUT)
+        else:
+            connection = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT, timeout=Config.SMTP_TIMEOUT)
+            if Config.SMTP_USE_TLS:
+                connection.starttls()
+        if Config.SMTP_USERNAME:
+            connection.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
+        connection.opened_at = time.time()
+        self.opened += 1
+        logging.info(f"📮 SMTP: opened connection to {Config.SMTP_SERVER}:{Config.SMTP_PORT}")
+        return connection
+
+    def _alive(self, connection: smtplib.SMTP) -> bool:
+        if time.time() - connection.opened_at > Config.SMTP_CONNECTION_MAX_AGE:
+            return False
+        try:
+            return connection.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def acquire(self) -> smtplib.SMTP:
+        """Idle live connection or a new one; blocks while all slots are in use"""
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._alive(connection):
+                    return connection
+                self._close(connection)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, connection: smtplib.SMTP, broken: bool = False):
+        if broken:
+            self._close(connection)
+        else:
+            self._idle.put(connection)
+        self._slots.release()
+
+    def _close(self, connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+class RateLimiter:
+    """Token bucket shared by every sender thread"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = max(per_minute, 1)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class MailService:
+    """Outbound mail for every module
+
+    ``send`` queues a message and returns at once; sender threads deliver
+    it through the connection pool at no more than MAIL_RATE_PER_MINUTE,
+    retrying transient SMTP failures on a fresh connection. ``send_now``
+    delivers on the calling thread for callers that need the outcome (such
+    as background jobs). ``queue_alert`` batches admin alerts into one
+    digest per MAIL_DIGEST_SECONDS so an error storm sends a handful of
+    emails rather than one per error.
+
+    Backends: ``smtp``, ``file`` (writes .eml files to MAIL_FILE_FOLDER,
+    the default when SMTP_SERVER is unset) and ``memory`` (keeps messages
+    in ``outbox``; the stand-in for tests).
+    """
+
+    def __init__(self):
+        backend = Config.MAIL_BACKEND
+        if backend == 'auto':
+            backend = 'smtp' if Config.SMTP_SERVER else 'file'
+        self.backend = backend
+        self.from_email = Config.FROM_EMAIL or Config.SMTP_USERNAME or 'noreply@localhost'
+        self.admin_emails = [email.strip() for email in Config.ADMIN_EMAILS.split(',') if email.strip()]
+        self.pool = SMTPConnectionPool(Config.MAIL_POOL_SIZE)
+        self.rate_limiter = RateLimiter(Config.MAIL_RATE_PER_MINUTE)
+        self.outbox: List[EmailMessage] = []
+        self._queue: "queue.Queue" = queue.Queue(maxsize=Config.MAIL_QUEUE_MAX)
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._digest: Dict[str, Dict[str, Any]] = {}
+        self._digest_lock = threading.Lock()
+        self._digest_started: Optional[float] = None
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'queued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'dropped': 0,
+            'alerts_batched': 0,
+            'digests_sent': 0,
+            'last_error': None
+        }
+        atexit.register(self.shutdown)
+
+    def _bump(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            workers = [
+                threading.Thread(target=self._sender, name=f'mail-sender-{index}', daemon=True)
+                for index in range(Config.MAIL_POOL_SIZE)
+            ]
+            workers.append(threading.Thread(target=self._digest_loop, name='mail-digest', daemon=True))
+            for thread in workers:
+                thread.start()
+            self._threads = workers
+            logging.info(f"📮 MAIL SERVICE: started {Config.MAIL_POOL_SIZE} senders ({self.backend} backend)")
+
+    def build_message(self, to: List[str], subject: str, text_body: Optional[str] = None,
+                      html_body: Optional[str] = None, attachments: Optional[List[Path]] = None) -> EmailMessage:
+        message = EmailMessage()
+        message['From'] = self.from_email
+        message['To'] = ', '.join(to)
+        message['Subject'] = subject
+        message['Message-ID'] = make_msgid()
+        message.set_content(text_body or 'This message requires an HTML-capable email client.')
+        if html_body:
+            message.add_alternative(html_body, subtype='html')
+
+        for path in attachments or []:
+            path = Path(path)
+            content_type, _ = mimetypes.guess_type(path.name)
+            maintype, subtype = (content_type or 'application/octet-stream').split('/', 1)
+            message.add_attachment(path.read_bytes(), maintype=maintype, subtype=subtype, filename=path.name)
+        return message
+
+    def send(self, to, subject: str, text_body: Optional[str] = None, html_body: Optional[str] = None,
+             attachments: Optional[List[Path]] = None) -> Dict[str, Any]:
+        """Queue a message for background delivery"""
+        try:
+            message = self.build_message(to if isinstance(to, list) else [to], subject, text_body, html_body, attachments)
+        except Exception as e:
+            logging.error(f"Error building email: {str(e)}")
+            return {"success": False, "error": f"Email build error: {str(e)}"}
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._bump('dropped')
+            logging.error(f"📮 MAIL QUEUE FULL: dropped '{subject}'")
+            return {"success": False, "error": "Mail queue full"}
+
+        self._bump('queued')
+        return {"success": True, "queued": True, "message_id": message['Message-ID']}
+
+    def send_now(self, to, subject: str, text_body: Optional[str] = None, html_body: Optional[str] = None,
+                 attachments: Optional[List[Path]] = None) -> Dict[str, Any]:
+        """Deliver on the calling thread (still pooled and rate limited) and report the outcome"""
+        try:
+            message = self.build_message(to if isinstance(to, list) else [to], subject, text_body, html_body, attachments)
+            return self._deliver(message)
+        except Exception as e:
+            logging.error(f"Error sending email: {str(e)}")
+            return {"success": False, "error": f"Email error: {str(e)}"}
+
+    def _deliver(self, message: EmailMessage) -> Dict[str, Any]:
+        self.rate_limiter.acquire()
+        last_error = None
+        retryable = True
+        for attempt in range(1, Config.MAIL_MAX_RETRIES + 1):
+            try:
+                result = self._transmit(message)
+                self._bump('sent')
+                logging.info(f"📧 EMAIL SENT: '{message['Subject']}' to {message['To']} via {self.backend}")
+                return {"success": True, "message_id": message['Message-ID'], **result}
+            except Exception as e:
+                last_error = str(e)
+                retryable = is_transient(e)
+                if not retryable or attempt == Config.MAIL_MAX_RETRIES:
+                    break
+                self._bump('retried')
+                time.sleep(min(2 ** attempt, 30))
+
+        self._bump('failed')
+        with self._stats_lock:
+            self._stats['last_error'] = last_error
+        logging.error(f"Failed to send email '{message['Subject']}': {last_error}")
+        # A permanent rejection should not be retried by the job queue either
+        return {"success": False, "error": f"Email delivery failed: {last_error}", "retryable": retryable}
+
+    def _transmit(self, message: EmailMessage) -> Dict[str, Any]:
+        if self.backend == 'memory':
+            self.outbox.append(message)
+            return {}
+
+        if self.backend == 'file':
+            folder = Path(Config.MAIL_FILE_FOLDER)
+            folder.mkdir(parents=True, exist_ok=True)
+            path = folder / f"email_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.eml"
+            path.write_bytes(bytes(message))
+            return {"email_file": str(path)}
+
+        connection = self.pool.acquire()
+        try:
+            connection.send_message(message)
+        except Exception as e:
+            # The session is still usable after a rejected message
+            self.pool.release(connection, broken=is_connection_error(e))
+            raise
+        self.pool.release(connection)
+        return {}
+
+    def _sender(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                message = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self._deliver(message)
+            finally:
+                self._queue.task_done()
+
+    def queue_alert(self, title: str, level: str, body: str):
+        """Add an admin alert to the current digest; repeats of a title are counted, not resent"""
+        if not self.admin_emails:
+            return
+        self._ensure_started()
+        with self._digest_lock:
+            entry = self._digest.get(title)
+            if entry:
+                entry['count'] += 1
+                entry['last_seen'] = datetime.utcnow()
+            else:
+                self._digest[title] = {
+                    'level': level,
+                    'body': body,
+                    'count': 1,
+                    'first_seen': datetime.utcnow(),
+                    'last_seen': datetime.utcnow()
+                }
+            if self._digest_started is None:
+                self._digest_started = time.time()
+            full = len(self._digest) >= Config.MAIL_DIGEST_MAX_ALERTS
+        self._bump('alerts_batched')
+        if full:
+            self.flush_digest()
+
+    def flush_digest(self) -> Dict[str, Any]:
+        """Send every buffered alert as one email"""
+        with self._digest_lock:
+            alerts, self._digest = self._digest, {}
+            self._digest_started = None
+        if not alerts:
+            return {"success": True, "alerts": 0}
+
+        levels = [alert['level'] for alert in alerts.values()]
+        top_level = 'CRITICAL' if 'CRITICAL' in levels else levels[0]
+        total = sum(alert['count'] for alert in alerts.values())
+        if len(alerts) == 1:
+            title = next(iter(alerts))
+            subject = f"[{top_level}] Multi-Agent AI System Alert: {title}"
+        else:
+            subject = f"[{top_level}] Multi-Agent AI System Alerts: {len(alerts)} issues ({total} events)"
+
+        sections = []
+        for title, alert in alerts.items():
+            repeat = f" (x{alert['count']}, last {alert['last_seen'].strftime('%H:%M:%S UTC')})" if alert['count'] > 1 else ""
+            sections.append(f"=== [{alert['level']}] {title}{repeat} ===\n{alert['body'].strip()}")
+        text_body = "\n\n".join(sections) + "\n\nPlease check the admin dashboard for more details: /admin/dashboard\n"
+
+        result = self.send(self.admin_emails, subject, text_body=text_body)
+        if result['success']:
+            self._bump('digests_sent')
+        return result
+
+    def _digest_loop(self):
+        while not self._stop.wait(1):
+            with self._digest_lock:
+                due = self._digest_started is not None and time.time() - self._digest_started >= Config.MAIL_DIGEST_SECONDS
+            if due:
+                self.flush_digest()
+
+    def shutdown(self, timeout: float = 10.0):
+        """Send pending alerts and drain the queue before exit"""
+        if not self._threads:
+            return
+        self.flush_digest()
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.1)
+        self._stop.set()
+        self.pool.close_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._digest_lock:
+            pending_alerts = len(self._digest)
+        return {
+            'backend': self.backend,
+            'queue_depth': self._queue.qsize(),
+            'pending_alerts': pending_alerts,
+            'connections_opened': self.pool.opened,
+            'pool_size': self.pool.size,
+            'rate_per_minute': self.rate_limiter.capacity,
+            **stats
+        }
+
+
+# Global instance
+mail_service = MailService()
@@ -4,13 +4,14 @@ from flask import Flask, render_template, request, jsonify, session, g, send_fil
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect
-from flask_socketio import SocketIO
-from openai import OpenAI
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from models import db, Conversation, ConversationEntry
+from models import db, Conversation, ConversationEntry, create_late_indexes
 from config import config, Config
 from utils.validators import InputValidator, SecurityValidator
+from utils.pagination import paginate, parse_total_mode, InvalidCursorError
 
 # Initialize Flask app
 def create_app(config_name=None):
@@ -52,6 +53,11 @@ def create_app(config_name=None):
         except Exception as e:
             logging.error(f"Error creating database tables: {str(e)}")
             raise e
+        
+        try:
+            create_late_indexes(db.engine)
+        except Exception as e:
+            logging.error(f"Error creating indexes on existing tables: {str(e)}")
     
     return app, limiter, csrf, socketio
 
@@ -66,6 +72,16 @@ app.register_blueprint(admin_bp)
 from video_upload import video_bp
 app.register_blueprint(video_bp)
 
+# Move upload tokens kept in Payment.description JSON into fulfillment_tokens
+from fulfillment_system import fulfillment_system
+from chunked_upload import chunked_upload_manager
+with app.app_context():
+    try:
+        fulfillment_system.migrate_legacy_tokens()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error migrating legacy upload tokens: {str(e)}")
+
 # Register voice onboarding blueprint
 from voice_onboarding import voice_bp
 app.register_blueprint(voice_bp)
@@ -73,6 +89,25 @@ app.register_blueprint(voice_bp)
 # CSRF exemptions for API endpoints
 csrf.exempt(voice_bp)
 
+# Initialize full-text search index
+from search_index import search_index
+search_index.init_app(app)
+
+# Start background clarity analysis worker
+from clarity_worker import clarity_worker
+clarity_worker.init_app(app)
+
+# Maintain dashboard/health-check counters on write
+from metrics_store import metrics_store
+metrics_store.init_app(app)
+
+# Persistent background jobs (video fulfillment and other slow work)
+from job_queue import job_queue
+job_queue.init_app(app)
+
+# Optional prefetch of the next agent step while the user reads the current one
+from speculative_executor import speculative_executor
+
 # Initialize OperatorOS Clone Generator
 from utils.operatoros_clone_generator import OperatorOSCloneGenerator
 clone_generator = OperatorOSCloneGenerator()
@@ -139,20 +174,19 @@ def handle_csuite_request_direct(input_text):
         
         system_prompt = role_prompts.get(agent_code, "You are an executive advisor.")
         
-        # Generate response using OpenAI
+        # Generate response using OpenAI (via the gateway, so identical concurrent prompts share one call)
         start_time = datetime.utcnow()
         
-        response = openai_client.chat.completions.create(
+        result = llm_gateway.generate(
+            'openai',
+            [{"role": "user", "content": clean_input}],
+            system_prompt=system_prompt,
             model=app.config['OPENAI_MODEL'],
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": clean_input}
-            ],
             max_tokens=app.config['OPENAI_MAX_TOKENS'],
             temperature=app.config['OPENAI_TEMPERATURE']
         )
         
-        response_text = response.choices[0].message.content
+        response_text = result.text
         processing_time = (datetime.utcnow() - start_time).total_seconds()
         
         # Create conversation record
@@ -174,7 +208,7 @@ def handle_csuite_request_direct(input_text):
             input_text=clean_input,
             response_text=response_text,
             processing_time_seconds=processing_time,
-            tokens_used=response.usage.total_tokens if response.usage else len(response_text.split()) * 1.3,
+            tokens_used=result.tokens_used or len(response_text.split()) * 1.3,
             model_used=app.config['OPENAI_MODEL'],
             api_provider="openai",
             response_length=len(response_text),
@@ -310,6 +344,11 @@ def periodic_health_check():
             time.sleep(300)  # Check every 5 minutes
             with app.app_context():
                 system_monitor.check_system_health()
+                chunked_upload_manager.purge_stale_sessions(Config.UPLOAD_SESSION_IDLE_HOURS)
+                fulfillment_system.purge_expired_tokens(Config.FULFILLMENT_TOKEN_RETENTION_DAYS)
+                job_queue.purge_finished(Config.JOB_RETENTION_DAYS)
+                from stripe_manager import StripeManager
+                StripeManager().purge_webhook_events(Config.STRIPE_EVENT_RETENTION_DAYS)
         except Exception as e:
             logging.error(f"Error in periodic health check: {str(e)}")
 
@@ -317,28 +356,9 @@ def periodic_health_check():
 health_check_thread = threading.Thread(target=periodic_health_check, daemon=True)
 health_check_thread.start()
 
-# Multi-API client setup
-openai_client = OpenAI(api_key=app.config['OPENAI_API_KEY'])
-
-# Claude client setup
-try:
-    import anthropic
-    claude_client = anthropic.Anthropic(api_key=app.config['CLAUDE_API_KEY']) if app.config['CLAUDE_API_KEY'] else None
-except ImportError:
-    claude_client = None
-    logging.warning("Anthropic library not installed - Claude API unavailable")
-
-# Gemini client setup
-try:
-    import google.generativeai as genai
-    if app.config['GEMINI_API_KEY']:
-        genai.configure(api_key=app.config['GEMINI_API_KEY'])
-        gemini_model = genai.GenerativeModel(app.config['GEMINI_MODEL'])
-    else:
-        gemini_model = None
-except ImportError:
-    gemini_model = None
-    logging.warning("Google GenerativeAI library not installed - Gemini API unavailable")
+# Agents share the async provider gateway (pooled connections, one event loop)
+from llm_providers import llm_gateway
+from provider_router import provider_router
 
 class Agent:
     """Base class for all AI agents with multi-API support"""
@@ -349,105 +369,126 @@ class Agent:
         self.system_prompt = system_prompt
         self.preferred_api = preferred_api or app.config['DEFAULT_API_PROVIDER']
     
-    def generate_response(self, input_text, conversation_history=None, api_override=None):
-        """Generate response using multi-API routing with fallback"""
+    def generate_response(self, input_text, conversation_history=None, api_override=None, use_cache=True):
+        """Generate response using health-aware multi-API routing with fallback (use_cache=False forces a fresh completion)"""
         # Determine which API to use
         api_to_use = api_override or self.preferred_api or app.config['DEFAULT_API_PROVIDER']
         
-        # Try primary API first
-        try:
-            if api_to_use == 'claude':
-                return self._generate_claude_response(input_text, conversation_history)
-            elif api_to_use == 'gemini':
-                return self._generate_gemini_response(input_text, conversation_history)
-            else:
-                return self._generate_openai_response(input_text, conversation_history)
-        except Exception as e:
-            logging.warning(f"Primary API {api_to_use} failed for {self.name}: {str(e)}")
-            
-            # Fallback to other available APIs
-            fallback_apis = ['openai', 'claude', 'gemini']
-            fallback_apis.remove(api_to_use)
-            
-            for fallback_api in fallback_apis:
-                try:
-                    logging.info(f"Trying fallback API {fallback_api} for {self.name}")
-                    if fallback_api == 'claude' and claude_client:
-                        return self._generate_claude_response(input_text, conversation_history)
-                    elif fallback_api == 'gemini' and gemini_model:
-                        return self._generate_gemini_response(input_text, conversation_history)
-                    elif fallback_api == 'openai':
-                        return self._generate_openai_response(input_text, conversation_history)
-                except Exception as fallback_error:
-                    logging.warning(f"Fallback API {fallback_api} also failed: {str(fallback_error)}")
-                    continue
-            
-            # If all APIs fail, raise the original error
-            raise Exception(f"All APIs failed for {self.name}. Last error: {str(e)}")
-    
-    def _generate_openai_response(self, input_text, conversation_history=None):
-        """Generate response using OpenAI API"""
-        messages = [{"role": "system", "content": self.system_prompt}]
-        
-        if conversation_history:
-            for entry in conversation_history:
-                messages.append({"role": "user", "content": f"Previous context: {entry}"})
+        # Order APIs by circuit state and latency; an explicit override stays first unless its circuit is open
+        apis = provider_router.rank(self._available_apis(api_to_use), preferred=api_to_use, pinned=bool(api_override))
+        if apis[0] != api_to_use:
+            logging.info(f"🔀 ROUTED: {self.name} sent to {apis[0]} instead of {api_to_use}")
         
-        messages.append({"role": "user", "content": input_text})
+        generators = {
+            'openai': self._generate_openai_response,
+            'claude': self._generate_claude_response,
+            'gemini': self._generate_gemini_response
+        }
         
-        response = openai_client.chat.completions.create(
-            model=app.config['OPENAI_MODEL'],
-            messages=messages,
-            max_tokens=app.config['OPENAI_MAX_TOKENS'],
-            temperature=app.config['OPENAI_TEMPERATURE']
-        )
+        last_error = None
+        for api in apis:
+            try:
+                if api != apis[0]:
+                    logging.info(f"Trying fallback API {api} for {self.name}")
+                return generators[api](input_text, conversation_history, use_cache)
+            except Exception as e:
+                last_error = e
+                logging.warning(f"API {api} failed for {self.name}: {str(e)}")
         
-        return response.choices[0].message.content.strip(), 'openai'
+        # If all APIs fail, raise the last error (chained, so retry logic can see rate limiting)
+        raise Exception(f"All APIs failed for {self.name}. Last error: {str(last_error)}") from last_error
     
-    def _generate_claude_response(self, input_text, conversation_history=None):
-        """Generate response using Claude API"""
-        if not claude_client:
-            raise Exception("Claude API not available")
-        
-        # Build conversation context
+    @staticmethod
+    def _available_apis(api_to_use):
+        """Configured APIs, always including the requested one so its error surfaces"""
+        apis = [api for api in ['openai', 'claude', 'gemini'] if llm_gateway.is_available(api)]
+        if api_to_use in ('openai', 'claude', 'gemini') and api_to_use not in apis:
+            apis.insert(0, api_to_use)
+        return apis or ['openai']
+    
+    def _build_context(self, conversation_history=None):
+        """Flatten recent history into the plain-text context used by Claude and Gemini"""
         context = ""
         if conversation_history:
             for entry in conversation_history:
                 context += f"Previous context: {entry}\n"
+        return context
+    
+    def _build_request(self, api, input_text, conversation_history=None):
+        """Build the (messages, system_prompt) pair sent to the given API"""
+        if api == 'claude':
+            prompt = f"{self.system_prompt}\n\n{self._build_context(conversation_history)}Human: {input_text}\n\nAssistant:"
+            return [{"role": "user", "content": prompt}], None
+        elif api == 'gemini':
+            prompt = f"{self.system_prompt}\n\n{self._build_context(conversation_history)}User: {input_text}"
+            return [{"role": "user", "content": prompt}], None
+        
+        messages = []
+        if conversation_history:
+            for entry in conversation_history:
+                messages.append({"role": "user", "content": f"Previous context: {entry}"})
+        messages.append({"role": "user", "content": input_text})
+        return messages, self.system_prompt
+    
+    def _generate_openai_response(self, input_text, conversation_history=None, use_cache=True):
+        """Generate response using OpenAI API"""
+        messages, system_prompt = self._build_request('openai', input_text, conversation_history)
         
-        prompt = f"{self.system_prompt}\n\n{context}Human: {input_text}\n\nAssistant:"
+        result = llm_gateway.generate('openai', messages, system_prompt=system_prompt, use_cache=use_cache)
+        return result.text.strip(), 'openai'
+    
+    def _generate_claude_response(self, input_text, conversation_history=None, use_cache=True):
+        """Generate response using Claude API"""
+        if not llm_gateway.is_available('claude'):
+            raise Exception("Claude API not available")
         
-        response = claude_client.messages.create(
-            model=app.config['CLAUDE_MODEL'],
-            max_tokens=app.config['CLAUDE_MAX_TOKENS'],
-            temperature=app.config['CLAUDE_TEMPERATURE'],
-            messages=[{"role": "user", "content": prompt}]
-        )
+        messages, system_prompt = self._build_request('claude', input_text, conversation_history)
         
-        return response.content[0].text.strip(), 'claude'
+        result = llm_gateway.generate('claude', messages, system_prompt=system_prompt, use_cache=use_cache)
+        return result.text.strip(), 'claude'
     
-    def _generate_gemini_response(self, input_text, conversation_history=None):
+    def _generate_gemini_response(self, input_text, conversation_history=None, use_cache=True):
         """Generate response using Gemini API"""
-        if not gemini_model:
+        if not llm_gateway.is_available('gemini'):
             raise Exception("Gemini API not available")
         
-        # Build conversation context
-        context = ""
-        if conversation_history:
-            for entry in conversation_history:
-                context += f"Previous context: {entry}\n"
+        messages, system_prompt = self._build_request('gemini', input_text, conversation_history)
         
-        prompt = f"{self.system_prompt}\n\n{context}User: {input_text}"
+        result = llm_gateway.generate('gemini', messages, system_prompt=system_prompt, use_cache=use_cache)
+        return result.text.strip(), 'gemini'
+    
+    def evict_cached_response(self, input_text, conversation_history, api):
+        """Remove the cached completion this agent would be served for the same request"""
+        if api not in ('openai', 'claude', 'gemini'):
+            return
+        messages, system_prompt = self._build_request(api, input_text, conversation_history)
+        llm_gateway.evict(api, messages, system_prompt=system_prompt)
+    
+    def stream_response(self, input_text, conversation_history=None, api_override=None, use_cache=True):
+        """Stream response tokens, yielding (chunk, api_used) tuples
         
-        response = gemini_model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=app.config['GEMINI_MAX_TOKENS'],
-                temperature=app.config['GEMINI_TEMPERATURE']
-            )
-        )
+        Falls back to the next available API only if the current one fails
+        before producing any output; a failure mid-stream is raised.
+        """
+        api_to_use = api_override or self.preferred_api or app.config['DEFAULT_API_PROVIDER']
+        apis = provider_router.rank(self._available_apis(api_to_use), preferred=api_to_use, pinned=bool(api_override))
         
-        return response.text.strip(), 'gemini'
+        last_error = None
+        for api in apis:
+            messages, system_prompt = self._build_request(api, input_text, conversation_history)
+            started = False
+            try:
+                for chunk in llm_gateway.stream(api, messages, system_prompt=system_prompt, use_cache=use_cache):
+                    started = True
+                    yield chunk, api
+                return
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+                logging.warning(f"Streaming API {api} failed for {self.name}: {str(e)}")
+        
+        raise Exception(f"All APIs failed to stream for {self.name}. Last error: {str(last_error)}")
     
     def extract_next_question(self, response):
         """Extract the question for the next agent from the response"""
@@ -673,26 +714,42 @@ class ConversationChain:
         chain = cls(conversation_id, extended_mode=extended_mode)
         return chain
     
-    def process_input(self, input_text):
-        """Process input through the current agent and advance to next with enhanced persistence"""
+    @staticmethod
+    def _parse_api_override(input_text):
+        """Split an optional @claude:/@gemini:/@openai: prefix from the input"""
+        if input_text.startswith('@claude:'):
+            return 'claude', input_text[8:].strip()
+        elif input_text.startswith('@gemini:'):
+            return 'gemini', input_text[8:].strip()
+        elif input_text.startswith('@openai:'):
+            return 'openai', input_text[9:].strip()
+        return None, input_text
+    
+    def _get_context_history(self):
+        """Get recent conversation history for agent context"""
+        recent_entries = self.conversation.entries.order_by(ConversationEntry.created_at.desc()).limit(3).all()
+        return [entry.to_dict() for entry in reversed(recent_entries)]
+    
+    def process_input(self, input_text, generate=None, started_at=None):
+        """Process input through the current agent and advance to next with enhanced persistence
+        
+        Args:
+            input_text: Input for the current agent (may carry an API prefix)
+            generate: Optional zero-argument callable returning (response, api_used).
+                Used when the response was produced elsewhere (e.g. a parallel
+                worker); exceptions it raises are recorded like generation errors.
+            started_at: When generation actually started, for processing time; a
+                callable is evaluated after ``generate`` returns (for responses
+                produced ahead of time, see speculative_executor.claim)
+        """
         if self.conversation.is_complete:
             raise Exception("Conversation chain is already complete")
         
-        start_time = datetime.utcnow()
+        start_time = started_at if isinstance(started_at, datetime) else datetime.utcnow()
         
         # Check for API prefix selection
-        api_override = None
         original_input = input_text
-        
-        if input_text.startswith('@claude:'):
-            api_override = 'claude'
-            input_text = input_text[8:].strip()
-        elif input_text.startswith('@gemini:'):
-            api_override = 'gemini'
-            input_text = input_text[8:].strip()
-        elif input_text.startswith('@openai:'):
-            api_override = 'openai'
-            input_text = input_text[9:].strip()
+        api_override, input_text = self._parse_api_override(input_text)
         
         try:
             current_agent = self.agents[self.conversation.current_agent_index]
@@ -702,12 +759,16 @@ class ConversationChain:
             if api_override:
                 logging.info(f"🔀 API OVERRIDE: Using {api_override} for this request")
             
-            # Get recent conversation history for context
-            recent_entries = self.conversation.entries.order_by(ConversationEntry.created_at.desc()).limit(3).all()
-            context_history = [entry.to_dict() for entry in reversed(recent_entries)]
-            
-            # Generate response from current agent with timeout and retry
-            response, api_used = self._generate_with_retry(current_agent, input_text, context_history, max_retries=3, timeout_seconds=15, api_override=api_override)
+            if generate is None:
+                # Get recent conversation history for context
+                context_history = self._get_context_history()
+                
+                # Generate response from current agent with timeout and retry
+                response, api_used = self._generate_with_retry(current_agent, input_text, context_history, max_retries=3, timeout_seconds=15, api_override=api_override)
+            else:
+                response, api_used = generate()
+                if callable(started_at):
+                    start_time = started_at() or start_time
             
             # Extract question for next agent
             next_question = current_agent.extract_next_question(response)
@@ -732,17 +793,8 @@ class ConversationChain:
                 error_occurred=False
             )
             
-            # Analyze human-clarity of the response
-            try:
-                from human_clarity import clarity_engine
-                clarity_metrics = clarity_engine.analyze_response_clarity(response, input_text)
-                # Log clarity analysis (will be stored in entry after save)
-                db.session.add(entry)
-                db.session.flush()  # Get the entry ID
-                clarity_engine.log_clarity_analysis(self.conversation.id, entry.id, clarity_metrics)
-            except Exception as e:
-                logging.warning(f"Human-clarity analysis failed: {str(e)}")
-
+            # Save the entry (the search index hook adds its document in the same commit)
+            db.session.add(entry)
             
             # Update conversation token usage (estimate)
             estimated_tokens = len(input_text) // 4 + len(response) // 4  # Rough estimate
@@ -780,6 +832,9 @@ class ConversationChain:
             self.conversation.updated_at = datetime.utcnow()
             db.session.commit()
             
+            # Human-clarity scoring happens off the request path, in batches
+            clarity_worker.enqueue(entry.id, input_text)
+            
             return entry.to_dict()
             
         except Exception as e:
@@ -833,111 +888,122 @@ class ConversationChain:
         else:
             return app.config['OPENAI_MODEL']
     
-    def _generate_with_retry(self, agent, input_text, context_history, max_retries=3, timeout_seconds=15, api_override=None):
-        """Generate response with enhanced retry mechanism and timeout"""
-        import signal
-        import time
-        from datetime import datetime
+    @staticmethod
+    def _response_validator(agent, max_retries, input_text, context_history):
+        """Build the ``validate(result, attempt)`` check shared by generated and streamed turns
         
-        for attempt in range(max_retries):
-            start_time = datetime.utcnow()
+        A rejected response is evicted from the LLM cache so later identical
+        requests are not served it again.
+        """
+        def check(response, attempt):
+            # Require more substantial responses
+            if not response or len(response.strip()) <= 50:
+                raise ValueError(f"Response too short ({len(response.strip()) if response else 0} chars) or empty")
+            # Check for proper question format for non-Writer agents (accepted on the final attempt)
+            if agent.name != "Writer" and "NEXT AGENT QUESTION:" not in response:
+                logging.warning(f"⚠️ FORMAT WARNING: {agent.name} response missing 'NEXT AGENT QUESTION:' format")
+                if attempt < max_retries:
+                    raise ValueError("Missing required NEXT AGENT QUESTION format")
+        
+        def validate_response(result, attempt):
+            response, api_used = result
             try:
-                logging.info(f"🔄 RETRY ATTEMPT: {attempt + 1}/{max_retries} for {agent.name}")
-                
-                # Set timeout alarm with longer duration for complex agents
-                def timeout_handler(signum, frame):
-                    raise TimeoutError(f"Agent {agent.name} response timeout after {timeout_seconds}s")
-                
-                signal.signal(signal.SIGALRM, timeout_handler)
-                signal.alarm(timeout_seconds)
-                
-                try:
-                    # Generate response with enhanced validation
-                    response, api_used = agent.generate_response(input_text, context_history, api_override)
-                    signal.alarm(0)  # Cancel alarm
-                    
-                    # Enhanced response validation
-                    if response and len(response.strip()) > 50:  # Require more substantial responses
-                        # Check for proper question format for non-Writer agents
-                        if agent.name != "Writer" and "NEXT AGENT QUESTION:" not in response:
-                            logging.warning(f"⚠️ FORMAT WARNING: {agent.name} response missing 'NEXT AGENT QUESTION:' format")
-                            # Try to extract or generate a question anyway
-                            if attempt < max_retries - 1:
-                                raise ValueError("Missing required NEXT AGENT QUESTION format")
-                        
-                        processing_time = (datetime.utcnow() - start_time).total_seconds()
-                        logging.info(f"✅ RETRY SUCCESS: {agent.name} responded successfully in {processing_time:.2f}s using {api_used}")
-                        return response, api_used
-                    else:
-                        raise ValueError(f"Response too short ({len(response.strip()) if response else 0} chars) or empty")
-                        
-                except TimeoutError:
-                    signal.alarm(0)  # Cancel alarm
-                    processing_time = (datetime.utcnow() - start_time).total_seconds()
-                    logging.warning(f"⏱️ TIMEOUT: {agent.name} timed out on attempt {attempt + 1} after {processing_time:.2f}s")
-                    if attempt == max_retries - 1:
-                        raise TimeoutError(f"Agent {agent.name} failed after {max_retries} timeout attempts")
-                    time.sleep(3)  # Longer wait for timeout recovery
-                    
-            except Exception as e:
-                signal.alarm(0)  # Cancel alarm
-                processing_time = (datetime.utcnow() - start_time).total_seconds()
-                logging.error(f"❌ RETRY FAILED: {agent.name} attempt {attempt + 1} ({processing_time:.2f}s): {str(e)}")
-                
-                if attempt == max_retries - 1:
-                    # Final attempt failed - log comprehensive error
-                    logging.critical(f"🚨 AGENT FAILURE: {agent.name} failed after {max_retries} attempts")
-                    raise Exception(f"Agent {agent.name} failed after {max_retries} attempts: {str(e)}")
-                
-                # Progressive backoff
-                wait_time = (attempt + 1) * 2  # 2s, 4s, 6s...
-                logging.info(f"⏳ WAITING: {wait_time}s before retry {attempt + 2}")
-                time.sleep(wait_time)
-                
-        raise Exception(f"All retry attempts failed for {agent.name}")
+                check(response, attempt)
+            except ValueError:
+                agent.evict_cached_response(input_text, context_history, api_used)
+                raise
+        return validate_response
     
-    def execute_full_loop(self, initial_input):
-        """Execute complete OperatorOS loop: Analyst → Researcher → Writer → Refiner → [All Available Agents]"""
-        logging.info(f"🚀 STARTING FULL OPERATOROS LOOP")
+    def _generate_with_retry(self, agent, input_text, context_history, max_retries=3, timeout_seconds=15, api_override=None):
+        """Generate response with deadline-bounded retries (safe from any thread)"""
+        import itertools
+        from deadline_executor import deadline_executor, DeadlineExceeded
+        
+        start_time = datetime.utcnow()
+        logging.info(f"🔄 GENERATING: {agent.name} (up to {max_retries} attempts, {timeout_seconds}s each)")
+        
+        attempts = itertools.count(1)
+        
+        def generate_attempt():
+            # Retries must not be served the cached response that was just rejected
+            return agent.generate_response(input_text, context_history, api_override, use_cache=next(attempts) == 1)
+        
+        try:
+            response, api_used = deadline_executor.run(
+                generate_attempt,
+                policy=deadline_executor.policy(max_attempts=max_retries, attempt_timeout=timeout_seconds),
+                validate=self._response_validator(agent, max_retries, input_text, context_history),
+                label=agent.name
+            )
+        except DeadlineExceeded as e:
+            logging.critical(f"🚨 AGENT FAILURE: {agent.name} ran out of time: {str(e)}")
+            raise TimeoutError(f"Agent {agent.name} failed: {str(e)}")
+        except Exception as e:
+            logging.critical(f"🚨 AGENT FAILURE: {agent.name} failed after {max_retries} attempts")
+            raise Exception(f"Agent {agent.name} failed after {max_retries} attempts: {str(e)}")
+        
+        processing_time = (datetime.utcnow() - start_time).total_seconds()
+        logging.info(f"✅ RETRY SUCCESS: {agent.name} responded successfully in {processing_time:.2f}s using {api_used}")
+        return response, api_used
+    
+    def _stream_with_retry(self, agent, input_text, context_history, on_chunk, on_retry=None,
+                           max_retries=3, timeout_seconds=15, api_override=None):
+        """Stream a response under the same deadlines, retries and validation as ``_generate_with_retry``
+        
+        ``on_chunk(chunk)`` receives each chunk as it arrives; ``on_retry(attempt)``
+        is called before a retry starts so listeners can discard the rejected text.
+        Hedging is disabled because parallel attempts would interleave their chunks.
+        """
+        import itertools
+        from deadline_executor import deadline_executor, DeadlineExceeded
+        
+        attempts = itertools.count(1)
+        
+        def stream_attempt():
+            attempt = next(attempts)
+            if attempt > 1 and on_retry:
+                on_retry(attempt)
+            parts = []
+            api_used = None
+            for chunk, api_used in agent.stream_response(input_text, context_history, api_override, use_cache=attempt == 1):
+                parts.append(chunk)
+                on_chunk(chunk)
+            return ''.join(parts).strip(), api_used
+        
+        logging.info(f"🔄 STREAMING: {agent.name} (up to {max_retries} attempts, {timeout_seconds}s each)")
+        try:
+            return deadline_executor.run(
+                stream_attempt,
+                policy=deadline_executor.policy(max_attempts=max_retries, attempt_timeout=timeout_seconds, hedge_after=None),
+                validate=self._response_validator(agent, max_retries, input_text, context_history),
+                label=agent.name
+            )
+        except DeadlineExceeded as e:
+            logging.critical(f"🚨 AGENT FAILURE: {agent.name} stream ran out of time: {str(e)}")
+            raise TimeoutError(f"Agent {agent.name} failed: {str(e)}")
+    
+    def execute_full_loop(self, initial_input, execution_mode=None):
+        """Execute complete OperatorOS loop: Analyst → Researcher → Writer → Refiner → [All Available Agents]
+        
+        Args:
+            initial_input: Input for the first agent
+            execution_mode: 'sequential' (default) runs one agent at a time;
+                'parallel' runs agents with no dependency on each other
+                concurrently on a bounded worker pool
+        """
+        execution_mode = execution_mode or app.config['LOOP_EXECUTION_MODE']
+        
+        logging.info(f"🚀 STARTING FULL OPERATOROS LOOP ({execution_mode})")
         logging.info(f"📝 Initial Input: {initial_input}")
         logging.info(f"👥 Total Available Agents: {len(self.agents)} ({[agent.name for agent in self.agents]})")
         
         loop_results = []
-        current_input = initial_input
         
         try:
-            # Execute all agents in sequence dynamically
-            for step, agent in enumerate(self.agents, 1):
-                if step == 1:
-                    # First agent gets the original input
-                    agent_input = current_input
-                    logging.info(f"🔍 STEP {step}: EXECUTING {agent.name.upper()} AGENT")
-                    logging.info(f"📝 Input: {agent_input}")
-                else:
-                    # Subsequent agents get the next question from previous agent
-                    previous_result = loop_results[-1]
-                    if not previous_result.get('next_question'):
-                        logging.warning(f"⚠️ {loop_results[-1].get('agent_name', 'Previous agent')} failed to generate next question")
-                        # For the final agent (usually Writer), we allow this
-                        if step == len(self.agents):
-                            logging.info(f"🎯 FINAL AGENT: {agent.name} - no next question required")
-                            break
-                        else:
-                            raise Exception(f"{loop_results[-1].get('agent_name', 'Previous agent')} failed to generate next question for {agent.name}")
-                    
-                    agent_input = previous_result['next_question']
-                    logging.info(f"🔄 STEP {step}: AUTO-TRIGGERING {agent.name.upper()} AGENT")
-                    logging.info(f"🔗 {agent.name} Input: {agent_input}")
-                
-                # Execute current agent
-                agent_result = self.process_input(agent_input)
-                loop_results.append(agent_result)
-                logging.info(f"✅ STEP {step} COMPLETE: {agent.name} executed successfully")
-                
-                # Check if this is the last agent or conversation is marked complete
-                if self.conversation.current_agent_index >= len(self.agents) or self.conversation.is_complete:
-                    logging.info(f"🎯 LOOP COMPLETION: Reached agent {step}/{len(self.agents)} - {agent.name}")
-                    break
+            if execution_mode == 'parallel':
+                self._execute_parallel_loop(initial_input, loop_results)
+            else:
+                self._execute_sequential_loop(initial_input, loop_results)
             
             # Determine final status
             total_agents_executed = len(loop_results)
@@ -991,6 +1057,7 @@ class ConversationChain:
             return {
                 "success": True,
                 "loop_status": loop_status,
+                "execution_mode": execution_mode,
                 "agents_executed": total_agents_executed,
                 "total_agents_available": len(self.agents),
                 "agent_sequence": [r.get('agent_name', 'Unknown') for r in loop_results],
@@ -1019,12 +1086,145 @@ class ConversationChain:
             return {
                 "success": False,
                 "loop_status": "failed",
+                "execution_mode": execution_mode,
                 "agents_executed": len(loop_results),
                 "error": str(e),
                 "conversation_id": self.conversation.id,
                 "results": loop_results
             }
 
+    def _execute_sequential_loop(self, initial_input, loop_results):
+        """Run every agent one after another, feeding each the previous next_question"""
+        current_input = initial_input
+        
+        # Execute all agents in sequence dynamically
+        for step, agent in enumerate(self.agents, 1):
+            if step == 1:
+                # First agent gets the original input
+                agent_input = current_input
+                logging.info(f"🔍 STEP {step}: EXECUTING {agent.name.upper()} AGENT")
+                logging.info(f"📝 Input: {agent_input}")
+            else:
+                # Subsequent agents get the next question from previous agent
+                previous_result = loop_results[-1]
+                if not previous_result.get('next_question'):
+                    logging.warning(f"⚠️ {loop_results[-1].get('agent_name', 'Previous agent')} failed to generate next question")
+                    # For the final agent (usually Writer), we allow this
+                    if step == len(self.agents):
+                        logging.info(f"🎯 FINAL AGENT: {agent.name} - no next question required")
+                        return
+                    else:
+                        raise Exception(f"{loop_results[-1].get('agent_name', 'Previous agent')} failed to generate next question for {agent.name}")
+                
+                agent_input = previous_result['next_question']
+                logging.info(f"🔄 STEP {step}: AUTO-TRIGGERING {agent.name.upper()} AGENT")
+                logging.info(f"🔗 {agent.name} Input: {agent_input}")
+            
+            # Execute current agent
+            agent_result = self.process_input(agent_input)
+            loop_results.append(agent_result)
+            logging.info(f"✅ STEP {step} COMPLETE: {agent.name} executed successfully")
+            
+            # Check if this is the last agent or conversation is marked complete
+            if self.conversation.current_agent_index >= len(self.agents) or self.conversation.is_complete:
+                logging.info(f"🎯 LOOP COMPLETION: Reached agent {step}/{len(self.agents)} - {agent.name}")
+                return
+    
+    def _build_dependency_graph(self):
+        """Map each agent index to the index of the agent whose next_question it consumes
+        
+        Core agents form a strict chain. Extended C-Suite agents only need the
+        final core agent's question, so they all fan out from it.
+        """
+        last_core_index = len(self.core_agents) - 1
+        graph = {}
+        for index in range(len(self.agents)):
+            if index == 0:
+                graph[index] = None
+            elif index <= last_core_index:
+                graph[index] = index - 1
+            else:
+                graph[index] = last_core_index
+        return graph
+    
+    def _build_execution_waves(self, graph):
+        """Group agent indexes into waves that only depend on earlier waves"""
+        depth = {}
+        for index in sorted(graph):
+            upstream = graph[index]
+            depth[index] = 0 if upstream is None else depth[upstream] + 1
+        
+        waves = {}
+        for index, level in depth.items():
+            waves.setdefault(level, []).append(index)
+        return [sorted(waves[level]) for level in sorted(waves)]
+    
+    def _generate_for_agent(self, agent, agent_input, context_history):
+        """Generate an agent response without touching the database (safe for worker threads)"""
+        api_override, clean_input = self._parse_api_override(agent_input)
+        return self._generate_with_retry(agent, clean_input, context_history, max_retries=3, timeout_seconds=15, api_override=api_override)
+    
+    def _execute_parallel_loop(self, initial_input, loop_results):
+        """Run independent agents concurrently and persist their entries in agent order"""
+        graph = self._build_dependency_graph()
+        waves = self._build_execution_waves(graph)
+        results_by_index = {}
+        max_workers = max(1, app.config['LOOP_MAX_WORKERS'])
+        
+        logging.info(f"🧭 PARALLEL PLAN: {[[self.agents[i].name for i in wave] for wave in waves]} (max {max_workers} workers)")
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='agent-loop') as pool:
+            for wave_number, wave in enumerate(waves, 1):
+                # Resolve each agent's input from its upstream agent
+                wave_inputs = []
+                for index in wave:
+                    upstream = graph[index]
+                    if upstream is None:
+                        wave_inputs.append((index, initial_input))
+                        continue
+                    
+                    upstream_result = results_by_index[upstream]
+                    if not upstream_result.get('next_question'):
+                        upstream_name = upstream_result.get('agent_name', 'Previous agent')
+                        logging.warning(f"⚠️ {upstream_name} failed to generate next question")
+                        # Mirror sequential mode: only the final agent may go without a question
+                        if index == len(self.agents) - 1:
+                            logging.info(f"🎯 FINAL AGENT: {self.agents[index].name} - no next question required")
+                            break
+                        raise Exception(f"{upstream_name} failed to generate next question for {self.agents[index].name}")
+                    wave_inputs.append((index, upstream_result['next_question']))
+                
+                if not wave_inputs:
+                    return
+                
+                logging.info(f"⚡ WAVE {wave_number}/{len(waves)}: {[self.agents[i].name for i, _ in wave_inputs]}")
+                
+                context_history = self._get_context_history()
+                started_at = datetime.utcnow()
+                futures = {
+                    index: pool.submit(self._generate_for_agent, self.agents[index], agent_input, context_history)
+                    for index, agent_input in wave_inputs
+                }
+                
+                # Persist in agent order so ConversationEntry rows are deterministic
+                try:
+                    for index, agent_input in wave_inputs:
+                        if self.conversation.current_agent_index != index:
+                            raise Exception(f"Parallel loop out of order: expected agent {index}, conversation at {self.conversation.current_agent_index}")
+                        
+                        agent_result = self.process_input(agent_input, generate=futures[index].result, started_at=started_at)
+                        results_by_index[index] = agent_result
+                        loop_results.append(agent_result)
+                        logging.info(f"✅ STEP {index + 1} COMPLETE: {self.agents[index].name} executed successfully")
+                except Exception:
+                    for future in futures.values():
+                        future.cancel()
+                    raise
+                
+                if self.conversation.is_complete:
+                    logging.info(f"🎯 LOOP COMPLETION: Reached agent {self.conversation.current_agent_index}/{len(self.agents)}")
+                    return
+    
     def get_next_agent_name(self):
         """Get the name of the next agent in the chain"""
         if self.conversation.current_agent_index < len(self.agents):
@@ -1268,6 +1468,7 @@ def start_conversation():
         
         # Process initial input with Analyst
         result = chain.process_input(input_text)
+        speculative_executor.schedule(chain, result)
         
         # Store conversation ID and session info
         session['conversation_id'] = chain.conversation.id
@@ -1385,8 +1586,24 @@ def continue_conversation():
         if not next_question:
             return jsonify({"error": "No question available for next agent"}), 400
         
-        # Process with next agent
-        result = chain.process_input(next_question)
+        # Streaming mode: relay tokens over SocketIO and persist when the stream completes
+        data = request.get_json(silent=True) or {}
+        if data.get('stream'):
+            speculative_executor.discard(conversation_id)
+            _reset_stream_events(conversation_id)
+            socketio.start_background_task(_stream_conversation_turn, conversation_id, next_question)
+            return jsonify({
+                "success": True,
+                "streaming": True,
+                "conversation_id": conversation_id,
+                "room": f"conversation_{conversation_id}",
+                "agent": chain.get_next_agent_name()
+            }), 202
+        
+        # Process with next agent, serving the prefetched response when one matches
+        generate, started_at = speculative_executor.claim(chain, next_question, last_entry["id"]) or (None, None)
+        result = chain.process_input(next_question, generate=generate, started_at=started_at)
+        speculative_executor.schedule(chain, result)
         
         logging.info(f"Conversation continued: {conversation_id}, agent: {result['agent']}")
         
@@ -1401,6 +1618,91 @@ def continue_conversation():
         logging.error(f"Error continuing conversation: {str(e)}")
         return jsonify({"error": "An internal error occurred. Please try again."}), 500
 
+# Stream events per conversation, replayed to clients that join the room after the turn started
+STREAM_REPLAY_SECONDS = 120
+_stream_events = {}
+_stream_events_lock = threading.Lock()
+
+def _relay_stream_event(conversation_id, event, payload):
+    """Emit a stream event to the conversation room and keep it for late joiners"""
+    with _stream_events_lock:
+        buffer = _stream_events.setdefault(conversation_id, {'events': [], 'finished_at': None})
+        payload = {**payload, 'seq': len(buffer['events'])}
+        buffer['events'].append((event, payload))
+        if event in ('agent_stream_complete', 'agent_stream_error'):
+            buffer['finished_at'] = time.time()
+        socketio.emit(event, payload, room=f"conversation_{conversation_id}")
+
+def _reset_stream_events(conversation_id):
+    """Start a fresh buffer for a new turn and drop buffers of turns finished long ago"""
+    cutoff = time.time() - STREAM_REPLAY_SECONDS
+    with _stream_events_lock:
+        for key in [key for key, buffer in _stream_events.items() if buffer['finished_at'] and buffer['finished_at'] < cutoff]:
+            del _stream_events[key]
+        _stream_events[conversation_id] = {'events': [], 'finished_at': None}
+
+def _stream_conversation_turn(conversation_id, input_text):
+    """Stream the next agent's response to the conversation room, then persist it"""
+    with app.app_context():
+        try:
+            chain = ConversationChain(conversation_id)
+            agent = chain.agents[chain.conversation.current_agent_index]
+            api_override, clean_input = chain._parse_api_override(input_text)
+            context_history = chain._get_context_history()
+            
+            started_at = datetime.utcnow()
+            _relay_stream_event(conversation_id, 'agent_stream_start', {'conversation_id': conversation_id, 'agent': agent.name})
+            
+            def generate():
+                return chain._stream_with_retry(
+                    agent, clean_input, context_history,
+                    on_chunk=lambda chunk: _relay_stream_event(conversation_id, 'agent_stream_chunk', {
+                        'conversation_id': conversation_id, 'agent': agent.name, 'chunk': chunk
+                    }),
+                    on_retry=lambda attempt: _relay_stream_event(conversation_id, 'agent_stream_retry', {
+                        'conversation_id': conversation_id, 'agent': agent.name, 'attempt': attempt
+                    }),
+                    api_override=api_override
+                )
+            
+            result = chain.process_input(input_text, generate=generate, started_at=started_at)
+            
+            _relay_stream_event(conversation_id, 'agent_stream_complete', {
+                'conversation_id': conversation_id,
+                'result': result,
+                'next_agent': chain.get_next_agent_name(),
+                'is_complete': chain.is_complete
+            })
+            logging.info(f"Conversation continued (streamed): {conversation_id}, agent: {result['agent']}")
+        
+        except Exception as e:
+            logging.error(f"Error streaming conversation {conversation_id}: {str(e)}")
+            _relay_stream_event(conversation_id, 'agent_stream_error', {
+                'conversation_id': conversation_id,
+                'error': 'An internal error occurred. Please try again.'
+            })
+
+@socketio.on('join_conversation')
+def handle_join_conversation(data):
+    """Subscribe the client to stream events for its active conversation, replaying the current turn"""
+    conversation_id = (data or {}).get('conversation_id')
+    if not conversation_id or conversation_id != session.get('conversation_id'):
+        emit('agent_stream_error', {'conversation_id': conversation_id, 'error': 'Conversation not found'})
+        return
+    # Joining and replaying under the relay lock means no event is missed or delivered twice
+    with _stream_events_lock:
+        join_room(f"conversation_{conversation_id}")
+        emit('conversation_joined', {'conversation_id': conversation_id})
+        for event, payload in _stream_events.get(conversation_id, {}).get('events', []):
+            emit(event, payload)
+
+@socketio.on('leave_conversation')
+def handle_leave_conversation(data):
+    """Unsubscribe the client from a conversation room"""
+    conversation_id = (data or {}).get('conversation_id')
+    if conversation_id:
+        leave_room(f"conversation_{conversation_id}")
+
 @app.route('/get_conversation_history')
 def get_conversation_history():
     """Get the current conversation history and conversation info"""
@@ -1495,6 +1797,10 @@ def execute_full_loop():
         # Check for extended mode
         extended_mode = data.get('extended_mode', False)
         
+        execution_mode = data.get('execution_mode')
+        if execution_mode not in (None, 'sequential', 'parallel'):
+            return jsonify({"error": "execution_mode must be 'sequential' or 'parallel'"}), 400
+        
         # Create new conversation chain with extended mode support
         chain = ConversationChain.create_new(
             input_text,
@@ -1504,7 +1810,7 @@ def execute_full_loop():
         )
         
         # Execute full loop with auto-triggering
-        loop_result = chain.execute_full_loop(input_text)
+        loop_result = chain.execute_full_loop(input_text, execution_mode=execution_mode)
         
         # Store conversation ID in session
         session['conversation_id'] = chain.conversation.id
@@ -1538,6 +1844,10 @@ def api_execute_full_loop():
         input_text = data['initial_input'].strip()
         extended_mode = data.get('extended_mode', False)
         
+        execution_mode = data.get('execution_mode')
+        if execution_mode not in (None, 'sequential', 'parallel'):
+            return jsonify({"error": "execution_mode must be 'sequential' or 'parallel'"}), 400
+        
         # Validate input
         is_valid, error_msg = InputValidator.validate_conversation_input(input_text)
         if not is_valid:
@@ -1558,7 +1868,7 @@ def api_execute_full_loop():
         )
         
         # Execute full loop
-        loop_result = chain.execute_full_loop(input_text)
+        loop_result = chain.execute_full_loop(input_text, execution_mode=execution_mode)
         
         return jsonify({
             **loop_result,
@@ -1591,7 +1901,7 @@ def reset_conversation():
 @app.route('/webhooks/stripe', methods=['POST'])
 @limiter.exempt  # Stripe webhooks shouldn't be rate limited
 def stripe_webhook():
-    """Handle Stripe webhook events"""
+    """Verify, record and queue Stripe webhook events; payment work runs in the job queue"""
     try:
         from stripe_manager import StripeManager
         
@@ -1602,7 +1912,7 @@ def stripe_webhook():
         result = stripe_manager.handle_webhook(payload, sig_header)
         
         if result['success']:
-            return jsonify({'status': 'success'}), 200
+            return jsonify({'status': 'success', 'duplicate': result.get('duplicate', False)}), 200
         else:
             logging.error(f"Webhook processing failed: {result.get('error')}")
             return jsonify({'status': 'error', 'message': result.get('error')}), 400
@@ -1614,7 +1924,12 @@ def stripe_webhook():
 @app.route('/list_conversations')
 @limiter.limit("20 per minute")
 def list_conversations():
-    """Get a list of all conversations with optional search"""
+    """Get a keyset-paginated list of conversations with optional search
+    
+    Query params: search, limit (max 100), cursor (next_cursor from the previous page),
+    total ('none' default, 'approx' or 'exact'). With ``search`` the results are the
+    top ``limit`` full-text matches ordered by relevance instead of a cursor page.
+    """
     try:
         # Validate session
         if not SecurityValidator.validate_session_data(session):
@@ -1623,16 +1938,27 @@ def list_conversations():
         
         # Get search query if provided
         search_query = request.args.get('search', '').strip()
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 100)
+        cursor = request.args.get('cursor')
         
-        # Build query
-        query = Conversation.query
-        
+        ranks = {}
         if search_query:
-            # Search in initial_input field
-            search_pattern = f"%{search_query}%"
-            query = query.filter(Conversation.initial_input.ilike(search_pattern))
+            # Ranked full-text search over inputs and agent responses (top results, no cursor)
+            ranked = search_index.search_conversations(search_query, limit)
+            conversations = [conv for conv, _ in ranked]
+            ranks = {conv.id: rank for conv, rank in ranked}
+            next_cursor, total = None, len(conversations)
+        else:
+            try:
+                page = paginate(Conversation.query, Conversation.created_at, Conversation.id, cursor, limit,
+                                total=parse_total_mode(request.args.get('total'), default='none'))
+            except InvalidCursorError as e:
+                return jsonify({"error": str(e)}), 400
+            conversations = page.items
+            next_cursor, total = page.next_cursor, page.total
         
-        conversations = query.order_by(Conversation.created_at.desc()).limit(50).all()
+        # Entry counts for the whole page in one grouped query
+        entry_counts = Conversation.get_entry_counts([conv.id for conv in conversations])
         
         conversation_list = []
         for conv in conversations:
@@ -1641,19 +1967,25 @@ def list_conversations():
             if len(initial_input) > 100:
                 initial_input = initial_input[:100] + "..."
             
-            conversation_list.append({
+            item = {
                 "id": conv.id,
                 "initial_input": initial_input,
                 "created_at": conv.created_at.isoformat(),
                 "updated_at": conv.updated_at.isoformat(),
                 "is_complete": conv.is_complete,
-                "entry_count": conv.entries.count()
-            })
+                "entry_count": entry_counts[conv.id]
+            }
+            if search_query:
+                item["rank"] = round(ranks[conv.id], 4)
+            conversation_list.append(item)
         
         return jsonify({
             "success": True,
             "conversations": conversation_list,
-            "search_query": search_query
+            "search_query": search_query,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
+            "total": total
         })
         
     except Exception as e:
@@ -2093,6 +2425,22 @@ def operatoros_metrics():
         logging.error(f"Error getting OperatorOS metrics: {str(e)}")
         return jsonify({"error": f"Metrics retrieval failed: {str(e)}"}), 500
 
+# Background Job Status
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@limiter.limit("60 per minute")
+def get_job_status(job_id):
+    """Poll the status of a background job by its id"""
+    try:
+        job = job_queue.get_job(job_id)
+        if not job:
+            return jsonify({"success": False, "error": "Job not found"}), 404
+        
+        return jsonify({"success": True, "job": job.to_dict()})
+        
+    except Exception as e:
+        logging.error(f"Error getting job status: {str(e)}")
+        return jsonify({"success": False, "error": "Job status error"}), 500
+
 # Dynamic Agent Creation API Endpoints
 @app.route('/api/agents/create', methods=['POST'])
 @limiter.limit("10 per minute")
@@ -2179,18 +2527,29 @@ def list_user_agents():
                 ]
             })
         
-        # Get user's dynamic agents
+        # Get user's dynamic agents, newest first, keyset-paginated
         from models import DynamicAgent
-        agents = DynamicAgent.query.filter_by(
+        query = DynamicAgent.query.filter_by(
             user_session=user_session, 
             is_active=True
-        ).order_by(DynamicAgent.created_at.desc()).all()
+        )
+        
+        try:
+            page = paginate(
+                query, DynamicAgent.created_at, DynamicAgent.id,
+                cursor=request.args.get('cursor'),
+                per_page=min(max(request.args.get('per_page', 50, type=int), 1), 100),
+                total=parse_total_mode(request.args.get('total'), default='none')
+            )
+        except InvalidCursorError as e:
+            return jsonify({"error": str(e)}), 400
         
-        agent_list = [agent.to_dict() for agent in agents]
+        agent_list = [agent.to_dict() for agent in page.items]
         
         return jsonify({
             "success": True,
             "agents": agent_list,
+            "pagination": page.pagination_meta(),
             "built_in_agents": [
                 {"code": "CFO", "name": "Chief Financial Officer", "icon": "💰"},
                 {"code": "COO", "name": "Chief Operating Officer", "icon": "⚙️"},
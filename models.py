@@ -1,6 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import event, Index
+from sqlalchemy import event, Index, UniqueConstraint, func
 from datetime import datetime
 import json
 
@@ -33,7 +33,9 @@ class Conversation(db.Model):
     # Database indexes for performance
     __table_args__ = (
         Index('idx_conversation_status_time', 'is_complete', 'created_at'),
+        Index('idx_conversation_status_updated', 'is_complete', 'updated_at'),  # stale and recently-completed checks
         Index('idx_conversation_session', 'session_id', 'created_at'),
+        Index('idx_conversation_created_id', 'created_at', 'id'),  # keyset pagination
     )
     
     def to_dict(self):
@@ -61,14 +63,45 @@ class Conversation(db.Model):
         """Get total number of entries in this conversation"""
         return self.entries.count()
     
-    def get_summary(self):
-        """Get a summary of the conversation for display"""
+    @staticmethod
+    def get_entry_counts(conversation_ids):
+        """Get entry counts for many conversations with a grouped query (one per 500 ids)
+        
+        Returns:
+            Dict[str, int]: conversation_id -> entry count (0 for conversations without entries)
+        """
+        counts = {conversation_id: 0 for conversation_id in conversation_ids}
+        if not counts:
+            return counts
+        
+        ids = list(counts)
+        for start in range(0, len(ids), 500):  # keep IN lists bounded for large result sets
+            rows = db.session.query(
+                ConversationEntry.conversation_id,
+                func.count(ConversationEntry.id)
+            ).filter(
+                ConversationEntry.conversation_id.in_(ids[start:start + 500])
+            ).group_by(ConversationEntry.conversation_id).all()
+            counts.update(dict(rows))
+        return counts
+    
+    @classmethod
+    def get_summaries(cls, conversations):
+        """Summaries for a list of conversations with entry counts fetched in one query"""
+        counts = cls.get_entry_counts([conv.id for conv in conversations])
+        return [conv.get_summary(entry_count=counts[conv.id]) for conv in conversations]
+    
+    def get_summary(self, entry_count=None):
+        """Get a summary of the conversation for display
+        
+        Pass entry_count when it was already fetched (see get_summaries) to avoid a COUNT per row.
+        """
         return {
             'id': self.id,
             'created_at': self.created_at.isoformat(),
             'is_complete': self.is_complete,
             'initial_input': self.initial_input[:100] + '...' if len(self.initial_input) > 100 else self.initial_input,
-            'entry_count': self.get_entry_count(),
+            'entry_count': self.get_entry_count() if entry_count is None else entry_count,
             'duration_seconds': self.get_duration(),
             'current_agent_index': self.current_agent_index,
             'total_tokens_used': self.total_tokens_used,
@@ -122,6 +155,99 @@ class ConversationEntry(db.Model):
             'error_message': self.error_message
         }
 
+class SearchDocument(db.Model):
+    """Searchable text unit (conversation input or agent response) for the full-text index"""
+    __tablename__ = 'search_documents'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.String(36), db.ForeignKey('conversations.id', ondelete='CASCADE'), nullable=False, index=True)
+    entry_id = db.Column(db.Integer, db.ForeignKey('conversation_entries.id', ondelete='CASCADE'), nullable=True)
+    source = db.Column(db.String(20), nullable=False)  # 'input' or 'response'
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    # GIN index over the tsvector on PostgreSQL; SQLite uses an FTS5 table instead (see search_index.py)
+    __table_args__ = (
+        Index('idx_search_document_tsv', func.to_tsvector('english', content),
+              postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+
+class ClarityMetric(db.Model):
+    """Human-clarity scores for one agent response"""
+    __tablename__ = 'clarity_metrics'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entry_id = db.Column(db.Integer, db.ForeignKey('conversation_entries.id', ondelete='CASCADE'), nullable=False, unique=True)
+    conversation_id = db.Column(db.String(36), nullable=False, index=True)
+    agent_name = db.Column(db.String(50), nullable=False)
+    clarity_score = db.Column(db.Float, nullable=False)
+    empathy_detected = db.Column(db.Boolean, default=False, nullable=False)
+    actionability = db.Column(db.Float, default=0.0, nullable=False)
+    understanding_shown = db.Column(db.Boolean, default=False, nullable=False)
+    dignity_preserved = db.Column(db.Boolean, default=True, nullable=False)
+    loop_completion = db.Column(db.Float, default=0.0, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)  # when the response was written
+    analyzed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_clarity_metric_created', 'created_at'),
+        Index('idx_clarity_metric_agent_created', 'agent_name', 'created_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'entry_id': self.entry_id,
+            'conversation_id': self.conversation_id,
+            'agent_name': self.agent_name,
+            'clarity_score': self.clarity_score,
+            'empathy_detected': self.empathy_detected,
+            'actionability': self.actionability,
+            'understanding_shown': self.understanding_shown,
+            'dignity_preserved': self.dignity_preserved,
+            'loop_completion': self.loop_completion,
+            'created_at': self.created_at.isoformat(),
+            'analyzed_at': self.analyzed_at.isoformat()
+        }
+
+class ClarityRollup(db.Model):
+    """Pre-aggregated clarity sums per hour/day bucket and agent, updated as metrics are written"""
+    __tablename__ = 'clarity_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    agent_name = db.Column(db.String(50), nullable=False)
+    response_count = db.Column(db.Integer, default=0, nullable=False)
+    clarity_score_sum = db.Column(db.Float, default=0.0, nullable=False)
+    empathy_count = db.Column(db.Integer, default=0, nullable=False)
+    actionability_sum = db.Column(db.Float, default=0.0, nullable=False)
+    understanding_count = db.Column(db.Integer, default=0, nullable=False)
+    dignity_count = db.Column(db.Integer, default=0, nullable=False)
+    loop_completion_sum = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint('granularity', 'bucket_start', 'agent_name', name='uq_clarity_rollup_bucket'),
+    )
+
+class MetricCounter(db.Model):
+    """Time-bucketed event counters (count and summed value) maintained by metrics_store on write"""
+    __tablename__ = 'metric_counters'
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(64), nullable=False)  # e.g. 'conversations.created'
+    dimension = db.Column(db.String(64), nullable=False, default='')  # e.g. agent name; '' when unused
+    granularity = db.Column(db.String(10), nullable=False)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.BigInteger, default=0, nullable=False)
+    total = db.Column(db.Float, default=0.0, nullable=False)  # summed value (seconds, tokens, amount)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('metric', 'dimension', 'granularity', 'bucket_start', name='uq_metric_counter_bucket'),
+        Index('idx_metric_counter_lookup', 'metric', 'granularity', 'bucket_start'),
+    )
+
 # Flow Platform Models
 class FlowSession(db.Model):
     """Model for storing Flow Platform sessions"""
@@ -313,6 +439,7 @@ class DynamicAgent(db.Model):
     __table_args__ = (
         Index('idx_dynamic_agent_user_code', 'user_session', 'agent_code'),
         Index('idx_dynamic_agent_user_active', 'user_session', 'is_active'),
+        Index('idx_dynamic_agent_user_created', 'user_session', 'created_at', 'id'),  # keyset pagination
     )
     
     def to_dict(self):
@@ -365,6 +492,7 @@ class Payment(db.Model):
         Index('idx_payment_status', 'status'),
         Index('idx_payment_client', 'client_email'),
         Index('idx_payment_created', 'created_at'),
+        Index('idx_payment_created_id', 'created_at', 'id'),  # keyset pagination
     )
     
     def to_dict(self):
@@ -395,4 +523,157 @@ class Payment(db.Model):
             PaymentStatus.FAILED: 'danger',
             PaymentStatus.CANCELLED: 'secondary'
         }
-        return status_classes.get(self.status, 'secondary')
\ No newline at end of file
+        return status_classes.get(self.status, 'secondary')
+
+class FulfillmentToken(db.Model):
+    """Upload token issued after a paid fulfillment order (replaces JSON kept in Payment.description)"""
+    __tablename__ = 'fulfillment_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(36), nullable=False, unique=True)  # UUID string sent to the customer
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id', ondelete='CASCADE'), nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # end of the upload window
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    fulfillment_started_at = db.Column(db.DateTime, nullable=True)
+    fulfillment_completed_at = db.Column(db.DateTime, nullable=True)
+    video_processed = db.Column(db.String(500), nullable=True)  # path of the processed video
+    report_delivered = db.Column(db.Boolean, default=False, nullable=False)
+    
+    payment = db.relationship('Payment', backref=db.backref('fulfillment_tokens', lazy='dynamic', passive_deletes=True))
+    
+    def is_expired(self, now: datetime = None) -> bool:
+        return (now or datetime.utcnow()) > self.expires_at
+    
+    def to_metadata(self):
+        """Same keys the upload pages read from the old description JSON"""
+        return {
+            'upload_token': self.token,
+            'upload_expiry': self.expires_at.isoformat(),
+            'fulfillment_started': self.fulfillment_started_at.isoformat() if self.fulfillment_started_at else None,
+            'fulfillment_completed': self.fulfillment_completed_at.isoformat() if self.fulfillment_completed_at else None,
+            'video_processed': self.video_processed,
+            'report_delivered': self.report_delivered
+        }
+
+
+class UploadSession(db.Model):
+    """Resumable chunked upload of one video against an upload token"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID returned to the client
+    token_id = db.Column(db.Integer, db.ForeignKey('fulfillment_tokens.id', ondelete='CASCADE'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_bytes = db.Column(db.BigInteger, default=0, nullable=False)  # committed offset; next chunk must start here
+    sha256 = db.Column(db.String(64), nullable=True)  # expected checksum of the whole file, if the client sent one
+    status = db.Column(db.String(20), default='uploading', nullable=False)  # uploading, complete, failed
+    part_path = db.Column(db.String(500), nullable=False)
+    final_path = db.Column(db.String(500), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    token = db.relationship('FulfillmentToken', backref=db.backref('upload_sessions', lazy='dynamic', passive_deletes=True))
+    
+    __table_args__ = (
+        Index('idx_upload_session_status_updated', 'status', 'updated_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'offset': self.received_bytes,
+            'received_bytes': self.received_bytes,
+            'total_size': self.total_size,
+            'percent': round(self.received_bytes / self.total_size * 100, 1) if self.total_size else 0,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class BackgroundJob(db.Model):
+    """Persistent job for work that must leave the request path and survive restarts"""
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID returned to pollers
+    job_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=True)  # JSON arguments for the handler
+    idempotency_key = db.Column(db.String(255), nullable=True, unique=True)  # repeated enqueues return the same job
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=5, nullable=False)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # earliest time a worker may claim it
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON returned by the handler
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index('idx_background_job_claim', 'status', 'run_at'),
+        Index('idx_background_job_type_created', 'job_type', 'created_at'),
+    )
+    
+    def to_dict(self):
+        """Status fields safe to show to whoever holds the job id (payload is left out)"""
+        return {
+            'job_id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'last_error': self.last_error,
+            'result': json.loads(self.result) if self.result else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class StripeWebhookEvent(db.Model):
+    """Stripe event received by the webhook; the unique event id makes redeliveries no-ops"""
+    __tablename__ = 'stripe_webhook_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(255), nullable=False, unique=True)  # Stripe evt_... id
+    event_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # verified raw body, processed later by the job queue
+    status = db.Column(db.String(20), default='received', nullable=False)  # received, processed, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text, nullable=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'event_id': self.event_id,
+            'event_type': self.event_type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'received_at': self.received_at.isoformat() if self.received_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+
+# Indexes added to tables that already existed in deployed databases. db.create_all()
+# only creates missing tables, so these are created explicitly (if absent) at startup.
+LATE_INDEXES = (
+    ('conversations', 'idx_conversation_created_id'),  # keyset pagination
+    ('conversations', 'idx_conversation_status_updated'),  # health snapshot stale count
+    ('payments', 'idx_payment_created_id'),  # keyset pagination
+    ('dynamic_agents', 'idx_dynamic_agent_user_created'),  # keyset pagination
+)
+
+def create_late_indexes(bind):
+    """Create any LATE_INDEXES missing on existing tables (no-op once they exist)"""
+    for table_name, index_name in LATE_INDEXES:
+        index = next(index for index in db.metadata.tables[table_name].indexes if index.name == index_name)
+        index.create(bind, checkfirst=True)
@@ -4,18 +4,19 @@ Real-time notification system for admin monitoring
 
 import os
 import logging
-import smtplib
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 from enum import Enum
 import json
+import statistics
+from collections import deque
 
 from flask_socketio import SocketIO, emit
-from sqlalchemy import func, and_
-from main import db, Conversation, ConversationEntry
+from sqlalchemy import func
+from main import db, ConversationEntry
+from config import Config
+from mail_service import mail_service
 
 
 class NotificationLevel(Enum):
@@ -43,23 +44,20 @@ class NotificationManager:
         self.socketio = socketio
         self.notifications: List[Notification] = []
         self.max_notifications = 100
-        self.email_enabled = bool(os.environ.get('SMTP_SERVER'))
         self.setup_email()
     
     def setup_email(self):
-        """Setup email configuration"""
-        if self.email_enabled:
-            self.smtp_server = os.environ.get('SMTP_SERVER')
-            self.smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-            self.smtp_username = os.environ.get('SMTP_USERNAME')
-            self.smtp_password = os.environ.get('SMTP_PASSWORD')
-            self.from_email = os.environ.get('FROM_EMAIL', self.smtp_username)
-            self.admin_emails = os.environ.get('ADMIN_EMAILS', '').split(',')
-            self.admin_emails = [email.strip() for email in self.admin_emails if email.strip()]
+        """Setup email configuration (delivery is handled by the shared mail service)"""
+        self.email_enabled = bool(Config.SMTP_SERVER) or Config.MAIL_BACKEND != 'auto'
+        self.admin_emails = mail_service.admin_emails
     
     def add_notification(self, title: str, message: str, level: NotificationLevel, 
                         data: Optional[Dict] = None, send_email: bool = False):
         """Add a new notification"""
+        # Callers also pass plain strings ("info", "error", "success"); unknown ones log as info
+        if not isinstance(level, NotificationLevel):
+            level = NotificationLevel._value2member_map_.get(level, NotificationLevel.INFO)
+        
         notification = Notification(
             id=f"notif_{datetime.utcnow().timestamp()}",
             title=title,
@@ -103,19 +101,12 @@ class NotificationManager:
         return notification
     
     def send_email_alert(self, notification: Notification):
-        """Send email alert for critical notifications"""
+        """Queue an email alert; alerts are batched into digests by the mail service"""
         if not self.email_enabled or not self.admin_emails:
             return
         
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.from_email
-            msg['To'] = ', '.join(self.admin_emails)
-            msg['Subject'] = f"[{notification.level.value.upper()}] Multi-Agent AI System Alert: {notification.title}"
-            
             body = f"""
-System Alert - Multi-Agent AI Conversation System
-
 Level: {notification.level.value.upper()}
 Time: {notification.timestamp.strftime('%Y-%m-%d %H:%M:%S UTC')}
 Title: {notification.title}
@@ -124,25 +115,13 @@ Message:
 {notification.message}
 
 Additional Data:
-{json.dumps(notification.data, indent=2) if notification.data else 'None'}
-
-Please check the admin dashboard for more details: /admin/dashboard
-
-This is an automated message from the Multi-Agent AI System monitoring.
+{json.dumps(notification.data, indent=2, default=str) if notification.data else 'None'}
             """
             
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.smtp_username, self.smtp_password)
-            server.send_message(msg)
-            server.quit()
-            
-            logging.info(f"Email alert sent for notification: {notification.title}")
+            mail_service.queue_alert(notification.title, notification.level.value.upper(), body)
             
         except Exception as e:
-            logging.error(f"Failed to send email alert: {str(e)}")
+            logging.error(f"Failed to queue email alert: {str(e)}")
     
     def get_notifications(self, limit: int = 50, level: Optional[NotificationLevel] = None) -> List[Dict]:
         """Get recent notifications"""
@@ -181,7 +160,12 @@ This is an automated message from the Multi-Agent AI System monitoring.
 
 
 class SystemMonitor:
-    """Monitors system health and performance"""
+    """Monitors system health and performance
+    
+    Each check cycle takes one health snapshot (metric counters plus one
+    percentile query, see health_snapshot.py), applies the thresholds to it and keeps it in a rolling
+    in-memory history, so trend alerts can compare against recent cycles.
+    """
     
     def __init__(self, notification_manager: NotificationManager):
         self.notification_manager = notification_manager
@@ -191,28 +175,44 @@ class SystemMonitor:
             'max_error_rate': float(os.environ.get('MAX_ERROR_RATE', '0.1')),  # 10%
             'min_completion_rate': float(os.environ.get('MIN_COMPLETION_RATE', '0.8')),  # 80%
             'max_avg_response_time': int(os.environ.get('MAX_AVG_RESPONSE_TIME', '300')),  # 5 minutes
+            'max_p95_response_time': int(os.environ.get('MAX_P95_RESPONSE_TIME', '900')),  # 15 minutes
+            'trend_factor': float(os.environ.get('HEALTH_TREND_FACTOR', '2.0')),  # alert at 2x the recent median
+            'trend_min_samples': int(os.environ.get('HEALTH_TREND_MIN_SAMPLES', '6')),
         }
+        # 288 five-minute checks = 24 hours
+        self.history = deque(maxlen=int(os.environ.get('HEALTH_HISTORY_SIZE', '288')))
+    
+    def take_snapshot(self) -> Dict[str, Any]:
+        from health_snapshot import health_snapshot_engine
+        return health_snapshot_engine.take()
     
     def check_system_health(self):
         """Perform comprehensive system health check"""
         try:
             current_time = datetime.utcnow()
             
-            # Check for stale conversations
-            self.check_stale_conversations()
-            
-            # Check completion rates
-            self.check_completion_rates()
-            
-            # Check response times
-            self.check_response_times()
+            # One round-trip for every threshold; failure means the database is unreachable
+            try:
+                snapshot = self.take_snapshot()
+            except Exception as e:
+                db.session.rollback()
+                self.notification_manager.add_notification(
+                    "Database Health Check Failed",
+                    f"Database connectivity issue: {str(e)}",
+                    NotificationLevel.CRITICAL,
+                    {"error": str(e)},
+                    send_email=True
+                )
+                return
             
-            # Check database connectivity
+            self.check_stale_conversations(snapshot)
+            self.check_completion_rates(snapshot)
+            self.check_response_times(snapshot)
             self.check_database_health()
+            self.check_error_patterns(snapshot)
+            self.check_trends(snapshot)
             
-            # Check recent errors
-            self.check_error_patterns()
-            
+            self.history.append(snapshot)
             self.last_check = current_time
             
         except Exception as e:
@@ -224,16 +224,10 @@ class SystemMonitor:
                 send_email=True
             )
     
-    def check_stale_conversations(self):
+    def check_stale_conversations(self, snapshot: Optional[Dict[str, Any]] = None):
         """Check for conversations that have been stuck"""
-        cutoff_time = datetime.utcnow() - timedelta(hours=2)
-        
-        stale_count = Conversation.query.filter(
-            and_(
-                Conversation.is_complete == False,
-                Conversation.updated_at < cutoff_time
-            )
-        ).count()
+        snapshot = snapshot or self.take_snapshot()
+        stale_count = snapshot['stale_conversations']
         
         if stale_count > self.thresholds['max_stale_conversations']:
             self.notification_manager.add_notification(
@@ -244,23 +238,13 @@ class SystemMonitor:
                 send_email=True
             )
     
-    def check_completion_rates(self):
+    def check_completion_rates(self, snapshot: Optional[Dict[str, Any]] = None):
         """Check conversation completion rates"""
-        recent_cutoff = datetime.utcnow() - timedelta(hours=24)
-        
-        total_recent = Conversation.query.filter(
-            Conversation.created_at >= recent_cutoff
-        ).count()
+        snapshot = snapshot or self.take_snapshot()
+        total_recent = snapshot['created_24h']
         
         if total_recent > 5:  # Only check if we have sufficient data
-            completed_recent = Conversation.query.filter(
-                and_(
-                    Conversation.created_at >= recent_cutoff,
-                    Conversation.is_complete == True
-                )
-            ).count()
-            
-            completion_rate = completed_recent / total_recent if total_recent > 0 else 0
+            completion_rate = snapshot['completion_rate_24h']
             
             if completion_rate < self.thresholds['min_completion_rate']:
                 self.notification_manager.add_notification(
@@ -269,53 +253,46 @@ class SystemMonitor:
                     NotificationLevel.WARNING,
                     {
                         "completion_rate": completion_rate,
-                        "completed": completed_recent,
+                        "completed": snapshot['completed_24h'],
                         "total": total_recent,
                         "threshold": self.thresholds['min_completion_rate']
                     },
                     send_email=True
                 )
     
-    def check_response_times(self):
-        """Check average response times"""
-        recent_cutoff = datetime.utcnow() - timedelta(hours=1)
+    def check_response_times(self, snapshot: Optional[Dict[str, Any]] = None):
+        """Check mean and tail response times of conversations completed in the last hour"""
+        snapshot = snapshot or self.take_snapshot()
         
-        # Get recent completed conversations
-        recent_conversations = Conversation.query.filter(
-            and_(
-                Conversation.updated_at >= recent_cutoff,
-                Conversation.is_complete == True
-            )
-        ).all()
-        
-        if len(recent_conversations) > 3:  # Only check if we have sufficient data
-            total_time = 0
-            for conv in recent_conversations:
-                completion_time = (conv.updated_at - conv.created_at).total_seconds()
-                total_time += completion_time
-            
-            avg_response_time = total_time / len(recent_conversations)
+        if snapshot['response_count'] > 3:  # Only check if we have sufficient data
+            avg_response_time = snapshot['response_avg']
+            p95_response_time = snapshot['response_p95']
+            details = {
+                "avg_response_time": avg_response_time,
+                "p50_response_time": snapshot['response_p50'],
+                "p95_response_time": p95_response_time,
+                "p99_response_time": snapshot['response_p99'],
+                "sample_size": snapshot['response_count']
+            }
             
             if avg_response_time > self.thresholds['max_avg_response_time']:
                 self.notification_manager.add_notification(
                     "High Average Response Time",
                     f"Average completion time in last hour: {avg_response_time:.1f}s (threshold: {self.thresholds['max_avg_response_time']}s)",
                     NotificationLevel.WARNING,
-                    {
-                        "avg_response_time": avg_response_time,
-                        "threshold": self.thresholds['max_avg_response_time'],
-                        "sample_size": len(recent_conversations)
-                    }
+                    {**details, "threshold": self.thresholds['max_avg_response_time']}
+                )
+            elif p95_response_time > self.thresholds['max_p95_response_time']:
+                self.notification_manager.add_notification(
+                    "High Tail Response Time",
+                    f"p95 completion time in last hour: {p95_response_time:.1f}s (threshold: {self.thresholds['max_p95_response_time']}s)",
+                    NotificationLevel.WARNING,
+                    {**details, "threshold": self.thresholds['max_p95_response_time']}
                 )
     
     def check_database_health(self):
-        """Check database connectivity and performance"""
+        """Check database connection pool usage (connectivity is proven by the snapshot query)"""
         try:
-            # Test basic query
-            from sqlalchemy import text
-            db.session.execute(text('SELECT 1'))
-            
-            # Check for connection pool issues
             pool_size = db.engine.pool.size()
             checked_out = db.engine.pool.checkedout()
             
@@ -326,34 +303,17 @@ class SystemMonitor:
                     NotificationLevel.WARNING,
                     {"checked_out": checked_out, "pool_size": pool_size}
                 )
-                
-        except Exception as e:
-            self.notification_manager.add_notification(
-                "Database Health Check Failed",
-                f"Database connectivity issue: {str(e)}",
-                NotificationLevel.CRITICAL,
-                {"error": str(e)},
-                send_email=True
-            )
+        except AttributeError:
+            # Pools without size accounting (e.g. SQLite's StaticPool)
+            pass
     
-    def check_error_patterns(self):
-        """Check for error patterns in recent activity"""
-        # This would typically analyze application logs
-        # For now, we'll check for recent failed conversations
-        recent_cutoff = datetime.utcnow() - timedelta(hours=1)
+    def check_error_patterns(self, snapshot: Optional[Dict[str, Any]] = None):
+        """Check for stuck conversations and agent errors in the last hour"""
+        snapshot = snapshot or self.take_snapshot()
         
-        # Find conversations that started recently but haven't progressed
-        stuck_conversations = Conversation.query.filter(
-            and_(
-                Conversation.created_at >= recent_cutoff,
-                Conversation.current_agent_index == 0,
-                Conversation.is_complete == False
-            )
-        ).count()
-        
-        total_recent = Conversation.query.filter(
-            Conversation.created_at >= recent_cutoff
-        ).count()
+        # Conversations that started recently but haven't progressed
+        stuck_conversations = snapshot['stuck_1h']
+        total_recent = snapshot['created_1h']
         
         if total_recent > 5 and stuck_conversations > total_recent * 0.2:  # 20% stuck
             self.notification_manager.add_notification(
@@ -362,6 +322,41 @@ class SystemMonitor:
                 NotificationLevel.WARNING,
                 {"stuck_count": stuck_conversations, "total_recent": total_recent}
             )
+        
+        error_rate = snapshot['entry_error_rate_1h']
+        if snapshot['entries_1h'] > 5 and error_rate > self.thresholds['max_error_rate']:
+            self.notification_manager.add_notification(
+                "High Agent Error Rate",
+                f"{snapshot['entry_errors_1h']} of {snapshot['entries_1h']} agent responses in the last hour failed ({error_rate:.1%})",
+                NotificationLevel.WARNING,
+                {"error_rate": error_rate, "threshold": self.thresholds['max_error_rate']}
+            )
+    
+    def check_trends(self, snapshot: Dict[str, Any]):
+        """Alert when a latency or error metric jumps well above its recent median"""
+        factor = self.thresholds['trend_factor']
+        for key, label in (('response_p95', 'p95 response time'),
+                           ('processing_p95', 'p95 agent processing time'),
+                           ('entry_error_rate_1h', 'agent error rate'),
+                           ('stuck_ratio_1h', 'stuck conversation ratio')):
+            current = snapshot.get(key)
+            previous = [entry[key] for entry in self.history if entry.get(key) is not None]
+            if current is None or len(previous) < self.thresholds['trend_min_samples']:
+                continue
+            
+            baseline = statistics.median(previous)
+            if baseline > 0 and current > baseline * factor:
+                self.notification_manager.add_notification(
+                    f"Rising {label.capitalize()}",
+                    f"{label.capitalize()} is {current:g}, {current / baseline:.1f}x the median of the last {len(previous)} checks ({baseline:g})",
+                    NotificationLevel.WARNING,
+                    {"metric": key, "current": current, "baseline": baseline, "samples": len(previous)}
+                )
+    
+    def get_history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Recent snapshots, oldest first"""
+        history = list(self.history)
+        return history[-limit:] if limit else history
 
 
 # Global notification manager instance
@@ -2,12 +2,11 @@
 OperatorOS Master Agent - Personal Life Operating System
 Coordinates C-Suite of AI agents for complete autonomy and financial independence
 """
-import os
 import logging
 from typing import Dict, Any, Optional, List
 from datetime import datetime
-from openai import OpenAI
 from config import Config
+from llm_providers import llm_gateway
 from models import db, Conversation, ConversationEntry, DynamicAgent
 from dynamic_agent_creator import DynamicAgentCreator
 
@@ -18,8 +17,6 @@ class OperatorOSMaster:
     """
     
     def __init__(self):
-        self.client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-        
         # Initialize dynamic agent creator
         self.dynamic_creator = DynamicAgentCreator()
         
@@ -161,24 +158,23 @@ Your path to complete autonomy starts now. What's your first move?"""
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = llm_gateway.generate(
+                'openai',
+                [{"role": "user", "content": briefing_prompt}],
+                system_prompt=self._get_briefing_system_prompt(),
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": self._get_briefing_system_prompt()},
-                    {"role": "user", "content": briefing_prompt}
-                ],
                 max_tokens=1000,
                 temperature=0.7
             )
             
-            briefing_content = response.choices[0].message.content
+            briefing_content = response.text
             
             # Format the response with our standard briefing format
             formatted_briefing = self._format_daily_briefing(briefing_content)
             
             return {
                 'response': formatted_briefing,
-                'tokens_used': response.usage.total_tokens if response.usage else 0,
+                'tokens_used': response.tokens_used,
                 'success': True,
                 'type': 'daily_briefing'
             }
@@ -253,19 +249,18 @@ Your path to complete autonomy starts now. What's your first move?"""
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = llm_gateway.generate(
+                'openai',
+                [{"role": "user", "content": analysis_prompt}],
+                system_prompt=self._get_multi_agent_system_prompt(),
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": self._get_multi_agent_system_prompt()},
-                    {"role": "user", "content": analysis_prompt}
-                ],
                 max_tokens=1200,
                 temperature=0.7
             )
             
             return {
-                'response': self._format_multi_agent_response(response.choices[0].message.content),
-                'tokens_used': response.usage.total_tokens if response.usage else 0,
+                'response': self._format_multi_agent_response(response.text),
+                'tokens_used': response.tokens_used,
                 'success': True,
                 'type': 'multi_agent_analysis'
             }
@@ -319,19 +314,18 @@ NRT Response Format:
 Focus on actions that replace salary income fastest while enabling location independence."""
         
         try:
-            response = self.client.chat.completions.create(
+            response = llm_gateway.generate(
+                'openai',
+                [{"role": "user", "content": agent_prompt}],
+                system_prompt=system_prompt,
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": agent_prompt}
-                ],
                 max_tokens=800,
                 temperature=0.7
             )
             
             formatted_response = f"""{agent['icon']} **{agent['name']} Response**
 
-{response.choices[0].message.content}
+{response.text}
 
 ---
 *Domain: {agent['domain']}*
@@ -339,7 +333,7 @@ Focus on actions that replace salary income fastest while enabling location inde
             
             return {
                 'response': formatted_response,
-                'tokens_used': response.usage.total_tokens if response.usage else 0,
+                'tokens_used': response.tokens_used,
                 'success': True,
                 'agent': agent_code,
                 'type': 'agent_response'
@@ -0,0 +1,233 @@
+"""
+LLM Provider Router
+Rolling latency/error tracking and circuit breakers per provider and model
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Dict, List, Optional, Any
+
+from config import Config
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"        # Healthy, traffic flows normally
+    OPEN = "open"            # Failing, traffic diverted until cooldown ends
+    HALF_OPEN = "half_open"  # Cooldown over, a single probe request is allowed
+
+
+class ProviderHealth:
+    """Rolling window of call outcomes and circuit state for one provider/model"""
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.samples = deque()  # (timestamp, latency_seconds, success)
+        self.state = CircuitState.CLOSED
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self.probe_started_at = None  # half-open probe reservation
+        self.last_error = None
+
+    def prune(self, now: float):
+        cutoff = now - Config.ROUTER_WINDOW_SECONDS
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        failures = sum(1 for _, _, success in self.samples if not success)
+        return failures / len(self.samples)
+
+    def latency_p50(self) -> Optional[float]:
+        latencies = sorted(latency for _, latency, success in self.samples if success)
+        if not latencies:
+            return None
+        return latencies[len(latencies) // 2]
+
+    def to_dict(self) -> Dict[str, Any]:
+        p50 = self.latency_p50()
+        return {
+            'provider': self.provider,
+            'model': self.model,
+            'state': self.state.value,
+            'requests': len(self.samples),
+            'error_rate': round(self.error_rate() * 100, 1),
+            'latency_p50_seconds': round(p50, 3) if p50 is not None else None,
+            'consecutive_failures': self.consecutive_failures,
+            'opened_at': self.opened_at,
+            'last_error': self.last_error
+        }
+
+
+class ProviderRouter:
+    """Orders providers by health and latency and trips breakers on failing ones"""
+
+    def __init__(self):
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def _get(self, provider: str, model: str) -> ProviderHealth:
+        key = (provider, model or 'default')
+        health = self._health.get(key)
+        if health is None:
+            health = self._health[key] = ProviderHealth(provider, model or 'default')
+        return health
+
+    def record_success(self, provider: str, model: str, latency: float):
+        now = time.time()
+        with self._lock:
+            health = self._get(provider, model)
+            health.samples.append((now, latency, True))
+            health.prune(now)
+            health.consecutive_failures = 0
+            health.probe_started_at = None
+            if health.state != CircuitState.CLOSED:
+                logging.info(f"🟢 CIRCUIT CLOSED: {provider}/{health.model} recovered")
+                health.state = CircuitState.CLOSED
+                health.opened_at = None
+
+    def record_failure(self, provider: str, model: str, latency: float, error: str = None):
+        now = time.time()
+        with self._lock:
+            health = self._get(provider, model)
+            health.samples.append((now, latency, False))
+            health.prune(now)
+            health.consecutive_failures += 1
+            health.probe_started_at = None
+            health.last_error = (error or '')[:200]
+
+            tripped = (
+                health.state == CircuitState.HALF_OPEN
+                or health.consecutive_failures >= Config.ROUTER_CONSECUTIVE_FAILURES
+                or (len(health.samples) >= Config.ROUTER_MIN_REQUESTS
+                    and health.error_rate() >= Config.ROUTER_ERROR_RATE_THRESHOLD)
+            )
+            if tripped and health.state != CircuitState.OPEN:
+                logging.warning(f"🔴 CIRCUIT OPEN: {provider}/{health.model} "
+                                f"(error rate {health.error_rate():.0%}, {health.consecutive_failures} consecutive failures)")
+                health.state = CircuitState.OPEN
+                health.opened_at = now
+
+    def _provider_entries(self, provider: str, model: Optional[str]) -> List[ProviderHealth]:
+        if model:
+            return [self._get(provider, model)]
+        return [health for (name, _), health in self._health.items() if name == provider]
+
+    def _is_allowed(self, provider: str, model: Optional[str], now: float) -> bool:
+        """Whether a request may go to this provider (read-only; the probe is reserved on dispatch)"""
+        for health in self._provider_entries(provider, model):
+            if health.state == CircuitState.OPEN and now - health.opened_at < Config.ROUTER_OPEN_SECONDS:
+                return False
+            if health.state != CircuitState.CLOSED:
+                # One probe at a time; an unanswered reservation expires after a cooldown
+                if health.probe_started_at and now - health.probe_started_at < Config.ROUTER_OPEN_SECONDS:
+                    return False
+        return True
+
+    def _awaiting_probe(self, provider: str, model: Optional[str]) -> bool:
+        return any(health.state != CircuitState.CLOSED for health in self._provider_entries(provider, model))
+
+    def reserve_probe(self, provider: str, model: str):
+        """Called as a request is actually sent; claims the half-open probe if the breaker is due one"""
+        now = time.time()
+        with self._lock:
+            health = self._health.get((provider, model or 'default'))
+            if health is None or health.state == CircuitState.CLOSED:
+                return
+            if health.state == CircuitState.OPEN and now - health.opened_at >= Config.ROUTER_OPEN_SECONDS:
+                health.state = CircuitState.HALF_OPEN
+            if health.state == CircuitState.HALF_OPEN:
+                logging.info(f"🟡 CIRCUIT HALF-OPEN: probing {provider}/{health.model}")
+                health.probe_started_at = now
+
+    def _latency(self, provider: str, model: Optional[str], now: float) -> Optional[float]:
+        latencies = []
+        for health in self._provider_entries(provider, model):
+            health.prune(now)
+            p50 = health.latency_p50()
+            if p50 is not None:
+                latencies.append(p50)
+        return min(latencies) if latencies else None
+
+    def rank(self, providers: List[str], preferred: Optional[str] = None, pinned: bool = False,
+             models: Optional[Dict[str, str]] = None) -> List[str]:
+        """Order providers for a request
+
+        Healthy providers come first, fastest first. The preferred provider keeps
+        the lead while its latency stays within ROUTER_LATENCY_TOLERANCE of the
+        fastest; ``pinned`` keeps it first whenever its circuit allows traffic.
+        A provider whose breaker is due a probe goes ahead of the rest (after a
+        pinned preference) so it actually gets one. Providers with open circuits
+        are still returned last as a last resort.
+        """
+        models = models or {}
+        now = time.time()
+        with self._lock:
+            healthy, blocked, probes = [], [], []
+            for provider in providers:
+                if self._is_allowed(provider, models.get(provider), now):
+                    healthy.append(provider)
+                    if self._awaiting_probe(provider, models.get(provider)):
+                        probes.append(provider)
+                else:
+                    blocked.append(provider)
+
+            latency = {provider: self._latency(provider, models.get(provider), now) for provider in healthy}
+
+        # Providers without samples sort after measured ones but keep their given order
+        ordered = sorted(healthy, key=lambda p: (latency[p] is None, latency[p] or 0.0))
+
+        if preferred in healthy:
+            known = [latency[p] for p in healthy if latency[p] is not None]
+            fastest = min(known) if known else None
+            preferred_latency = latency[preferred]
+            within_tolerance = (
+                preferred_latency is None or fastest is None
+                or preferred_latency <= fastest * Config.ROUTER_LATENCY_TOLERANCE
+            )
+            if pinned or within_tolerance:
+                ordered.remove(preferred)
+                ordered.insert(0, preferred)
+
+        if probes:
+            # Past-failure latency says nothing about recovery; without the lead a probe would rarely be sent
+            lead = ordered[:1] if pinned and preferred in healthy else []
+            ordered = lead + [p for p in probes if p not in lead] + [p for p in ordered if p not in lead and p not in probes]
+
+        if blocked:
+            logging.info(f"⚡ ROUTER: skipping open circuits {blocked}")
+        return ordered + blocked
+
+    def get_status(self) -> Dict[str, Any]:
+        """Snapshot of every tracked provider/model for the admin dashboard"""
+        now = time.time()
+        with self._lock:
+            entries = []
+            for health in self._health.values():
+                health.prune(now)
+                entries.append(health.to_dict())
+
+        return {
+            'providers': sorted(entries, key=lambda e: (e['provider'], e['model'])),
+            'window_seconds': Config.ROUTER_WINDOW_SECONDS,
+            'open_seconds': Config.ROUTER_OPEN_SECONDS,
+            'error_rate_threshold': Config.ROUTER_ERROR_RATE_THRESHOLD,
+            'generated_at': now
+        }
+
+    def reset(self, provider: str = None):
+        """Forget health data (all providers, or just one) and close its breakers"""
+        with self._lock:
+            if provider is None:
+                self._health = {}
+            else:
+                self._health = {key: h for key, h in self._health.items() if key[0] != provider}
+
+
+# Global instance
+provider_router = ProviderRouter()
@@ -0,0 +1,325 @@
+"""
+Outbound LLM Rate Limiter
+Client-side request/token buckets per provider and model with FIFO queueing and backpressure
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+
+# Rough prompt size when only characters are known (~4 chars per token for English text)
+CHARS_PER_TOKEN = 4
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot get a slot: the queue is full or the wait would exceed the budget"""
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], system_prompt: Optional[str] = None,
+                    max_tokens: Optional[int] = None) -> int:
+    """Prompt characters / 4 plus the completion budget"""
+    chars = len(system_prompt or '')
+    for message in messages or []:
+        content = message.get('content', '')
+        chars += len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+    return chars // CHARS_PER_TOKEN + (max_tokens or 0)
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Retry-After from an SDK rate-limit error, when the response carries one"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    return getattr(error, 'status_code', None) == 429 or type(error).__name__ in ('RateLimitError', 'ResourceExhausted')
+
+
+class Slot:
+    """Capacity held by one call; set ``tokens_used`` so the token bucket is corrected"""
+
+    def __init__(self, bucket: 'RateBucket', tokens: int, waited: float):
+        self.bucket = bucket
+        self.tokens = tokens
+        self.waited = waited
+        self.tokens_used: Optional[int] = None
+        self.retry_after: Optional[float] = None
+        self.rate_limited = False
+
+    def mark_rate_limited(self, retry_after: Optional[float] = None):
+        self.rate_limited = True
+        self.retry_after = retry_after
+
+
+class RateBucket:
+    """Request and token buckets plus an in-flight cap for one provider/model
+
+    Callers take a ticket and are served strictly in arrival order; only the
+    head of the line may draw from the buckets, so a large request is not
+    starved by a stream of small ones.
+    """
+
+    def __init__(self, key: str, rpm: int, tpm: int, max_concurrency: int):
+        self.key = key
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.request_tokens = float(rpm)
+        self.token_tokens = float(tpm)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.queue: deque = deque()
+        self.next_ticket = 0
+        self.stats = {
+            'acquired': 0,
+            'rejected': 0,
+            'rate_limited': 0,
+            'tokens_reserved': 0,
+            'tokens_used': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0
+        }
+        self.recent_waits: deque = deque(maxlen=500)
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        self.updated = now
+        self.request_tokens = min(self.rpm, self.request_tokens + elapsed * self.rpm / 60.0)
+        self.token_tokens = min(self.tpm, self.token_tokens + elapsed * self.tpm / 60.0)
+
+    def try_acquire(self, ticket: int, tokens: int, now: float) -> float:
+        """0 when the slot was taken, otherwise seconds worth waiting before trying again"""
+        if not self.queue or self.queue[0] != ticket:
+            return 0.02
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= self.max_concurrency:
+            return 0.05
+
+        self._refill(now)
+        waits = []
+        if self.request_tokens < 1:
+            waits.append((1 - self.request_tokens) * 60.0 / self.rpm)
+        if self.token_tokens < tokens:
+            waits.append((tokens - self.token_tokens) * 60.0 / self.tpm)
+        if waits:
+            return max(waits)
+
+        self.request_tokens -= 1
+        self.token_tokens -= tokens
+        self.in_flight += 1
+        self.queue.popleft()
+        return 0.0
+
+
+class ProviderRateLimiter:
+    """Per provider/model limits shared by every LLM call in the process
+
+    Limits come from LLM_RATE_DEFAULT_* and the LLM_RATE_LIMITS JSON
+    overrides (keys ``provider`` or ``provider:model``). A call reserves one
+    request and its estimated tokens; the token bucket is corrected with the
+    real usage afterwards. A 429 pauses the bucket for Retry-After (or
+    LLM_RATE_PENALTY_SECONDS) so retries queue here instead of hammering the
+    provider. Queues are bounded by LLM_RATE_MAX_QUEUE and waits by
+    LLM_RATE_MAX_WAIT; beyond either, RateLimitExceeded is raised.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, RateBucket] = {}
+        try:
+            self.overrides = json.loads(Config.LLM_RATE_LIMITS or '{}')
+        except ValueError:
+            logging.error("LLM_RATE_LIMITS is not valid JSON; using defaults")
+            self.overrides = {}
+
+    @property
+    def enabled(self) -> bool:
+        return Config.LLM_RATE_LIMIT_ENABLED
+
+    def _limits_for(self, provider: str, model: Optional[str]) -> Dict[str, int]:
+        limits = {
+            'rpm': Config.LLM_RATE_DEFAULT_RPM,
+            'tpm': Config.LLM_RATE_DEFAULT_TPM,
+            'max_concurrency': Config.LLM_RATE_MAX_CONCURRENCY
+        }
+        limits.update(self.overrides.get(provider, {}))
+        if model:
+            limits.update(self.overrides.get(f"{provider}:{model}", {}))
+        return limits
+
+    def bucket(self, provider: str, model: Optional[str] = None) -> RateBucket:
+        key = f"{provider}:{model}" if model else provider
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    limits = self._limits_for(provider, model)
+                    bucket = RateBucket(key, max(int(limits['rpm']), 1), max(int(limits['tpm']), 1),
+                                        max(int(limits['max_concurrency']), 1))
+                    self._buckets[key] = bucket
+        return bucket
+
+    def _enqueue(self, bucket: RateBucket) -> int:
+        with self._lock:
+            if len(bucket.queue) >= Config.LLM_RATE_MAX_QUEUE:
+                bucket.stats['rejected'] += 1
+                raise RateLimitExceeded(f"{bucket.key}: {len(bucket.queue)} calls already waiting")
+            ticket = bucket.next_ticket
+            bucket.next_ticket += 1
+            bucket.queue.append(ticket)
+            return ticket
+
+    def _poll(self, bucket: RateBucket, ticket: int, tokens: int, started: float,
+              max_wait: float) -> Tuple[Optional[Slot], float]:
+        """One attempt at the head of the line; (slot, 0) on success or (None, sleep seconds)"""
+        now = time.monotonic()
+        with self._lock:
+            wait = bucket.try_acquire(ticket, tokens, now)
+            if wait <= 0:
+                waited = now - started
+                bucket.stats['acquired'] += 1
+                bucket.stats['tokens_reserved'] += tokens
+                bucket.stats['wait_seconds_total'] += waited
+                bucket.stats['wait_seconds_max'] = max(bucket.stats['wait_seconds_max'], waited)
+                bucket.recent_waits.append(waited)
+                return Slot(bucket, tokens, waited), 0.0
+
+            remaining = max_wait - (now - started)
+            if remaining <= 0:
+                bucket.queue.remove(ticket)
+                bucket.stats['rejected'] += 1
+                raise RateLimitExceeded(f"{bucket.key}: no capacity within {max_wait:.0f}s")
+            return None, min(wait, remaining, 1.0)
+
+    def _release(self, slot: Slot):
+        with self._lock:
+            bucket = slot.bucket
+            bucket.in_flight -= 1
+            if slot.tokens_used is not None:
+                # Return the over-estimate (or charge the shortfall)
+                bucket.token_tokens = min(bucket.tpm, bucket.token_tokens + slot.tokens - slot.tokens_used)
+                bucket.stats['tokens_used'] += slot.tokens_used
+            if slot.rate_limited:
+                bucket.stats['rate_limited'] += 1
+                pause = slot.retry_after or Config.LLM_RATE_PENALTY_SECONDS
+                bucket.paused_until = max(bucket.paused_until, time.monotonic() + pause)
+                bucket.request_tokens = 0
+                logging.warning(f"🚦 RATE LIMITED: {bucket.key} paused for {pause:.1f}s")
+
+        if slot.waited >= 1.0:
+            logging.info(f"🚦 RATE LIMIT WAIT: {bucket.key} queued {slot.waited:.2f}s")
+
+    def _clamp(self, bucket: RateBucket, tokens: int) -> int:
+        # A single request larger than the whole bucket would never fit
+        return max(0, min(int(tokens or 0), bucket.tpm))
+
+    async def acquire(self, provider: str, model: Optional[str] = None, tokens: int = 0,
+                      max_wait: Optional[float] = None) -> Slot:
+        """Wait (asynchronously, in FIFO order) for a slot"""
+        bucket = self.bucket(provider, model)
+        tokens = self._clamp(bucket, tokens)
+        max_wait = Config.LLM_RATE_MAX_WAIT if max_wait is None else min(max_wait, Config.LLM_RATE_MAX_WAIT)
+        ticket = self._enqueue(bucket)
+        started = time.monotonic()
+        try:
+            while True:
+                slot, wait = self._poll(bucket, ticket, tokens, started, max_wait)
+                if slot:
+                    return slot
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            with self._lock:
+                if ticket in bucket.queue:
+                    bucket.queue.remove(ticket)
+            raise
+
+    def acquire_sync(self, provider: str, model: Optional[str] = None, tokens: int = 0,
+                     max_wait: Optional[float] = None) -> Slot:
+        """Blocking variant for synchronous SDK clients"""
+        bucket = self.bucket(provider, model)
+        tokens = self._clamp(bucket, tokens)
+        max_wait = Config.LLM_RATE_MAX_WAIT if max_wait is None else min(max_wait, Config.LLM_RATE_MAX_WAIT)
+        ticket = self._enqueue(bucket)
+        started = time.monotonic()
+        while True:
+            slot, wait = self._poll(bucket, ticket, tokens, started, max_wait)
+            if slot:
+                return slot
+            time.sleep(wait)
+
+    @asynccontextmanager
+    async def limit(self, provider: str, model: Optional[str] = None, tokens: int = 0,
+                    max_wait: Optional[float] = None):
+        """``async with`` a slot; 429 errors raised inside pause the bucket
+
+        ``max_wait`` (the caller's remaining deadline) can only shorten LLM_RATE_MAX_WAIT.
+        """
+        if not self.enabled:
+            yield None
+            return
+        slot = await self.acquire(provider, model, tokens, max_wait)
+        try:
+            yield slot
+        except Exception as e:
+            if is_rate_limit_error(e):
+                slot.mark_rate_limited(retry_after_seconds(e))
+            raise
+        finally:
+            self._release(slot)
+
+    @contextmanager
+    def limit_sync(self, provider: str, model: Optional[str] = None, tokens: int = 0,
+                   max_wait: Optional[float] = None):
+        """``with`` a slot from synchronous code"""
+        if not self.enabled:
+            yield None
+            return
+        slot = self.acquire_sync(provider, model, tokens, max_wait)
+        try:
+            yield slot
+        except Exception as e:
+            if is_rate_limit_error(e):
+                slot.mark_rate_limited(retry_after_seconds(e))
+            raise
+        finally:
+            self._release(slot)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buckets = {}
+            now = time.monotonic()
+            for key, bucket in self._buckets.items():
+                waits = sorted(bucket.recent_waits)
+                acquired = bucket.stats['acquired']
+                buckets[key] = {
+                    'rpm': bucket.rpm,
+                    'tpm': bucket.tpm,
+                    'max_concurrency': bucket.max_concurrency,
+                    'in_flight': bucket.in_flight,
+                    'queued': len(bucket.queue),
+                    'paused_seconds': round(max(bucket.paused_until - now, 0), 2),
+                    'avg_wait_seconds': round(bucket.stats['wait_seconds_total'] / acquired, 4) if acquired else 0.0,
+                    'p95_wait_seconds': round(waits[min(int(len(waits) * 0.95), len(waits) - 1)], 4) if waits else 0.0,
+                    **{name: round(value, 4) if isinstance(value, float) else value for name, value in bucket.stats.items()}
+                }
+        return {'enabled': self.enabled, 'buckets': buckets}
+
+
+# Global instance
+rate_limiter = ProviderRateLimiter()
@@ -12,6 +12,7 @@ from dataclasses import dataclass
 
 from models import Conversation, ConversationEntry, db
 from notifications import NotificationManager
+from llm_clients import llm_clients
 
 
 @dataclass
@@ -105,11 +106,10 @@ class RealEstateEngine:
     def _execute_real_estate_loop(self, prompt: str, conversation_id: str) -> Dict[str, Any]:
         """Execute OperatorOS loop for real estate analysis"""
         try:
-            # Import OpenAI directly for simplified processing
-            from openai import OpenAI
-            import os
-            
-            client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+            # Shared pooled client (keeps TLS connections warm across requests)
+            client = llm_clients.openai()
+            if client is None:
+                return {"success": False, "error": "OpenAI API not available"}
             results = {}
             total_tokens = 0
             
@@ -0,0 +1,156 @@
+"""
+LLM Request Coalescer
+Single-flight sharing of identical in-flight completions and streams on the gateway loop
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+
+
+class _Flight:
+    """One upstream completion and the number of callers awaiting it"""
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamFlight:
+    """One upstream stream; chunks are kept so late subscribers replay from the start"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Future] = None
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class RequestCoalescer:
+    """Shares one upstream call between concurrent identical requests
+
+    Keys come from ``llm_cache.make_key`` (provider, model, messages and
+    sampling parameters). The first caller starts the upstream call as a
+    separate task; callers arriving while it runs await the same task and get
+    the same result or exception. A caller giving up does not cancel the call
+    for the others; it is cancelled only when its last waiter leaves. Streams
+    fan every chunk out to each subscriber. All state lives on the gateway
+    event loop, so no locking is needed.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self._stats = {
+            'upstream_calls': 0,
+            'coalesced_calls': 0,
+            'upstream_streams': 0,
+            'coalesced_streams': 0,
+            'abandoned': 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return Config.LLM_COALESCE_ENABLED
+
+    def _discard(self, registry: Dict[str, Any], key: str, flight: Any):
+        if registry.get(key) is flight:
+            del registry[key]
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Await ``factory()`` or the identical call already in flight; returns (result, shared)"""
+        if not self.enabled:
+            return await factory(), False
+
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _task: self._discard(self._flights, key, flight))
+            self._stats['upstream_calls'] += 1
+        else:
+            self._stats['coalesced_calls'] += 1
+            logging.debug(f"🔗 COALESCED: joined in-flight call ({flight.waiters} waiting)")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Everyone gave up; stop the upstream call and let the next caller start fresh
+                self._discard(self._flights, key, flight)
+                flight.task.cancel()
+                self._stats['abandoned'] += 1
+
+    async def _pump(self, key: str, flight: _StreamFlight, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                flight.chunks.append(chunk)
+                flight.notify()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._discard(self._streams, key, flight)
+            flight.notify()
+            await source.aclose()
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Iterate ``factory()`` or subscribe to the identical stream already in flight"""
+        if not self.enabled:
+            async for chunk in factory():
+                yield chunk
+            return
+
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            flight.task = asyncio.ensure_future(self._pump(key, flight, factory()))
+            self._stats['upstream_streams'] += 1
+        else:
+            self._stats['coalesced_streams'] += 1
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                changed = flight.changed
+                while index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                self._discard(self._streams, key, flight)
+                flight.task.cancel()
+                self._stats['abandoned'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'in_flight_calls': len(self._flights),
+            'in_flight_streams': len(self._streams),
+            **self._stats
+        }
+
+
+# Global instance
+request_coalescer = RequestCoalescer()
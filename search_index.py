@@ -0,0 +1,383 @@
+"""
+Conversation Search Index
+Ranked full-text search over conversation inputs and agent responses
+"""
+
+import logging
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Any, Tuple
+
+from sqlalchemy import Float, Integer, column, event, func, select, table, text
+
+from config import Config
+from models import db, Conversation, ConversationEntry, SearchDocument
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(value: str) -> List[str]:
+    """Lowercased word tokens, shared by the FTS5 query builder and the in-memory index"""
+    return TOKEN_PATTERN.findall((value or '').lower())
+
+
+class PostgresSearchBackend:
+    """tsvector match ranked by ts_rank_cd, served by the GIN index on search_documents"""
+
+    name = 'postgresql'
+
+    def ensure_schema(self):
+        # idx_search_document_tsv is created by db.create_all()
+        pass
+
+    def search(self, query_text: str, limit: int, where=None) -> List[Tuple[str, float]]:
+        tsquery = func.websearch_to_tsquery('english', query_text)
+        vector = func.to_tsvector('english', SearchDocument.content)  # must match the index expression
+        rank = func.max(func.ts_rank_cd(vector, tsquery)).label('rank')
+
+        query = db.session.query(SearchDocument.conversation_id, rank).filter(vector.op('@@')(tsquery))
+        if where is not None:
+            query = query.join(Conversation, Conversation.id == SearchDocument.conversation_id).filter(where)
+        rows = query.group_by(SearchDocument.conversation_id).order_by(rank.desc()).limit(limit).all()
+
+        return [(conversation_id, float(score)) for conversation_id, score in rows]
+
+    def rebuild(self):
+        pass
+
+
+class SQLiteFTSSearchBackend:
+    """External-content FTS5 table kept in sync with search_documents by triggers"""
+
+    name = 'sqlite_fts5'
+
+    def ensure_schema(self):
+        statements = [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5("
+            "content, content='search_documents', content_rowid='id', tokenize='porter unicode61')",
+            "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+            "INSERT INTO search_documents_fts(rowid, content) VALUES (new.id, new.content); END",
+            "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+            "INSERT INTO search_documents_fts(search_documents_fts, rowid, content) "
+            "VALUES ('delete', old.id, old.content); END",
+        ]
+        for statement in statements:
+            db.session.execute(text(statement))
+        db.session.commit()
+
+    def search(self, query_text: str, limit: int, where=None) -> List[Tuple[str, float]]:
+        tokens = tokenize(query_text)
+        if not tokens:
+            return []
+
+        # Quoted tokens are implicitly ANDed and cannot inject FTS5 operators
+        match = ' '.join(f'"{token}"' for token in tokens)
+        # bm25 ranking only works directly on the FTS cursor, so rank documents in a
+        # subquery (best 10 per requested conversation) and group by conversation outside it
+        fts = table('search_documents_fts', column('rowid', Integer), column('rank', Float))
+        scored = select(fts.c.rowid, fts.c.rank.label('score')).where(
+            text('search_documents_fts MATCH :match').bindparams(match=match)
+        )
+        if where is not None:
+            # Filter before the scan limit so the page is not cut short by excluded conversations
+            scored = scored.where(fts.c.rowid.in_(
+                select(SearchDocument.id).join(Conversation, Conversation.id == SearchDocument.conversation_id).where(where)
+            ))
+        scored = scored.order_by(fts.c.rank).limit(limit * 10).subquery('m')
+        score = func.min(scored.c.score).label('score')
+
+        rows = db.session.query(SearchDocument.conversation_id, score).join(
+            scored, SearchDocument.id == scored.c.rowid
+        ).group_by(SearchDocument.conversation_id).order_by(score).limit(limit).all()
+
+        # bm25() is lower-is-better; negate so higher rank means more relevant everywhere
+        return [(conversation_id, -float(score)) for conversation_id, score in rows]
+
+    def rebuild(self):
+        db.session.execute(text("INSERT INTO search_documents_fts(search_documents_fts) VALUES ('rebuild')"))
+        db.session.commit()
+
+
+class MemorySearchBackend:
+    """Pure-Python inverted index with BM25 ranking
+
+    Fallback for databases without a native full-text index. Postings are
+    loaded incrementally from search_documents (rows above the last indexed
+    id, plus any unseen ids within SEARCH_SYNC_WINDOW below it, which
+    concurrent writers can commit out of order) before each search, so only
+    committed documents are visible.
+    """
+
+    name = 'memory'
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._postings = defaultdict(dict)  # term -> {document_id: term frequency}
+        self._documents = {}  # document_id -> (conversation_id, length)
+        self._total_length = 0
+        self._last_id = 0
+
+    def ensure_schema(self):
+        pass
+
+    def _add(self, document_id: int, conversation_id: str, content: str):
+        tokens = tokenize(content)
+        frequencies = defaultdict(int)
+        for token in tokens:
+            frequencies[token] += 1
+        for token, count in frequencies.items():
+            self._postings[token][document_id] = count
+        self._documents[document_id] = (conversation_id, len(tokens))
+        self._total_length += len(tokens)
+
+    def _sync(self, batch_size: int = 1000):
+        columns = (SearchDocument.id, SearchDocument.conversation_id, SearchDocument.content)
+
+        # Rows that committed after a higher id was already indexed
+        recent_ids = db.session.query(SearchDocument.id).filter(
+            SearchDocument.id > self._last_id - Config.SEARCH_SYNC_WINDOW,
+            SearchDocument.id <= self._last_id
+        ).all()
+        late_ids = [document_id for (document_id,) in recent_ids if document_id not in self._documents]
+        if late_ids:
+            for row in db.session.query(*columns).filter(SearchDocument.id.in_(late_ids)).all():
+                self._add(*row)
+
+        while True:
+            rows = db.session.query(*columns).filter(
+                SearchDocument.id > self._last_id
+            ).order_by(SearchDocument.id).limit(batch_size).all()
+
+            for row in rows:
+                self._add(*row)
+                self._last_id = row.id
+
+            if len(rows) < batch_size:
+                return
+
+    def search(self, query_text: str, limit: int, where=None) -> List[Tuple[str, float]]:
+        terms = list(dict.fromkeys(tokenize(query_text)))
+        if not terms:
+            return []
+
+        with self._lock:
+            self._sync()
+            if not self._documents:
+                return []
+
+            postings = [self._postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+
+            # Every term must appear in the document; intersect from the rarest term
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+
+            document_count = len(self._documents)
+            average_length = self._total_length / document_count or 1
+            best = {}
+            for document_id in candidates:
+                conversation_id, length = self._documents[document_id]
+                score = 0.0
+                for term_postings in postings:
+                    frequency = term_postings[document_id]
+                    idf = math.log(1 + (document_count - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                    norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                    score += idf * frequency * (self.k1 + 1) / norm
+                if score > best.get(conversation_id, 0.0):
+                    best[conversation_id] = score
+
+        if where is not None and best:
+            allowed = {conversation_id for (conversation_id,) in db.session.query(Conversation.id).filter(
+                Conversation.id.in_(list(best)), where
+            )}
+            best = {conversation_id: score for conversation_id, score in best.items() if conversation_id in allowed}
+
+        return sorted(best.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def rebuild(self):
+        with self._lock:
+            self._reset()
+
+
+class ConversationSearchIndex:
+    """Keeps search_documents in step with conversations and serves ranked queries
+
+    ``after_insert`` mapper hooks write the document for every new
+    Conversation and successful ConversationEntry on the inserting
+    connection, so it commits (or rolls back) with the row it describes
+    whichever code path created it. Rows that predate the index are
+    backfilled at startup when search_documents is empty (SEARCH_BOOTSTRAP),
+    by ``flask rebuild-search-index`` or from the admin rebuild endpoint.
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    def _create_backend(self):
+        """Pick the native index for the database, falling back to the in-memory one"""
+        dialect = db.engine.dialect.name
+        if Config.SEARCH_BACKEND != 'memory':
+            if dialect == 'postgresql':
+                return PostgresSearchBackend()
+            if dialect == 'sqlite':
+                backend = SQLiteFTSSearchBackend()
+                try:
+                    backend.ensure_schema()
+                    return backend
+                except Exception as e:
+                    db.session.rollback()
+                    logging.warning(f"SQLite FTS5 unavailable ({str(e)}), using in-memory search index")
+        return MemorySearchBackend()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    backend = self._create_backend()
+                    self._backend = backend
+                    logging.info(f"🔎 SEARCH INDEX: using {backend.name} backend")
+        return self._backend
+
+    def init_app(self, app):
+        """Create backend-specific structures (FTS table, triggers), register the hooks and backfill"""
+        with app.app_context():
+            try:
+                self.backend
+            except Exception as e:
+                logging.error(f"Error initializing search index: {str(e)}")
+
+        for model in (Conversation, ConversationEntry):
+            if not event.contains(model, 'after_insert', self._after_insert):
+                event.listen(model, 'after_insert', self._after_insert)
+
+        @app.cli.command('rebuild-search-index')
+        def rebuild_search_index_command():
+            """Re-create every search document from conversations and entries"""
+            counts = self.rebuild()
+            print(f"Indexed {counts['input']} inputs and {counts['response']} responses")
+
+        if Config.SEARCH_BOOTSTRAP:
+            threading.Thread(target=self._bootstrap, args=(app,), name='search-index-bootstrap', daemon=True).start()
+
+    def _bootstrap(self, app):
+        """Backfill existing history the first time search_documents is empty"""
+        try:
+            with app.app_context():
+                empty = db.session.query(SearchDocument.id).first() is None
+                if empty and db.session.query(Conversation.id).first() is not None:
+                    logging.info("🔎 SEARCH INDEX: empty, backfilling from conversations")
+                    self.rebuild()
+                db.session.remove()
+        except Exception as e:
+            logging.error(f"Search index bootstrap failed: {str(e)}")
+
+    @staticmethod
+    def _document(target) -> Optional[Dict[str, Any]]:
+        """search_documents row for a conversation's input or a successful entry's response"""
+        if isinstance(target, Conversation):
+            if target.initial_input:
+                return {'conversation_id': target.id, 'entry_id': None, 'source': 'input',
+                        'content': target.initial_input}
+        elif not target.error_occurred and target.response_text:
+            return {'conversation_id': target.conversation_id, 'entry_id': target.id, 'source': 'response',
+                    'content': target.response_text}
+        return None
+
+    def _after_insert(self, mapper, connection, target):
+        document = self._document(target)
+        if document is not None:
+            connection.execute(SearchDocument.__table__.insert().values(**document))
+
+    def index_conversation(self, conversation: Conversation):
+        """Queue the initial input of an existing conversation for indexing in the current session"""
+        document = self._document(conversation)
+        if document is not None:
+            db.session.add(SearchDocument(**document))
+
+    def index_entry(self, entry: ConversationEntry):
+        """Queue the response of an existing entry for indexing in the current session"""
+        document = self._document(entry)
+        if document is not None:
+            db.session.add(SearchDocument(**document))
+
+    def search(self, query_text: str, limit: int = None, where=None) -> List[Tuple[str, float]]:
+        """Conversation ids ranked by relevance (best first) as (conversation_id, rank)
+
+        ``where`` is a SQL condition on Conversation applied before the top ``limit`` cut.
+        """
+        query_text = (query_text or '').strip()
+        if not query_text:
+            return []
+        return self.backend.search(query_text, limit or Config.SEARCH_MAX_RESULTS, where)
+
+    def search_conversations(self, query_text: str, limit: int = None,
+                             base_query=None) -> List[Tuple[Conversation, float]]:
+        """Ranked Conversation rows, optionally restricted by an existing filter query"""
+        where = base_query.whereclause if base_query is not None else None
+        ranked = self.search(query_text, limit, where)
+        if not ranked:
+            return []
+
+        query = base_query if base_query is not None else Conversation.query
+        ranks = dict(ranked)
+        conversations = query.filter(Conversation.id.in_(list(ranks))).all()
+        conversations.sort(key=lambda conv: ranks[conv.id], reverse=True)
+        return [(conv, ranks[conv.id]) for conv in conversations]
+
+    def rebuild(self, batch_size: int = 500) -> Dict[str, int]:
+        """Re-create every search document from conversations and successful entries"""
+        SearchDocument.query.delete()
+        db.session.commit()
+
+        counts = {'input': 0, 'response': 0}
+        last_id = ''
+        while True:
+            conversations = Conversation.query.filter(
+                Conversation.id > last_id
+            ).order_by(Conversation.id).limit(batch_size).all()
+            if not conversations:
+                break
+            for conv in conversations:
+                self.index_conversation(conv)
+                counts['input'] += 1
+            last_id = conversations[-1].id
+            db.session.commit()
+
+        last_id = 0
+        while True:
+            entries = ConversationEntry.query.filter(
+                ConversationEntry.id > last_id,
+                ConversationEntry.error_occurred == False
+            ).order_by(ConversationEntry.id).limit(batch_size).all()
+            if not entries:
+                break
+            for entry in entries:
+                self.index_entry(entry)
+                counts['response'] += 1
+            last_id = entries[-1].id
+            db.session.commit()
+
+        self.backend.rebuild()
+        logging.info(f"🔎 SEARCH INDEX REBUILT: {counts['input']} inputs, {counts['response']} responses")
+        return counts
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.backend.name,
+            'documents': SearchDocument.query.count(),
+            'max_results': Config.SEARCH_MAX_RESULTS
+        }
+
+
+# Global instance
+search_index = ConversationSearchIndex()
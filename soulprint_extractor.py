@@ -6,13 +6,15 @@ Transforms voice transcriptions into personalized OperatorOS projects
 import json
 import os
 import re
+import time
 from typing import Dict, List, Any, Tuple
 from datetime import datetime
-import openai
-import anthropic
-from google import genai
 import logging
 
+from llm_clients import llm_clients
+from provider_router import provider_router
+from rate_limiter import CHARS_PER_TOKEN, rate_limiter
+
 class SoulprintExtractor:
     """
     Core agent for extracting user patterns from voice transcriptions
@@ -25,20 +27,10 @@ class SoulprintExtractor:
         self.anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
         self.gemini_api_key = os.environ.get("GEMINI_API_KEY")
         
-        # Initialize OpenAI client
-        self.openai_client = None
-        if self.openai_api_key:
-            self.openai_client = openai.OpenAI(api_key=self.openai_api_key)
-        
-        # Initialize Anthropic client  
-        self.anthropic_client = None
-        if self.anthropic_api_key:
-            self.anthropic_client = anthropic.Anthropic(api_key=self.anthropic_api_key)
-        
-        # Initialize Gemini client
-        self.gemini_client = None
-        if self.gemini_api_key:
-            self.gemini_client = genai.Client(api_key=self.gemini_api_key)
+        # Shared pooled clients (None when a provider has no API key)
+        self.openai_client = llm_clients.openai()
+        self.anthropic_client = llm_clients.anthropic()
+        self.gemini_client = llm_clients.gemini()
         
         # Core soulprint dimensions to analyze
         self.analysis_dimensions = {
@@ -85,27 +77,36 @@ class SoulprintExtractor:
     def _analyze_patterns(self, transcript: str) -> Dict[str, Any]:
         """Analyze transcript to extract core behavioral patterns using multi-LLM approach"""
         
-        # Try multiple APIs with intelligent fallback
-        apis = []
+        # Try multiple APIs with intelligent fallback (provider name, model, analysis function)
+        apis = {}
         if self.anthropic_client:
-            apis.append(('anthropic', self._analyze_with_claude))
+            apis['claude'] = ("claude-sonnet-4-20250514", self._analyze_with_claude)
         if self.openai_client:
-            apis.append(('openai', self._analyze_with_openai))
+            apis['openai'] = ("gpt-3.5-turbo", self._analyze_with_openai)
         if self.gemini_client:
-            apis.append(('gemini', self._analyze_with_gemini))
+            apis['gemini'] = ("gemini-2.5-flash", self._analyze_with_gemini)
         
         if not apis:
             logging.warning("No API clients available, using fallback analysis")
             return self._fallback_pattern_analysis(transcript)
         
-        # Try each API in order
-        for api_name, analysis_func in apis:
+        # Claude stays preferred, but unhealthy or slow providers are skipped by the router
+        order = provider_router.rank(list(apis), preferred='claude',
+                                     models={name: model for name, (model, _) in apis.items()})
+        
+        for api_name in order:
+            model, analysis_func = apis[api_name]
+            # Moves an expired breaker to half-open and claims its probe for this call
+            provider_router.reserve_probe(api_name, model)
+            started = time.monotonic()
             try:
                 logging.info(f"Attempting soulprint analysis with {api_name}")
                 result = analysis_func(transcript)
+                provider_router.record_success(api_name, model, time.monotonic() - started)
                 logging.info(f"Successfully analyzed soulprint with {api_name}")
                 return result
             except Exception as e:
+                provider_router.record_failure(api_name, model, time.monotonic() - started, str(e))
                 logging.warning(f"{api_name} analysis failed: {e}")
                 continue
         
@@ -244,10 +245,12 @@ class SoulprintExtractor:
 
         # Note that the newest Gemini model series is "gemini-2.5-flash" or gemini-2.5-pro"
         # do not change this unless explicitly requested by the user
-        response = self.gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=analysis_prompt
-        )
+        # The genai client has its own transport, so take the rate limit slot here
+        with rate_limiter.limit_sync('gemini', "gemini-2.5-flash", len(analysis_prompt) // CHARS_PER_TOKEN):
+            response = self.gemini_client.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=analysis_prompt
+            )
 
         result_text = response.text.strip()
         
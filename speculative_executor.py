@@ -0,0 +1,197 @@
+"""
+Speculative Agent Executor
+Prefetches the next agent's response in step-by-step conversations while the user reads the last one
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import Config
+
+
+@dataclass
+class Speculation:
+    """A background generation for one conversation step"""
+    conversation_id: str
+    agent_index: int
+    input_text: str
+    after_entry_id: int  # the entry whose next_question this answers; ties the result to its context
+    run: Callable[[], Tuple[str, str]]
+    future: Optional[Future] = None
+    created: float = field(default_factory=time.monotonic)
+    duration: Optional[float] = None
+
+    def matches(self, agent_index: int, input_text: str, after_entry_id: int) -> bool:
+        return (self.agent_index, self.input_text, self.after_entry_id) == (agent_index, input_text, after_entry_id)
+
+
+class SpeculativeExecutor:
+    """Runs the likely next ``/continue_conversation`` step ahead of time
+
+    After a step commits, ``schedule`` starts generating the next agent's
+    response to the ``next_question`` just extracted, with the same context
+    and retry policy the real request would use. ``claim`` hands that result
+    to ``ConversationChain.process_input(generate=..., started_at=...)`` when
+    the user continues from the same entry; anything else (another entry, a streamed
+    turn, expiry) discards it. Speculation is capped by SPECULATIVE_MAX_IN_FLIGHT
+    concurrent generations and SPECULATIVE_HOURLY_BUDGET generations per hour;
+    when either cap is reached nothing is prefetched.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._speculations: Dict[str, Speculation] = {}
+        self._started: deque = deque()
+        self._pool = None
+        self._stats = {
+            'scheduled': 0,
+            'skipped_budget': 0,
+            'skipped_busy': 0,
+            'hits': 0,
+            'misses': 0,
+            'discarded': 0,
+            'failed': 0,
+            'seconds_saved': 0.0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return Config.SPECULATIVE_ENABLED
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=Config.SPECULATIVE_MAX_IN_FLIGHT, thread_name_prefix='speculative')
+        return self._pool
+
+    def _in_flight(self) -> int:
+        return sum(1 for spec in self._speculations.values() if spec.future and not spec.future.done())
+
+    def _evict_expired(self):
+        """Drop results nobody claimed within SPECULATIVE_TTL_SECONDS (caller holds the lock)"""
+        cutoff = time.monotonic() - Config.SPECULATIVE_TTL_SECONDS
+        for conversation_id in [key for key, spec in self._speculations.items() if spec.created < cutoff]:
+            self._drop(conversation_id)
+
+    def _drop(self, conversation_id: str):
+        spec = self._speculations.pop(conversation_id, None)
+        if spec is not None:
+            spec.future.cancel()
+            self._stats['discarded'] += 1
+
+    def _execute(self, spec: Speculation) -> Tuple[str, str]:
+        started = time.monotonic()
+        try:
+            return spec.run()
+        except Exception:
+            with self._lock:
+                self._stats['failed'] += 1
+            raise
+        finally:
+            spec.duration = time.monotonic() - started
+
+    def schedule(self, chain, entry: Dict[str, Any]) -> bool:
+        """Start generating the step after ``entry`` (a committed entry dict) in the background"""
+        if not self.enabled or chain.is_complete or entry.get('error_occurred') or not entry.get('next_question'):
+            return False
+
+        agent_index = chain.conversation.current_agent_index
+        agent = chain.agents[agent_index]
+        input_text = entry['next_question']
+        api_override, clean_input = chain._parse_api_override(input_text)
+        context_history = chain._get_context_history()
+
+        def run():
+            return chain._generate_with_retry(agent, clean_input, context_history, max_retries=3,
+                                              timeout_seconds=15, api_override=api_override)
+
+        spec = Speculation(chain.conversation.id, agent_index, input_text, entry['id'], run)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired()
+            self._drop(spec.conversation_id)
+            while self._started and self._started[0] < now - 3600:
+                self._started.popleft()
+            if len(self._started) >= Config.SPECULATIVE_HOURLY_BUDGET:
+                self._stats['skipped_budget'] += 1
+                return False
+            if self._in_flight() >= Config.SPECULATIVE_MAX_IN_FLIGHT:
+                self._stats['skipped_busy'] += 1
+                return False
+
+            self._started.append(now)
+            spec.future = self._executor().submit(self._execute, spec)
+            self._speculations[spec.conversation_id] = spec
+            self._stats['scheduled'] += 1
+
+        logging.info(f"🔮 SPECULATING: {agent.name} for conversation {spec.conversation_id[:8]}...")
+        return True
+
+    def claim(self, chain, input_text: str,
+              after_entry_id: int) -> Optional[Tuple[Callable[[], Tuple[str, str]], Callable[[], Optional[datetime]]]]:
+        """``(generate, started_at)`` serving the prefetched step, or None when there is no match
+
+        A speculation still running is joined rather than restarted; one that
+        failed is regenerated in the calling thread. ``started_at()``, called
+        after ``generate`` returns, dates the generation that produced the
+        result, so stored processing time excludes time spent waiting for a claim.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            spec = self._speculations.pop(chain.conversation.id, None)
+            if spec is None:
+                return None
+            if not spec.matches(chain.conversation.current_agent_index, input_text, after_entry_id):
+                spec.future.cancel()
+                self._stats['discarded'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._stats['hits'] += 1
+
+        timing = {}
+
+        def generate():
+            try:
+                result = spec.future.result()
+            except Exception as e:
+                logging.warning(f"🔮 SPECULATION FAILED for {spec.conversation_id[:8]}...: {str(e)}; generating now")
+                timing['started_at'] = datetime.utcnow()
+                return spec.run()
+            timing['started_at'] = datetime.utcnow() - timedelta(seconds=spec.duration or 0.0)
+            with self._lock:
+                self._stats['seconds_saved'] += spec.duration or 0.0
+            logging.info(f"🔮 SPECULATION HIT: conversation {spec.conversation_id[:8]}... served prefetched response")
+            return result
+
+        return generate, lambda: timing.get('started_at')
+
+    def discard(self, conversation_id: str):
+        with self._lock:
+            self._drop(conversation_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._evict_expired()
+            stats = dict(self._stats)
+            claimed = stats['hits'] + stats['misses']
+            return {
+                'enabled': self.enabled,
+                'pending': len(self._speculations),
+                'in_flight': self._in_flight(),
+                'started_last_hour': sum(1 for started in self._started if started >= time.monotonic() - 3600),
+                'hourly_budget': Config.SPECULATIVE_HOURLY_BUDGET,
+                'max_in_flight': Config.SPECULATIVE_MAX_IN_FLIGHT,
+                'hit_rate': round(stats['hits'] / claimed * 100, 2) if claimed else 0.0,
+                **{name: round(value, 2) if isinstance(value, float) else value for name, value in stats.items()}
+            }
+
+
+# Global instance
+speculative_executor = SpeculativeExecutor()
@@ -3,12 +3,15 @@ Stripe Payment Manager for OperatorOS
 Handles payment link creation, invoice generation, and webhook processing
 """
 import os
+import json
 import stripe
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Optional, Any
-from models import db, Payment, PaymentStatus
+from sqlalchemy.exc import IntegrityError
+from models import db, Payment, PaymentStatus, StripeWebhookEvent
 from notifications import NotificationManager
+from job_queue import job_queue
 
 # Initialize Stripe
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
@@ -189,7 +192,7 @@ class StripeManager:
             }
     
     def handle_webhook(self, payload: bytes, sig_header: str) -> Dict[str, Any]:
-        """Handle Stripe webhook events"""
+        """Verify a Stripe webhook and queue it for processing; returns before any payment work runs"""
         try:
             # Verify webhook signature
             webhook_secret = os.environ.get('STRIPE_WEBHOOK_SECRET')
@@ -203,145 +206,202 @@ class StripeManager:
                     stripe.util.json.loads(payload), stripe.api_key
                 )
             
-            logging.info(f"Received Stripe webhook: {event['type']}")
-            
-            # Handle payment success events
-            if event['type'] == 'payment_intent.succeeded':
-                return self._handle_payment_success(event['data']['object'])
-            elif event['type'] == 'invoice.payment_succeeded':
-                return self._handle_invoice_payment_success(event['data']['object'])
-            elif event['type'] == 'payment_intent.payment_failed':
-                return self._handle_payment_failed(event['data']['object'])
-            elif event['type'] == 'invoice.payment_failed':
-                return self._handle_invoice_payment_failed(event['data']['object'])
-            
-            return {"success": True, "message": f"Webhook {event['type']} processed"}
+            return self.ingest_event(event, payload)
             
         except stripe.error.SignatureVerificationError as e:
             logging.error(f"Webhook signature verification failed: {str(e)}")
             return {"success": False, "error": "Invalid signature"}
         except Exception as e:
-            logging.error(f"Error processing webhook: {str(e)}")
+            db.session.rollback()
+            logging.error(f"Error ingesting webhook: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    def ingest_event(self, event, payload: bytes) -> Dict[str, Any]:
+        """Record the event id and enqueue processing in one commit; redeliveries are acknowledged as duplicates"""
+        event_id = event['id']
+        record = StripeWebhookEvent(
+            event_id=event_id,
+            event_type=event['type'],
+            payload=payload.decode('utf-8') if isinstance(payload, bytes) else payload
+        )
+        db.session.add(record)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            logging.info(f"Duplicate Stripe webhook ignored: {event_id} ({event['type']})")
+            return {"success": True, "duplicate": True, "message": f"Webhook {event_id} already received"}
+        
+        # Commits the event row together with its job
+        job = job_queue.enqueue(
+            'stripe_webhook_event',
+            {"event_id": event_id},
+            idempotency_key=f"stripe_event:{event_id}"
+        )
+        
+        logging.info(f"Received Stripe webhook: {event['type']} ({event_id}), queued as job {job.id}")
+        return {"success": True, "duplicate": False, "job_id": job.id}
+    
+    def process_event(self, event_id: str) -> Dict[str, Any]:
+        """Run a recorded webhook event (background job handler)"""
+        record = StripeWebhookEvent.query.filter_by(event_id=event_id).first()
+        if not record:
+            return {"success": False, "error": f"Unknown webhook event {event_id}", "retryable": False}
+        if record.status == 'processed':
+            return {"success": True, "message": f"Webhook {event_id} already processed"}
+        
+        event = stripe.Event.construct_from(json.loads(record.payload), stripe.api_key)
+        result = self._dispatch(event)
+        
+        record = StripeWebhookEvent.query.filter_by(event_id=event_id).first()
+        record.attempts += 1
+        record.status = 'processed' if result["success"] else 'failed'
+        record.error = None if result["success"] else result.get("error")
+        record.processed_at = datetime.utcnow()
+        db.session.commit()
+        return result
+    
+    def _dispatch(self, event) -> Dict[str, Any]:
+        event_type = event['type']
+        
+        # Handle payment success events
+        if event_type == 'payment_intent.succeeded':
+            return self._handle_payment_success(event['data']['object'])
+        elif event_type == 'checkout.session.completed':
+            return self._handle_checkout_completed(event['data']['object'])
+        elif event_type == 'invoice.payment_succeeded':
+            return self._handle_invoice_payment_success(event['data']['object'])
+        elif event_type == 'payment_intent.payment_failed':
+            return self._handle_payment_failed(event['data']['object'])
+        elif event_type == 'invoice.payment_failed':
+            return self._handle_invoice_payment_failed(event['data']['object'])
+        
+        return {"success": True, "message": f"Webhook {event_type} processed"}
+    
+    def _find_payment(self, *stripe_ids: Optional[str]) -> Optional[Payment]:
+        """Exact match on the unique stripe_payment_id index"""
+        stripe_ids = [stripe_id for stripe_id in stripe_ids if stripe_id]
+        if not stripe_ids:
+            return None
+        return Payment.query.filter(Payment.stripe_payment_id.in_(stripe_ids)).first()
+    
+    def _transition(self, payment: Payment, status: str, allowed_from) -> bool:
+        """Change status under a row lock (ORM write, so metric counters see it); False when not allowed"""
+        locked = Payment.query.filter_by(id=payment.id).with_for_update().populate_existing().first()
+        if locked is None or locked.status not in allowed_from:
+            db.session.commit()
+            return False
+        locked.status = status
+        if status == PaymentStatus.PAID:
+            locked.paid_at = datetime.utcnow()
+        db.session.commit()
+        return True
+    
+    def _mark_paid(self, payment: Payment) -> bool:
+        """Move a payment to PAID; False when another event already did"""
+        return self._transition(payment, PaymentStatus.PAID,
+                                (PaymentStatus.PENDING, PaymentStatus.FAILED, PaymentStatus.CANCELLED))
+    
+    def _mark_failed(self, payment: Payment) -> bool:
+        """Move a pending payment to FAILED; a paid one stays paid (events can arrive out of order)"""
+        return self._transition(payment, PaymentStatus.FAILED, (PaymentStatus.PENDING,))
+    
+    def _fulfill_if_needed(self, payment: Payment) -> Optional[Dict[str, Any]]:
+        """Trigger AI Form Check fulfillment; trigger_fulfillment returns the existing token on repeats"""
+        if "ai form check" not in payment.project_name.lower():
+            return None
+        
+        from fulfillment_system import fulfillment_system
+        fulfillment_result = fulfillment_system.trigger_fulfillment(payment.id)
+        
+        if fulfillment_result["success"]:
+            if not fulfillment_result.get("already_triggered"):
+                logging.info(f"Automated fulfillment triggered for payment {payment.id}")
+                self.notification_manager.add_notification(
+                    "Fulfillment Started",
+                    f"AI Form Check fulfillment started for {payment.client_name}",
+                    "info",
+                    {"payment_id": payment.id, "upload_token": fulfillment_result.get("upload_token")}
+                )
+        else:
+            logging.error(f"Fulfillment failed for payment {payment.id}: {fulfillment_result['error']}")
+            self.notification_manager.add_notification(
+                "Fulfillment Failed",
+                f"Automated fulfillment failed for {payment.client_name}: {fulfillment_result['error']}",
+                "error",
+                {"payment_id": payment.id, "error": fulfillment_result['error']}
+            )
+        return fulfillment_result
+    
+    def _handle_paid(self, payment: Payment, title: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        if self._mark_paid(payment):
+            # Send notification
+            self.notification_manager.add_notification(
+                title,
+                f"{title} from {payment.client_name} - ${payment.amount:.2f}",
+                "success",
+                {"payment_id": payment.id, "amount": payment.amount, **data}
+            )
+            logging.info(f"Payment marked as paid: {payment.id}")
+        
+        # Runs on retries too, so a failed fulfillment is picked up again
+        fulfillment_result = self._fulfill_if_needed(payment)
+        if fulfillment_result is not None and not fulfillment_result["success"]:
+            return {"success": False, "error": f"Fulfillment failed: {fulfillment_result['error']}"}
+        return {"success": True, "message": "Payment success processed"}
+    
     def _handle_payment_success(self, payment_intent) -> Dict[str, Any]:
         """Handle successful payment intent"""
         try:
-            # Find payment by Stripe ID in metadata or description
-            payment = Payment.query.filter(
-                Payment.stripe_payment_id.like(f"%{payment_intent.id}%")
-            ).first()
-            
+            payment = self._find_payment(payment_intent.id)
             if payment:
-                payment.status = PaymentStatus.PAID
-                payment.paid_at = datetime.utcnow()
-                db.session.commit()
-                
-                # Send notification
-                self.notification_manager.add_notification(
-                    "Payment Received",
-                    f"Payment received from {payment.client_name} - ${payment.amount:.2f}",
-                    "success",
-                    {"payment_id": payment.id, "amount": payment.amount}
-                )
-                
-                # Trigger automated fulfillment for AI Form Check Pro Report
-                if "ai form check" in payment.project_name.lower():
-                    try:
-                        from fulfillment_system import fulfillment_system
-                        fulfillment_result = fulfillment_system.trigger_fulfillment(payment.id)
-                        
-                        if fulfillment_result["success"]:
-                            logging.info(f"Automated fulfillment triggered for payment {payment.id}")
-                            self.notification_manager.add_notification(
-                                "Fulfillment Started",
-                                f"AI Form Check fulfillment started for {payment.client_name}",
-                                "info",
-                                {"payment_id": payment.id, "upload_token": fulfillment_result.get("upload_token")}
-                            )
-                        else:
-                            logging.error(f"Fulfillment failed for payment {payment.id}: {fulfillment_result['error']}")
-                            self.notification_manager.add_notification(
-                                "Fulfillment Failed",
-                                f"Automated fulfillment failed for {payment.client_name}: {fulfillment_result['error']}",
-                                "error",
-                                {"payment_id": payment.id, "error": fulfillment_result['error']}
-                            )
-                    except Exception as fulfillment_error:
-                        logging.error(f"Fulfillment system error: {str(fulfillment_error)}")
-                        self.notification_manager.add_notification(
-                            "Fulfillment System Error",
-                            f"Error in fulfillment system for {payment.client_name}: {str(fulfillment_error)}",
-                            "error",
-                            {"payment_id": payment.id, "error": str(fulfillment_error)}
-                        )
-                
-                logging.info(f"Payment marked as paid: {payment.id}")
+                return self._handle_paid(payment, "Payment Received", {"payment_intent": payment_intent.id})
             
             return {"success": True, "message": "Payment success processed"}
             
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error handling payment success: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    def _handle_checkout_completed(self, checkout_session) -> Dict[str, Any]:
+        """Handle a completed Checkout session (how payment links are paid)"""
+        try:
+            if checkout_session.get('payment_status') != 'paid':
+                return {"success": True, "message": "Checkout session not paid yet"}
+            
+            payment = self._find_payment(checkout_session.get('payment_link'), checkout_session.get('payment_intent'))
+            if payment:
+                return self._handle_paid(payment, "Payment Received", {"checkout_session": checkout_session.get('id')})
+            
+            return {"success": True, "message": "Checkout session processed"}
+            
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error handling checkout session: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
     def _handle_invoice_payment_success(self, invoice) -> Dict[str, Any]:
         """Handle successful invoice payment"""
         try:
             # Find payment by Stripe invoice ID
             payment = Payment.query.filter_by(stripe_invoice_id=invoice.id).first()
-            
             if payment:
-                payment.status = PaymentStatus.PAID
-                payment.paid_at = datetime.utcnow()
-                db.session.commit()
-                
-                # Send notification
-                self.notification_manager.add_notification(
-                    "Invoice Payment Received",
-                    f"Invoice payment received from {payment.client_name} - ${payment.amount:.2f}",
-                    "success",
-                    {"payment_id": payment.id, "invoice_id": invoice.id}
-                )
-                
-                # Trigger automated fulfillment for AI Form Check Pro Report
-                if "ai form check" in payment.project_name.lower():
-                    try:
-                        from fulfillment_system import fulfillment_system
-                        fulfillment_result = fulfillment_system.trigger_fulfillment(payment.id)
-                        
-                        if fulfillment_result["success"]:
-                            logging.info(f"Automated fulfillment triggered for payment {payment.id}")
-                            self.notification_manager.add_notification(
-                                "Fulfillment Started",
-                                f"AI Form Check fulfillment started for {payment.client_name}",
-                                "info",
-                                {"payment_id": payment.id, "upload_token": fulfillment_result.get("upload_token")}
-                            )
-                        else:
-                            logging.error(f"Fulfillment failed for payment {payment.id}: {fulfillment_result['error']}")
-                    except Exception as fulfillment_error:
-                        logging.error(f"Fulfillment system error: {str(fulfillment_error)}")
-                
-                logging.info(f"Invoice payment marked as paid: {payment.id}")
+                return self._handle_paid(payment, "Invoice Payment Received", {"invoice_id": invoice.id})
             
             return {"success": True, "message": "Invoice payment success processed"}
             
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error handling invoice payment success: {str(e)}")
             return {"success": False, "error": str(e)}
     
     def _handle_payment_failed(self, payment_intent) -> Dict[str, Any]:
         """Handle failed payment"""
         try:
-            # Find payment by Stripe ID
-            payment = Payment.query.filter(
-                Payment.stripe_payment_id.like(f"%{payment_intent.id}%")
-            ).first()
+            payment = self._find_payment(payment_intent.id)
             
-            if payment:
-                payment.status = PaymentStatus.FAILED
-                db.session.commit()
-                
+            if payment and self._mark_failed(payment):
                 # Send notification
                 self.notification_manager.add_notification(
                     "Payment Failed",
@@ -355,6 +415,7 @@ class StripeManager:
             return {"success": True, "message": "Payment failure processed"}
             
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error handling payment failure: {str(e)}")
             return {"success": False, "error": str(e)}
     
@@ -364,10 +425,7 @@ class StripeManager:
             # Find payment by Stripe invoice ID
             payment = Payment.query.filter_by(stripe_invoice_id=invoice.id).first()
             
-            if payment:
-                payment.status = PaymentStatus.FAILED
-                db.session.commit()
-                
+            if payment and self._mark_failed(payment):
                 # Send notification
                 self.notification_manager.add_notification(
                     "Invoice Payment Failed",
@@ -381,9 +439,22 @@ class StripeManager:
             return {"success": True, "message": "Invoice payment failure processed"}
             
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error handling invoice payment failure: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    def purge_webhook_events(self, retention_days: int = 30) -> int:
+        """Delete processed events older than ``retention_days`` (keep longer than Stripe's 3-day retry window)"""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        deleted = StripeWebhookEvent.query.filter(
+            StripeWebhookEvent.status == 'processed',
+            StripeWebhookEvent.received_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if deleted:
+            logging.info(f"Purged {deleted} processed Stripe webhook events")
+        return deleted
+    
     def get_payment_stats(self, days: int = 30) -> Dict[str, Any]:
         """Get payment statistics for the last N days"""
         try:
@@ -447,4 +518,12 @@ class StripeManager:
             return {
                 "success": False,
                 "error": f"Stripe connection failed: {str(e)}"
-            }
\ No newline at end of file
+            }
+
+def process_webhook_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Background job handler for recorded Stripe webhook events"""
+    return StripeManager().process_event(payload['event_id'])
+
+
+# Webhook events are processed by the background job queue
+job_queue.register('stripe_webhook_event', process_webhook_job)
@@ -0,0 +1,132 @@
+"""
+Keyset (cursor) pagination on (created_at, id)
+Deep pages cost the same as the first page: no OFFSET scan, totals optional or estimated
+"""
+
+import base64
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a cursor that cannot be decoded"""
+
+
+def encode_cursor(created_at: datetime, row_id: Any) -> str:
+    """Opaque, URL-safe cursor pointing just past the given row"""
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    """Inverse of encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), row_id
+    except Exception:
+        raise InvalidCursorError("Invalid pagination cursor")
+
+
+def keyset_paginate(query, created_column, id_column, cursor: Optional[str] = None,
+                    limit: int = 50) -> Tuple[List[Any], Optional[str]]:
+    """Return one page of ``query`` newest-first and the cursor for the next page
+
+    ``query`` must not already be ordered or limited. Backed by an index on
+    (created_at, id), each page is a single index range scan.
+
+    Returns:
+        Tuple[List, Optional[str]]: (items, next_cursor) - next_cursor is None on the last page
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            created_column < created_at,
+            and_(created_column == created_at, id_column < row_id)
+        ))
+
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
+
+    return rows, next_cursor
+
+
+def count_total(query, mode: str = 'approx') -> Tuple[Optional[int], bool]:
+    """Total row count for a filtered (unordered) query
+
+    Args:
+        mode: 'none' skips counting, 'exact' runs COUNT(*), 'approx' uses the
+            PostgreSQL planner's row estimate (no table scan) and falls back
+            to COUNT(*) on other databases
+
+    Returns:
+        Tuple[Optional[int], bool]: (total, is_estimate)
+    """
+    if mode == 'none':
+        return None, False
+
+    if mode == 'approx':
+        bind = query.session.get_bind()
+        if bind.dialect.name == 'postgresql':
+            try:
+                compiled = query.statement.compile(dialect=bind.dialect)
+                plan = query.session.connection().exec_driver_sql(
+                    f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+                ).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return int(plan[0]['Plan']['Plan Rows']), True
+            except Exception as e:
+                logging.warning(f"Row estimate failed, falling back to COUNT(*): {str(e)}")
+
+    return query.order_by(None).count(), False
+
+
+@dataclass
+class KeysetPage:
+    """One page of a keyset-paginated listing"""
+    items: List[Any]
+    per_page: int
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def pagination_meta(self) -> Dict[str, Any]:
+        return {
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'has_next': self.has_next,
+            'total': self.total,
+            'total_is_estimate': self.total_is_estimate
+        }
+
+
+def paginate(query, created_column, id_column, cursor: Optional[str] = None,
+             per_page: int = 20, total: str = 'approx') -> KeysetPage:
+    """Keyset page plus optional total, shared by every listing endpoint
+
+    Raises:
+        InvalidCursorError: if ``cursor`` cannot be decoded
+    """
+    total_count, is_estimate = count_total(query, total)
+    items, next_cursor = keyset_paginate(query, created_column, id_column, cursor, per_page)
+    return KeysetPage(items, per_page, next_cursor, total_count, is_estimate)
+
+
+def parse_total_mode(value: Optional[str], default: str = 'approx') -> str:
+    """Validate a ?total= query parameter"""
+    return value if value in ('none', 'approx', 'exact') else default
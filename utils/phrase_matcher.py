@@ -0,0 +1,92 @@
+"""
+Multi-phrase matcher
+Finds every phrase from a fixed, categorised set with one lowercase pass over the text
+"""
+
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+
+class PhraseMatcher:
+    """Case-insensitive substring matching for many phrases at once
+
+    Large phrase sets are compiled into one trie-shaped alternation regex.
+    The engine skips to candidate first characters and reports the longest
+    phrase at each match position; the search restarts one character later,
+    so overlapping phrases are found, and shorter phrases that are prefixes
+    of a match come from a precomputed table. Small sets are faster as
+    precompiled substring tests against the once-lowered text, because
+    CPython's substring search is C code (benchmark_clarity.py measures both).
+    Either way the result equals testing ``phrase in text.lower()`` per phrase.
+    """
+
+    REGEX_MIN_PHRASES = 80
+
+    def __init__(self, categories: Dict[str, Iterable[str]], regex_min_phrases: Optional[int] = None):
+        self.categories = {name: [phrase.lower() for phrase in phrases] for name, phrases in categories.items()}
+
+        self._phrase_categories = defaultdict(set)
+        for name, phrases in self.categories.items():
+            for phrase in phrases:
+                self._phrase_categories[phrase].add(name)
+        self._phrases = sorted(self._phrase_categories)
+
+        threshold = self.REGEX_MIN_PHRASES if regex_min_phrases is None else regex_min_phrases
+        self._regex = None
+        if len(self._phrases) >= threshold:
+            self._prefixes = {
+                phrase: [other for other in self._phrases if other != phrase and phrase.startswith(other)]
+                for phrase in self._phrases
+            }
+            trie = {}
+            for phrase in self._phrases:
+                node = trie
+                for char in phrase:
+                    node = node.setdefault(char, {})
+                node[''] = True
+            self._regex = re.compile(self._trie_to_regex(trie), re.DOTALL)
+
+    @property
+    def strategy(self) -> str:
+        return 'regex' if self._regex is not None else 'substring'
+
+    @classmethod
+    def _trie_to_regex(cls, node: dict) -> str:
+        branches = [re.escape(char) + cls._trie_to_regex(child)
+                    for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+
+        is_end = '' in node
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if is_end else pattern
+
+    def find_phrases(self, lowered_text: str) -> Set[str]:
+        """Distinct phrases present in already-lowercased text"""
+        if self._regex is None:
+            return {phrase for phrase in self._phrases if phrase in lowered_text}
+
+        found = set()
+        search = self._regex.search
+        match = search(lowered_text)
+        while match:
+            phrase = match.group()
+            if phrase not in found:
+                found.add(phrase)
+                found.update(self._prefixes[phrase])
+            match = search(lowered_text, match.start() + 1)
+        return found
+
+    def match(self, text: str, lowered: bool = False) -> Dict[str, Set[str]]:
+        """Distinct phrases found in ``text``, grouped by category
+
+        Pass ``lowered=True`` when the caller already lowercased the text.
+        """
+        matches = {name: set() for name in self.categories}
+        for phrase in self.find_phrases(text if lowered else text.lower()):
+            for name in self._phrase_categories[phrase]:
+                matches[name].add(phrase)
+        return matches
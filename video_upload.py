@@ -10,11 +10,11 @@ from datetime import datetime
 from pathlib import Path
 from flask import Blueprint, request, render_template, jsonify, abort
 from werkzeug.utils import secure_filename
-import json
 
-from main import limiter
+from main import limiter, csrf
 from fulfillment_system import fulfillment_system
-from models import Payment
+from chunked_upload import chunked_upload_manager
+from job_queue import job_queue
 
 # Create video upload blueprint
 video_bp = Blueprint('video', __name__)
@@ -32,28 +32,22 @@ def allowed_file(filename):
 def validate_upload_token(upload_token: str) -> dict:
     """Validate upload token and return payment info"""
     try:
-        # Find payment by upload token
-        payments = Payment.query.all()
-        
-        for payment in payments:
-            try:
-                metadata = json.loads(payment.description or "{}")
-                if metadata.get("upload_token") == upload_token:
-                    # Check if token is still valid
-                    upload_expiry = datetime.fromisoformat(metadata["upload_expiry"])
-                    if datetime.utcnow() <= upload_expiry:
-                        return {
-                            "valid": True,
-                            "payment": payment,
-                            "metadata": metadata,
-                            "expiry": upload_expiry
-                        }
-                    else:
-                        return {"valid": False, "reason": "Upload window expired"}
-            except:
-                continue
-        
-        return {"valid": False, "reason": "Invalid upload token"}
+        # Indexed lookup by token
+        token = fulfillment_system.find_upload_token(upload_token)
+        if not token:
+            return {"valid": False, "reason": "Invalid upload token"}
+        
+        # Check if token is still valid
+        if token.is_expired():
+            return {"valid": False, "reason": "Upload window expired"}
+        
+        return {
+            "valid": True,
+            "token": token,
+            "payment": token.payment,
+            "metadata": token.to_metadata(),
+            "expiry": token.expires_at
+        }
         
     except Exception as e:
         logging.error(f"Error validating upload token: {str(e)}")
@@ -147,26 +141,156 @@ def upload_video(upload_token):
         
         logging.info(f"Video uploaded successfully: {filename} ({file_path.stat().st_size} bytes)")
         
-        # Process video asynchronously
-        processing_result = fulfillment_system.process_uploaded_video(upload_token, str(file_path))
+        # Analysis, report and delivery run in the background job queue
+        job = enqueue_fulfillment(upload_token, str(file_path), filename)
+        
+        return jsonify({
+            "success": True,
+            "message": "Video uploaded successfully! Your report is being generated and will be emailed to you.",
+            "processing_time": "< 5 minutes",
+            "job_id": job.id,
+            "job_status": job.status
+        }), 202
+        
+    except Exception as e:
+        logging.error(f"Error uploading video: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": "Upload processing error"
+        }), 500
+
+def _chunk_response(result: dict):
+    """JSON response for a chunked-upload result, using its status code on failure"""
+    status_code = result.pop("status_code", 200)
+    return jsonify(result), status_code
+
+def enqueue_fulfillment(upload_token: str, video_path: str, upload_key: str):
+    """Queue analysis and delivery of a saved upload; the same upload is only queued once"""
+    return job_queue.enqueue(
+        'process_uploaded_video',
+        {"upload_token": upload_token, "video_path": video_path},
+        idempotency_key=f"process_uploaded_video:{upload_key}"
+    )
+
+def _process_completed_upload(upload_token: str, result: dict):
+    """Queue a fully received chunked upload for fulfillment, same as a single-request upload"""
+    job = enqueue_fulfillment(upload_token, result.pop("file_path"), result["upload_id"])
+    result.update({
+        "message": "Video uploaded successfully! Your report is being generated and will be emailed to you.",
+        "processing_time": "< 5 minutes",
+        "job_id": job.id,
+        "job_status": job.status
+    })
+    return jsonify(result), 202
+
+@video_bp.route('/api/upload-video/<upload_token>/sessions', methods=['POST'])
+@limiter.limit("10 per minute")
+@csrf.exempt
+def create_upload_session(upload_token):
+    """Start (or resume) a chunked upload: JSON {filename, size, sha256?}"""
+    try:
+        validation = validate_upload_token(upload_token)
         
-        if processing_result["success"]:
+        if not validation["valid"]:
             return jsonify({
-                "success": True,
-                "message": "Video uploaded and processed successfully! Check your email for the report.",
-                "processing_time": processing_result.get("delivery_time", "< 5 minutes")
-            })
-        else:
+                "success": False,
+                "error": validation["reason"]
+            }), 400
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            total_size = int(data.get("size", 0))
+        except (TypeError, ValueError):
+            total_size = 0
+        
+        result = chunked_upload_manager.create_session(
+            validation["token"], data.get("filename", ""), total_size, data.get("sha256")
+        )
+        return _chunk_response(result)
+        
+    except Exception as e:
+        logging.error(f"Error creating upload session: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": "Upload session error"
+        }), 500
+
+@video_bp.route('/api/upload-video/<upload_token>/sessions/<upload_id>', methods=['GET'])
+@limiter.limit("60 per minute")
+def get_upload_session(upload_token, upload_id):
+    """Current offset of a chunked upload, used by the client to resume"""
+    try:
+        validation = validate_upload_token(upload_token)
+        
+        if not validation["valid"]:
             return jsonify({
                 "success": False,
-                "error": f"Processing failed: {processing_result['error']}"
-            }), 500
+                "error": validation["reason"]
+            }), 400
+        
+        upload = chunked_upload_manager.get_session(validation["token"], upload_id)
+        if not upload:
+            return jsonify({
+                "success": False,
+                "error": "Upload session not found"
+            }), 404
+        
+        status = {"success": True, "chunk_size": chunked_upload_manager.chunk_size, **upload.to_dict()}
+        if upload.status == 'complete':
+            job = job_queue.find_by_key(f"process_uploaded_video:{upload.id}")
+            status["job_id"] = job.id if job else None
+        return jsonify(status)
         
     except Exception as e:
-        logging.error(f"Error uploading video: {str(e)}")
+        logging.error(f"Error reading upload session: {str(e)}")
         return jsonify({
             "success": False,
-            "error": "Upload processing error"
+            "error": "Upload session error"
+        }), 500
+
+@video_bp.route('/api/upload-video/<upload_token>/sessions/<upload_id>', methods=['PUT'])
+@limiter.limit("600 per minute")
+@csrf.exempt
+def upload_chunk(upload_token, upload_id):
+    """Append one raw chunk at the Upload-Offset header (optional X-Chunk-SHA256)"""
+    try:
+        validation = validate_upload_token(upload_token)
+        
+        if not validation["valid"]:
+            return jsonify({
+                "success": False,
+                "error": validation["reason"]
+            }), 400
+        
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": "Upload-Offset header required"
+            }), 400
+        
+        upload = chunked_upload_manager.get_session(validation["token"], upload_id, lock=True)
+        if not upload:
+            return jsonify({
+                "success": False,
+                "error": "Upload session not found"
+            }), 404
+        
+        # Raw body straight from the WSGI stream; never parsed into request.files
+        result = chunked_upload_manager.write_chunk(
+            upload, offset, request.stream, request.content_length,
+            request.headers.get("X-Chunk-SHA256")
+        )
+        if result["success"] and result.get("complete"):
+            return _process_completed_upload(upload_token, result)
+        return _chunk_response(result)
+        
+    except Exception as e:
+        logging.error(f"Error writing upload chunk: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": "Chunk upload error"
         }), 500
 
 @video_bp.route('/api/upload-progress/<upload_token>')
@@ -197,6 +321,13 @@ def upload_progress(upload_token):
             "report_delivered": metadata.get("report_delivered", False)
         }
         
+        # Byte-level progress of the most recent chunked upload
+        upload = chunked_upload_manager.latest_session(validation["token"])
+        processing_status["upload"] = upload.to_dict() if upload else None
+        if upload and upload.status == 'complete':
+            job = job_queue.find_by_key(f"process_uploaded_video:{upload.id}")
+            processing_status["job"] = job.to_dict() if job else None
+        
         return jsonify(processing_status)
         
     except Exception as e: